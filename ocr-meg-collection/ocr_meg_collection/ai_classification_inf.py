@@ -4,10 +4,21 @@ import logging
 import json
 import re
 import time
-import vertexai
-from vertexai.generative_models import GenerativeModel, SafetySetting
+import asyncio
+import argparse
+from vertexai.generative_models import SafetySetting
+from ocr_meg_collection.rate_limiter import RateLimiter
+from ocr_meg_collection.llm_backends import (
+    LLMThrottledError, VertexBackend, OllamaBackend, compare_backends)
+from ocr_meg_collection.llm_cache import LLMResponseCache, LLM_CACHE_FILE
+from ocr_meg_collection.streaming_json import StreamingJSONParser, StreamAbortedError, TRUNCATED, repair_json
+from ocr_meg_collection.text_compaction import TextCompactor, compaction_row, write_compaction_report
+from ocr_meg_collection.tokens import CHARS_PER_TOKEN
+from ocr_meg_collection.inference_metrics import InferenceMetrics, estimate_cost
+from ocr_meg_collection.lp_schema import LPEntities, PackedLPEntities, entity_prompt, response_schema
+from ocr_meg_collection.batch_prediction import (
+    write_request_file, read_predictions, wait_for_job, JOB_SUCCEEDED)
 from dotenv import load_dotenv
-from concurrent.futures import ThreadPoolExecutor, as_completed
 from tqdm import tqdm  # Import tqdm for progress bars
 
 # Set up logging
@@ -24,18 +35,167 @@ GOOGLE_PROJECT_ID = os.getenv("GOOGLE_PROJECT_ID")
 
 print("Google Service Account JSON File Creds Loaded Successfully for VERTEXAI INFERENCE")
 
+MODEL_NAME = "gemini-1.5-pro-001"
+
+# Quotas of the model in the project, shared by all the requests through the RateLimiter
+REQUESTS_PER_MINUTE = 10
+TOKENS_PER_MINUTE = 1_000_000
+
+# Define the system and user prompts
+SYSTEM_PROMPT = """As an expert in document entity extraction,
+you parse txt documents to identify and organize specific entities
+from diverse sources into structured formats,
+following detailed guidelines for clarity and completeness.
+"""
+
+# Entities extracted from the OCR text of one LP, generated from the structure declared in lp_schema.py
+ENTITY_SCHEMA = entity_prompt(LPEntities)
+
+EXTRACTION_INSTRUCTIONS = """Instructions:
+1. Extract the information from the provided OCR text, filling in the fields above.
+2. Correct any errors such as cut-off words, missing characters, or incorrect formatting.
+3. If the track numbers are concatenated or incorrectly listed, infer the correct order.
+4. Use educated guesses to reconstruct names and numbers when necessary.
+5. Use only the information provided in the text.
+"""
+
+USER_PROMPT = f"""
+You are a document entity extraction specialist. Given a document, your task is to extract the text value of the following entities and provide them in a structured JSON format:
+{ENTITY_SCHEMA}
+
+{EXTRACTION_INSTRUCTIONS}6. If nothing is found respond with an empty json object
+
+Text to Analyze:
+
+"""
+
+# Several LPs in one request, see AIClassifier.generate_packed_inference_async
+PACKED_PROMPT = f"""
+You are a document entity extraction specialist. Given the OCR texts of several LPs, your task is to extract the text value of the following entities for each LP and provide them in a structured JSON format:
+{ENTITY_SCHEMA}
+
+{EXTRACTION_INSTRUCTIONS}6. Each LP's text starts with a line "=== LP_ID: <id> ===" and ends with a line "=== END <id> ===". Use only the text between these lines for that LP, never mix information between LPs.
+7. Respond with a JSON array holding one object per LP, in the order of the texts, each object having the key "LP_ID" set to the <id> of its delimiter lines, plus the "General Information" and "Track Info" keys above.
+8. If nothing is found for an LP, respond with an object holding only its "LP_ID".
+
+Texts to Analyze:
+
+"""
+
+# Structure the answers must follow, sent with each request as response_schema
+LP_RESPONSE_SCHEMA = response_schema(LPEntities)
+PACKED_RESPONSE_SCHEMA = response_schema(list[PackedLPEntities])
+
+# Define generation configuration
+GENERATION_CONFIG = {
+    "max_output_tokens": 8192,
+    "temperature": 0.7,
+    "top_p": 0.95,
+    "response_mime_type": "application/json",
+}
+
+# Define custom safety settings
+SAFETY_SETTINGS = [
+    SafetySetting(
+        category=SafetySetting.HarmCategory.HARM_CATEGORY_HATE_SPEECH,
+        threshold=SafetySetting.HarmBlockThreshold.BLOCK_ONLY_HIGH
+    ),
+    SafetySetting(
+        category=SafetySetting.HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT,
+        threshold=SafetySetting.HarmBlockThreshold.BLOCK_ONLY_HIGH
+    ),
+    SafetySetting(
+        category=SafetySetting.HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT,
+        threshold=SafetySetting.HarmBlockThreshold.BLOCK_ONLY_HIGH
+    ),
+    SafetySetting(
+        category=SafetySetting.HarmCategory.HARM_CATEGORY_HARASSMENT,
+        threshold=SafetySetting.HarmBlockThreshold.BLOCK_ONLY_HIGH
+    ),
+]
+
+# Engines accepted by create_llm_backend
+LLM_BACKENDS = ("vertex", "ollama")
+
+
+def create_llm_backend(name: str = "vertex", **options):
+    """
+    Builds the LLM backend of the classifier with the prompts and generation settings above.
+
+    Args:
+        name (str): "vertex" for Gemini on Vertex AI, "ollama" for a local Ollama server.
+        **options: Further options of the backend, e.g. host or model_name for Ollama.
+
+    Returns:
+        LLMBackend: The backend.
+    """
+    if name == "vertex":
+        return VertexBackend(MODEL_NAME, SYSTEM_PROMPT, GENERATION_CONFIG, SAFETY_SETTINGS,
+                             project=GOOGLE_PROJECT_ID, **options)
+    if name == "ollama":
+        return OllamaBackend(SYSTEM_PROMPT, GENERATION_CONFIG, **options)
+    raise ValueError(f"Unknown LLM backend '{name}', expected one of {', '.join(LLM_BACKENDS)}.")
+
 
 class AIClassifier:
-    def __init__(self, max_workers=4, sleep_interval=6):
+    def __init__(self, max_concurrency=16, requests_per_minute=REQUESTS_PER_MINUTE,
+                 tokens_per_minute=TOKENS_PER_MINUTE, max_retries=3, quality_gate=None, rate_limiter=None,
+                 packed=False, pack_token_budget=16000, pack_output_tokens_per_lp=1500, max_lps_per_request=8,
+                 use_cache=True, cache_file=LLM_CACHE_FILE, cache_max_bytes=256 * 1024 * 1024, backend=None,
+                 max_stream_retries=2, compactor=None, metrics_file=None):
         """
         Initializes the AIClassifier class.
 
         Args:
-            max_workers (int): The maximum number of threads to use for concurrent processing.
-            sleep_interval (int): The number of seconds to wait between API calls to avoid rate limits.
+            max_concurrency (int): The maximum number of requests in flight at once, the rate limiter
+                                   deciding when each one is sent. Raise it for a local model server.
+            requests_per_minute (int): Requests-per-minute quota of the model, None for a local model.
+            tokens_per_minute (int): Tokens-per-minute quota of the model, None to only limit requests.
+            max_retries (int): Number of retries of a request rejected with RESOURCE_EXHAUSTED.
+            quality_gate (QualityGate): Optional gate keeping empty or garbage OCR texts away from the LLM,
+                                        the rejected LPs are queued for re-OCR.
+            rate_limiter (RateLimiter): Scheduler shared by all the requests, built from the quotas by default.
+                                        Pass the same instance to classifiers sharing the quota.
+            packed (bool): Send the OCR texts of several LPs in one request (see generate_packed_inference_async),
+                           paying the fixed prompt once per request instead of once per LP.
+            pack_token_budget (int): Input tokens of the LP texts packed into one request.
+            pack_output_tokens_per_lp (int): Expected output tokens of one LP, the packs are also limited so
+                                             that their answers fit in max_output_tokens.
+            max_lps_per_request (int): Largest number of LPs in one packed request.
+            use_cache (bool): Reuse the stored response of identical requests (same model, generation config,
+                              prompt and OCR text), and send identical requests in flight together only once.
+            cache_file (str): SQLite file of the persistent LLM response cache.
+            cache_max_bytes (int): Size above which the least recently used responses are evicted.
+            backend (LLMBackend): Engine answering the requests, Gemini on Vertex AI by default
+                                  (see create_llm_backend).
+            max_stream_retries (int): Number of retries of a single-LP request whose streamed answer is aborted
+                                      as off-schema or repeating itself (see StreamingJSONParser). Truncated
+                                      answers are repaired, not sent again.
+            compactor (TextCompactor): Optional stage shrinking the OCR texts before they are sent (whitespace,
+                                       hyphenation, noise and duplicate lines, legal notices), the input tokens
+                                       of each LP before and after are written to the compaction report.
+            metrics_file (str): JSONL file receiving the tokens, latency, quota wait, retries and cost of every
+                                request sent, a new file of ds_pipeline/inference_metrics per classifier by default.
         """
-        self.max_workers = max_workers
-        self.sleep_interval = sleep_interval
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.max_stream_retries = max_stream_retries
+        self.stream_aborts = {}
+        self.json_repairs = 0
+        self.quality_gate = quality_gate
+        self.compactor = compactor
+        self.compaction_rows = {}
+        self.metrics = InferenceMetrics(metrics_file)
+        self.packed = packed
+        self.pack_token_budget = pack_token_budget
+        self.max_lps_per_request = max(1, min(
+            max_lps_per_request, GENERATION_CONFIG["max_output_tokens"] // pack_output_tokens_per_lp))
+        self.packed_requests = 0
+        self.packed_lps = 0
+        self.packed_reruns = 0
+        self.cache = LLMResponseCache(cache_file, cache_max_bytes) if use_cache else None
+        self.rate_limiter = rate_limiter or RateLimiter(
+            requests_per_minute=requests_per_minute, tokens_per_minute=tokens_per_minute)
 
         script_dir = os.path.dirname(os.path.abspath(__file__))
 
@@ -48,9 +208,16 @@ class AIClassifier:
             script_dir, '..', 'ds_pipeline', '1_json_inf_outputs')
         print("Output Directory for AI Classification:", self.TARGET_DIR)
 
-        # Initialize Vertex AI
-        vertexai.init(project=GOOGLE_PROJECT_ID, location="us-central1")
-        logging.info("Initialized Vertex AI.")
+        self.backend = backend or create_llm_backend("vertex")
+        logging.info(f"LLM backend: {self.backend.name} ({self.backend.model_name})")
+
+    def close(self):
+        """
+        Closes the LLM response cache and the metrics file, once the classifier is no longer used.
+        """
+        if self.cache:
+            self.cache.close()
+        self.metrics.close()
 
     def _read_input_txt_file(self, file_path: str) -> str:
         """
@@ -63,6 +230,39 @@ class AIClassifier:
         with open(file_path, "r") as file:
             return file.read()
 
+    def _read_document(self, file_path: str) -> str:
+        """
+        Reads the combined text of an LP as sent to the LLM, compacted if a compactor is set.
+
+        :param file_path: Path to the combined.txt file.
+        :return: The text of the request.
+        """
+        combined_text = self._read_input_txt_file(file_path)
+        return self.compactor.compact(combined_text) if self.compactor else combined_text
+
+    async def _read_document_async(self, file_path: str) -> str:
+        """
+        Reads the combined text of an LP as sent to the LLM, compacted if a compactor is set.
+
+        The input tokens of the LP's request before and after compaction are counted by the
+        backend (see _count_tokens) and kept for the compaction report.
+
+        :param file_path: Path to the combined.txt file.
+        :return: The text of the request.
+        """
+        combined_text = await asyncio.to_thread(self._read_input_txt_file, file_path)
+        if not self.compactor:
+            return combined_text
+
+        document = self.compactor.compact(combined_text)
+        tokens_before, tokens_after = await asyncio.gather(
+            self._count_tokens([USER_PROMPT, combined_text]), self._count_tokens([USER_PROMPT, document]))
+        row = compaction_row(self._lp_id(file_path), tokens_before, tokens_after)
+        self.compaction_rows[row["lp"]] = row
+        logging.info(f"Compacted {row['lp']}: {row['tokens_before']} -> {row['tokens_after']} input tokens "
+                     f"({row['saved_ratio']:.1%} saved)")
+        return document
+
     def _save_json(self, data: dict, file_name: str):
         """
         Saves the JSON data to a file in the target directory.
@@ -95,158 +295,392 @@ class AIClassifier:
             logging.error("No JSON format found in the response.")
         return {}
 
-    def _clean_json_from_response(self, response_text: str) -> dict:
+    def _clean_json_from_response(self, response_text: str, repair: bool = True) -> dict:
         """
         Extracts and cleans JSON data from the response text.
 
         :param response_text: The response text containing JSON data.
+        :param repair: Repair a malformed answer locally (see streaming_json.repair_json) instead of dropping it.
         :return: A dictionary containing the parsed JSON data.
         """
         try:
             # Attempt to find the JSON part in the response text
             json_start = response_text.find('{')
             json_end = response_text.rfind('}') + 1
-            if json_start == -1 or json_end == -1:
+            if json_start == -1:
                 logging.error("No JSON format found in the response.")
                 return {}
 
             json_str = response_text[json_start:json_end]
             return json.loads(json_str)
         except json.JSONDecodeError as e:
-            logging.error(f"Error decoding JSON: {e}")
-            return {}
+            data = self._load_repaired_json(response_text, e) if repair else None
+            if not isinstance(data, dict):
+                logging.error(f"Error decoding JSON: {e}")
+                return {}
+            return data
 
-    def generate_inference(self, file_path: str):
+    def _load_repaired_json(self, response_text: str, error: Exception):
+        """
+        Parses a malformed answer once repaired.
+
+        :param response_text: The response text.
+        :param error: The error raised by the answer as is, logged with the repair.
+        :return: The parsed JSON data, None if the repaired text still does not parse.
+        """
+        try:
+            data = json.loads(repair_json(response_text))
+        except json.JSONDecodeError:
+            return None
+        self.json_repairs += 1
+        logging.warning(f"Repaired a malformed JSON answer ({error}).")
+        return data
+
+    async def _count_tokens(self, contents: list) -> int:
+        """
+        Counts the input tokens of a request, system instruction included, to charge the TPM quota.
+
+        :param contents: Prompt parts of the request.
+        :return: Number of input tokens, estimated from the characters if counting fails.
+        """
+        try:
+            return await self.backend.count_tokens(contents)
+        except Exception as e:
+            logging.warning(f"Token count failed, estimating it from the characters: {e}")
+            return self.backend.estimate_tokens(contents)
+
+    async def _generate_text(self, contents: list, input_tokens: int, parse_stream: bool = False,
+                             response_schema: dict = None, lp_ids: list = None) -> str:
+        """
+        Sends a request once the rate limiter admits it, retrying quota rejections.
+
+        With parse_stream, the answer is read by a StreamingJSONParser as it arrives. The stream
+        is dropped as soon as the JSON object is complete, and a generation going off-schema,
+        looping on the same track is stopped and sent again (max_stream_retries), instead of
+        being paid in full and discarded afterwards. An answer cut at max_output_tokens is not
+        sent again, it would be cut again: its complete part is kept by repair_json.
+
+        The tokens, time to first token, latency, time waited for quota, retries and estimated
+        cost of the request are recorded in self.metrics, whether it succeeds or fails.
+
+        :param contents: Prompt parts of the request.
+        :param input_tokens: Input tokens of the request.
+        :param parse_stream: Check the answer as it is streamed, for single-LP requests.
+        :param response_schema: Structure the answer must follow, e.g. LP_RESPONSE_SCHEMA.
+        :param lp_ids: LPs of the request, for the metrics.
+        :return: The concatenated response text, or the JSON object alone with parse_stream.
         """
-        Generates inferences from the combined OCR text using Vertex AI's Generative Model.
+        throttles = aborts = 0
+        start_time = time.monotonic()
+        # Metrics of the request, summed over its attempts
+        quota_wait = model_seconds = 0.0
+        first_token, usage, finish_reason, outcome = None, None, None, "error"
+        input_chars = output_chars = output_tokens = 0
+        try:
+            while True:
+                quota_wait += await self.rate_limiter.acquire_async(input_tokens)
+                attempt_start = time.monotonic()
+                parser = StreamingJSONParser() if parse_stream else None
+                stream = self.backend.stream(contents, response_schema)
+                # Concatenate all response parts into a single string
+                texts, usage, finish_reason, first_token = [], None, None, None
+                try:
+                    async for chunk in stream:
+                        if chunk.text and first_token is None:
+                            first_token = time.monotonic() - attempt_start
+                        texts.append(chunk.text)
+                        usage = chunk.usage or usage
+                        finish_reason = chunk.finish_reason or finish_reason
+                        if parser:
+                            parser.feed(chunk.text)
+                            if parser.done:
+                                break
+                    if parser:
+                        parser.finish(finish_reason)
+                except LLMThrottledError:
+                    self.rate_limiter.on_throttle()
+                    throttles += 1
+                    if throttles > self.max_retries:
+                        outcome = "throttled"
+                        raise
+                    logging.warning(
+                        f"LLM quota exceeded, retrying (attempt {throttles}/{self.max_retries}).")
+                    continue
+                except StreamAbortedError as e:
+                    self.stream_aborts[e.reason] = self.stream_aborts.get(e.reason, 0) + 1
+                    if e.reason == TRUNCATED:
+                        # Already paid in full and would be cut again with the same budget, repaired instead
+                        logging.warning(f"Streamed answer aborted ({e.reason}): {e} Keeping the complete part.")
+                        outcome = f"aborted_{e.reason}"
+                        return "".join(texts)
+                    aborts += 1
+                    if aborts > self.max_stream_retries:
+                        logging.warning(f"Streamed answer aborted ({e.reason}): {e} No retry left.")
+                        outcome = f"aborted_{e.reason}"
+                        return "".join(texts)
+                    logging.warning(
+                        f"Streamed answer aborted ({e.reason}): {e} Retrying ({aborts}/{self.max_stream_retries}).")
+                    continue
+                finally:
+                    await stream.aclose()
+                    model_seconds += time.monotonic() - attempt_start
+                    response_text = "".join(texts)
+                    # Rejected requests are not billed
+                    if texts or usage:
+                        input_chars += len(self.backend.system_prompt) + sum(len(part) for part in contents)
+                        output_chars += len(response_text)
+                    # Output tokens also count toward the TPM quota, estimated for a stream stopped early
+                    attempt_output_tokens = usage["output_tokens"] if usage else len(response_text) // CHARS_PER_TOKEN
+                    self.rate_limiter.charge(attempt_output_tokens)
+                    output_tokens += attempt_output_tokens
+
+                outcome = "ok"
+                return parser.json_text if parser and parser.done else response_text
+        finally:
+            self.metrics.record({
+                "lps": lp_ids or [],
+                "backend": self.backend.name,
+                "outcome": outcome,
+                "finish_reason": finish_reason,
+                "input_tokens": usage["input_tokens"] if usage else input_tokens,
+                "output_tokens": output_tokens,
+                "input_chars": input_chars,
+                "output_chars": output_chars,
+                "ttft": round(first_token, 3) if first_token is not None else None,
+                "latency": round(time.monotonic() - start_time, 3),
+                "quota_wait": round(quota_wait, 3),
+                "model_seconds": round(model_seconds, 3),
+                "throttle_retries": min(throttles, self.max_retries),
+                "stream_retries": min(aborts, self.max_stream_retries),
+                "cost_usd": round(estimate_cost(self.backend.name, input_chars, output_chars), 6),
+            })
+
+    def _cache_key(self, prompt: str, text: str, response_schema: dict = None) -> str:
+        """
+        Returns the cache key of a request made of a prompt and an OCR text, for the model of the backend.
+        """
+        generation_config = self.backend.generation_config
+        if response_schema:
+            generation_config = dict(generation_config, response_schema=response_schema)
+        return LLMResponseCache.make_key(self.backend.model_name, generation_config,
+                                         self.backend.system_prompt + prompt, text)
+
+    def _packed_item_key(self, text: str) -> str:
+        """
+        Returns the cache key of the answer of one LP split out of a packed request.
+
+        It includes PACKED_PROMPT, so it differs from the key of a single-LP request (USER_PROMPT
+        never produced this answer) and from the key of the packed request, whose text holds the
+        delimited texts of all its LPs.
+        """
+        return self._cache_key(PACKED_PROMPT, text, PACKED_RESPONSE_SCHEMA)
+
+    async def _reuse_packed_item(self, file_path: str, text: str) -> bool:
+        """
+        Saves the cached answer of an LP from an earlier packed request, see _packed_item_key.
 
         :param file_path: Path to the combined OCR text file.
+        :param text: Its text, as sent in the pack.
+        :return: Whether a cached answer was found, always False without a cache.
+        """
+        if self.cache is None:
+            return False
+        key = self._packed_item_key(text)
+        # Checked first, so an LP cached by a single-LP request is not counted as a miss
+        if key not in self.cache:
+            return False
+        response_text = await asyncio.to_thread(self.cache.get, key)
+        if response_text is None:
+            return False
+        file_name = os.path.basename(file_path).replace("_combined.txt", "_ai_output.json")
+        await asyncio.to_thread(self._save_json, json.loads(response_text), file_name)
+        return True
+
+    async def _request(self, prompt: str, text: str, cacheable=None, parse_stream: bool = False,
+                       response_schema: dict = None, lp_ids: list = None) -> str:
+        """
+        Sends a request, or reuses the cached or in-flight response of an identical one.
+
+        :param prompt: Fixed part of the request, e.g. USER_PROMPT.
+        :param text: Variable part of the request, the OCR text.
+        :param cacheable: Tells whether a response may be stored, e.g. only parseable JSON.
+        :param parse_stream: Check the answer as it is streamed, see _generate_text.
+        :param response_schema: Structure the answer must follow, e.g. LP_RESPONSE_SCHEMA.
+        :param lp_ids: LPs of the request, for the metrics.
+        :return: The response text.
+        """
+        contents = [prompt, text]
+
+        async def generate():
+            return await self._generate_text(
+                contents, await self._count_tokens(contents), parse_stream, response_schema, lp_ids)
+
+        if not self.cache:
+            return await generate()
+        return await self.cache.get_or_compute(
+            self._cache_key(prompt, text, response_schema), generate, cacheable=cacheable,
+            model_name=self.backend.model_name)
+
+    async def generate_inference_async(self, file_path: str):
+        """
+        Generates inferences from the combined OCR text with the LLM backend.
+
+        The request waits for the shared rate limiter on the event loop, and the files are read
+        and written in worker threads, so many requests can be in flight from a single thread.
+
+        :param file_path: Path to the combined OCR text file.
+        """
+        # Step 1: Read the combined text from the specified file path
+        document = await self._read_document_async(file_path)
+
+        # Malformed answers are saved once repaired but not cached, deleting the output asks the model again
+        response_text = await self._request(
+            USER_PROMPT, document, cacheable=lambda text: bool(self._clean_json_from_response(text, repair=False)),
+            parse_stream=True, response_schema=LP_RESPONSE_SCHEMA, lp_ids=[self._lp_id(file_path)])
+
+        # **Print the LLM's Raw Response Text**
+        # print("LLM Raw Response Text:")
+        # print(response_text)
+        # logging.info("Printed the LLM's raw response text.")
+
+        # Extract JSON from response
+        json_data = self._clean_json_from_response(response_text)
+        # self._extract_json_from_response(response_text)
+
+        # Save the extracted JSON to the target directory
+        if json_data:
+            file_name = os.path.basename(file_path).replace(
+                "_combined.txt", "_ai_output.json")
+            await asyncio.to_thread(self._save_json, json_data, file_name)
+
+    @staticmethod
+    def _lp_id(file_path: str) -> str:
+        return os.path.basename(file_path).replace("_combined.txt", "")
+
+    @staticmethod
+    def _normalize_lp_id(lp_id) -> str:
+        return re.sub(r"[\s_-]", "", str(lp_id)).upper()
+
+    def _plan_packs(self, files: list) -> list:
+        """
+        Groups the LP texts into packed requests, in order, within the token budget.
+
+        :param files: (file path, text) of the LPs to send.
+        :return: Lists of (file path, text), one per request. An LP above the budget gets a request of its own.
         """
-        with tqdm(total=3, desc=f"Processing {os.path.basename(file_path)}", unit="step") as pbar:
-            # Step 1: Read the combined text from the specified file path
-            combined_text = self._read_input_txt_file(file_path)
-            pbar.update(1)  # Update progress bar after reading the file
-
-            # Define the system and user prompts and generate content
-            SYSTEM_PROMPT = """As an expert in document entity extraction,
-            you parse txt documents to identify and organize specific entities
-            from diverse sources into structured formats,
-            following detailed guidelines for clarity and completeness.
-            """
-
-            USER_PROMPT = f"""
-            You are a document entity extraction specialist. Given a document, your task is to extract the text value of the following entities and provide them in a structured JSON format:
-            {{
-                "General Information": {{
-                    "LP_ID": "",  // Extract the ID of the LP, **always** starts with "LP" followed by a 4-digit number + appears only in the *Front Cover* section.
-                    "Country": "",  // Extract the country
-                    "Title": "",  // Extract the title of the LP, typically found on the front cover.
-                    "Subtitle": "",  // If present, extract the subtitle of the LP.
-                    "Performer": "",  // Extract the full names of the performers or music composer involved, separated by a semicolon if multiple.
-                    "Publisher": "",  // Extract the name of the publisher (company or organization responsible for the release).
-                    "Publishing Year": "",  // Identify the publishing year of the LP if mentioned.
-                    "Label Company": "",  // Extract the name of the label company.
-                    "Label Number": "",  // Identify the unique label identifier, usually appearing after the label company's name and always starting with 2 or 3 letters followed by numbers.
-                    "Language": "",  // Determine the language used in the text (e.g., Spanish).
-                    "Recording Info": "",  // Extract information about where or by whom the LP was recorded, if available.
-                    "Genre/Style": "",  // Determine the music genre of the album if mentioned, sometimes found in parentheses on the track name, often Iberic/South American genres.
-                    "Notes": "",  // Extract any additional notes or contextual information found on the cover that may provide insights into the album's content or production.
-                    "Other Information": ""  // Include any other relevant information that doesn't fall into the above categories.
-                }},
-                "Track Info": [
-                    {{
-                        "Face": "",  // Determine whether the track is on Face "A" or "B". [example: 1.a, 1b, etc.]
-                        "Track_Number": "",  // Correctly identify the track's number or position in the list. Write it as a whole number without any punctuation marks.
-                        "Track_Name": "",  // Correctly extract the name of the track.
-                        "Track_Composer": "",  // Extract the composer’s name, follows the track name.
-                        "Track_Length": ""  // Extract the track length if mentioned.
-                    }}  // In most cases, there should be 6 tracks on both Faces.
-                ]
-            }}
-
-            Instructions:
-            1. Extract the information from the provided OCR text, filling in the fields above.
-            2. Correct any errors such as cut-off words, missing characters, or incorrect formatting.
-            3. If the track numbers are concatenated or incorrectly listed, infer the correct order.
-            4. Use educated guesses to reconstruct names and numbers when necessary.
-            5. Use only the information provided in the text.
-            6. If nothing is found respond with an empty json object
-
-            Text to Analyze:
-            """
-
-            document = combined_text
-
-            # Define generation configuration
-            generation_config = {
-                "max_output_tokens": 8192,
-                "temperature": 0.7,
-                "top_p": 0.95,
-                "response_mime_type": "application/json",
-            }
-            # Define custom safety settings
-            safety_settings = [
-                SafetySetting(
-                    category=SafetySetting.HarmCategory.HARM_CATEGORY_HATE_SPEECH,
-                    threshold=SafetySetting.HarmBlockThreshold.BLOCK_ONLY_HIGH
-                ),
-                SafetySetting(
-                    category=SafetySetting.HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT,
-                    threshold=SafetySetting.HarmBlockThreshold.BLOCK_ONLY_HIGH
-                ),
-                SafetySetting(
-                    category=SafetySetting.HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT,
-                    threshold=SafetySetting.HarmBlockThreshold.BLOCK_ONLY_HIGH
-                ),
-                SafetySetting(
-                    category=SafetySetting.HarmCategory.HARM_CATEGORY_HARASSMENT,
-                    threshold=SafetySetting.HarmBlockThreshold.BLOCK_ONLY_HIGH
-                ),
-            ]
-
-            # Instantiate the generative model
-            model = GenerativeModel(
-                "gemini-1.5-pro-001",
-                generation_config=generation_config,
-                system_instruction=SYSTEM_PROMPT,
-                safety_settings=safety_settings  # No safety settings for now
-            )
-
-            # Generate content using the model
-            responses = model.generate_content(
-                [USER_PROMPT, document],
-                # generation_config=generation_config,
-                stream=True,
-
-            )
-
-            # Concatenate all response parts into a single string
-            response_text = "".join(response.text for response in responses)
-
-            # **Print the LLM's Raw Response Text**
-            # print("LLM Raw Response Text:")
-            # print(response_text)
-            # logging.info("Printed the LLM's raw response text.")
-
-            # Extract JSON from response
-            json_data = self._clean_json_from_response(response_text)
-            # self._extract_json_from_response(response_text)
-
-            # Save the extracted JSON to the target directory
+        packs, pack, pack_tokens = [], [], 0
+        for file_path, text in files:
+            tokens = len(text) // CHARS_PER_TOKEN + 1
+            if pack and (len(pack) >= self.max_lps_per_request
+                         or pack_tokens + tokens > self.pack_token_budget):
+                packs.append(pack)
+                pack, pack_tokens = [], 0
+            pack.append((file_path, text))
+            pack_tokens += tokens
+        if pack:
+            packs.append(pack)
+        return packs
+
+    def _clean_json_array_from_response(self, response_text: str, repair: bool = True) -> list:
+        """
+        Extracts the JSON array of a packed response.
+
+        :param response_text: The response text containing a JSON array.
+        :param repair: Repair a malformed answer locally instead of dropping it.
+        :return: The objects of the array, an empty list if it cannot be parsed.
+        """
+        json_start = response_text.find('[')
+        json_end = response_text.rfind(']') + 1
+        object_start = response_text.find('{')
+        if json_start == -1 or -1 < object_start < json_start:
+            # A single LP answered as an object
+            data = self._clean_json_from_response(response_text, repair)
+            return [data] if data else []
+        try:
+            data = json.loads(response_text[json_start:json_end])
+        except json.JSONDecodeError as e:
+            data = self._load_repaired_json(response_text, e) if repair else None
+            if not isinstance(data, list):
+                logging.error(f"Error decoding JSON array: {e}")
+                return []
+        return [item for item in data if isinstance(item, dict)]
+
+    async def generate_packed_inference_async(self, pack: list):
+        """
+        Generates the inferences of several LPs with a single request.
+
+        The OCR texts are tagged with their LP_ID between delimiter lines, and the model answers
+        a JSON array keyed by LP_ID, split back into one _ai_output.json per LP. The LPs the
+        model skipped, or answered under an unknown LP_ID, are sent again on their own. A malformed
+        array is repaired: its complete objects are saved but not cached, and the LP of its last
+        object, possibly cut at max_output_tokens, is sent again on its own.
+
+        :param pack: (file path, text) of the LPs of the request.
+        """
+        document = "\n\n".join(
+            f"=== LP_ID: {self._lp_id(file_path)} ===\n{text}\n=== END {self._lp_id(file_path)} ==="
+            for file_path, text in pack)
+
+        response_text = await self._request(
+            PACKED_PROMPT, document, cacheable=lambda text: bool(self._clean_json_array_from_response(text, repair=False)),
+            response_schema=PACKED_RESPONSE_SCHEMA, lp_ids=[self._lp_id(file_path) for file_path, _ in pack])
+        json_repairs = self.json_repairs
+        items = self._clean_json_array_from_response(response_text)
+        repaired = self.json_repairs > json_repairs
+        if repaired:
+            # E.g. cut at max_output_tokens, the last object may be incomplete: its LP is sent again on its own
+            items = items[:-1]
+        answers = {}
+        for item in items:
+            answers.setdefault(self._normalize_lp_id(item.pop("LP_ID", "")), item)
+
+        missing = []
+        for file_path, text in pack:
+            json_data = answers.get(self._normalize_lp_id(self._lp_id(file_path)))
+            if json_data is None:
+                missing.append(file_path)
+                continue
+            if self.cache and json_data and not repaired:
+                # Also serves another pack holding the same text, not a single-LP request
+                await asyncio.to_thread(self.cache.put, self._packed_item_key(text),
+                                        json.dumps(json_data), self.backend.model_name)
             if json_data:
                 file_name = os.path.basename(file_path).replace(
                     "_combined.txt", "_ai_output.json")
-                self._save_json(json_data, file_name)
-            pbar.update(1)  # Update progress bar after saving the output
+                await asyncio.to_thread(self._save_json, json_data, file_name)
 
-            # Sleep to respect API quota limits
-            time.sleep(self.sleep_interval)
-            logging.info(
-                f"Sleeping for {self.sleep_interval} seconds to avoid exceeding quota.")
+        self.packed_requests += 1
+        self.packed_lps += len(pack)
+        if missing:
+            logging.warning(
+                f"Packed response skipped {len(missing)} of {len(pack)} LPs, sending them on their own.")
+            self.packed_reruns += len(missing)
+            for file_path in missing:
+                await self.generate_inference_async(file_path)
 
-    def batch_generate_inferences(self):
+    def generate_inference(self, file_path: str):
         """
-        Generates inferences for multiple text files in the input directory concurrently.
+        Synchronous wrapper of generate_inference_async for a single file.
+
+        :param file_path: Path to the combined OCR text file.
+        """
+        async def run():
+            try:
+                await self.generate_inference_async(file_path)
+            finally:
+                # The connections belong to this event loop, closed with it
+                await self.backend.close()
+
+        asyncio.run(run())
+
+    def _files_to_process(self) -> list:
+        """
+        Lists the combined text files without an up-to-date output that pass the quality gate.
+
+        An output older than its text is stale: the text was rewritten since, e.g. by retry-failed
+        or re-OCR, and is classified again.
+
+        :return: Paths of the files to send to the LLM.
         """
         txt_files = [os.path.join(self.INPUT_DIR, f) for f in os.listdir(
             self.INPUT_DIR) if f.endswith("_combined.txt")]
@@ -259,28 +693,224 @@ class AIClassifier:
             output_file_path = os.path.join(self.TARGET_DIR, output_file_name)
             if not os.path.exists(output_file_path):
                 files_to_process.append(file_path)
+            elif os.path.getmtime(output_file_path) < os.path.getmtime(file_path):
+                logging.info(f"Text rewritten since its output, classifying it again: {file_path}")
+                files_to_process.append(file_path)
             else:
                 logging.info(f"Skipping already processed file: {file_path}")
 
-        # Process remaining files concurrently
-        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
-            future_to_file = {executor.submit(
-                self.generate_inference, file_path): file_path for file_path in files_to_process}
+        # Only spend LLM requests on texts that can yield a result
+        if self.quality_gate:
+            files_to_process = self.quality_gate.filter_files(files_to_process)
+        return files_to_process
 
-            for future in tqdm(as_completed(future_to_file), total=len(files_to_process), desc="Batch Processing LP files", unit="file"):
-                file_path = future_to_file[future]
+    async def batch_generate_inferences_async(self):
+        """
+        Generates inferences for multiple text files in the input directory concurrently.
+
+        At most max_concurrency requests are in flight, the rate limiter deciding when each
+        is sent. In packed mode, each request carries the texts of several LPs. If the run is
+        cancelled (e.g. Ctrl+C), the requests in flight are cancelled and awaited before
+        returning, no output file is left half written.
+        """
+        files_to_process = await asyncio.to_thread(self._files_to_process)
+        if self.packed:
+            texts = await asyncio.gather(*(self._read_document_async(file_path) for file_path in files_to_process))
+            files = list(zip(files_to_process, texts))
+            # LPs already answered, alone or in a pack, are read from the cache instead of taking room in a pack
+            cached = set()
+            if self.cache:
+                cached = {file_path for file_path, text in files
+                          if self._packed_item_key(text) in self.cache
+                          or self._cache_key(USER_PROMPT, text, LP_RESPONSE_SCHEMA) in self.cache}
+            units = [[(file_path, text)] for file_path, text in files if file_path in cached]
+            units += self._plan_packs([(file_path, text) for file_path, text in files if file_path not in cached])
+        else:
+            units = [[(file_path, None)] for file_path in files_to_process]
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def process(unit):
+            async with semaphore:
                 try:
-                    future.result()
-                    logging.info(f"Completed inference for {file_path}")
+                    if len(unit) > 1:
+                        await self.generate_packed_inference_async(unit)
+                    elif unit[0][1] is None or not await self._reuse_packed_item(*unit[0]):
+                        await self.generate_inference_async(unit[0][0])
                 except Exception as exc:
-                    logging.error(f"Error processing {file_path}: {exc}")
+                    logging.error(f"Error processing {', '.join(file_path for file_path, _ in unit)}: {exc}")
+                else:
+                    for file_path, _ in unit:
+                        logging.info(f"Completed inference for {file_path}")
+            return len(unit)
+
+        tasks = [asyncio.create_task(process(unit)) for unit in units]
+        try:
+            with tqdm(total=len(files_to_process), desc="Batch Processing LP files", unit="file") as progress:
+                for future in asyncio.as_completed(tasks):
+                    progress.update(await future)
+        finally:
+            pending = [task for task in tasks if not task.done()]
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+                logging.warning(f"Inference cancelled, {len(pending)} requests left unprocessed.")
+
+            if self.packed_requests:
+                logging.info(
+                    f"Packed requests: {self.packed_requests} requests for {self.packed_lps} LPs "
+                    f"({self.packed_lps / self.packed_requests:.1f} LPs per request), "
+                    f"{self.packed_reruns} LPs re-run on their own.")
+
+            if self.compaction_rows:
+                before = sum(row["tokens_before"] for row in self.compaction_rows.values())
+                after = sum(row["tokens_after"] for row in self.compaction_rows.values())
+                logging.info(f"Text compaction: {before} -> {after} input tokens over "
+                             f"{len(self.compaction_rows)} LPs ({1 - after / (before or 1):.1%} saved).")
+                await asyncio.to_thread(write_compaction_report, list(self.compaction_rows.values()))
+
+            if self.json_repairs:
+                logging.info(f"Malformed JSON answers repaired locally: {self.json_repairs}")
+
+            if self.stream_aborts:
+                logging.info("Streamed answers aborted early: " +
+                             ", ".join(f"{reason}: {count}" for reason, count in self.stream_aborts.items()))
+
+            if self.cache:
+                cache_stats = self.cache.stats()
+                logging.info(
+                    f"LLM cache hits: {cache_stats['hits']}, misses: {cache_stats['misses']} "
+                    f"(hit rate {cache_stats['hit_rate']:.1%}), coalesced requests: {cache_stats['coalesced']}, "
+                    f"evictions: {cache_stats['evictions']}")
+
+            limiter_stats = self.rate_limiter.stats()
+            logging.info(
+                f"Rate limiter: {limiter_stats['requests']} requests, {limiter_stats['input_tokens']} input tokens, "
+                f"{limiter_stats['wait_seconds']:.1f}s waited for quota, {limiter_stats['throttles']} quota rejections.")
+
+            self.metrics.log_summary()
+            self.metrics.close()
+            await self.backend.close()
+
+    def batch_generate_inferences(self):
+        """
+        Synchronous wrapper of batch_generate_inferences_async, runs the event loop until all files are done.
+        """
+        asyncio.run(self.batch_generate_inferences_async())
+
+    def _batch_request(self, lp_id: str, text: str) -> dict:
+        """
+        Builds the batch prediction line of one LP, the same request as generate_inference_async.
+
+        :param lp_id: LP of the text, stored as a label to match the output line back to its LP.
+        :param text: Combined OCR text of the LP.
+        :return: The {"request": GenerateContentRequest} dictionary of the JSONL request file.
+        """
+        return {"request": {
+            "contents": [{"role": "user", "parts": [{"text": USER_PROMPT}, {"text": text}]}],
+            "systemInstruction": {"parts": [{"text": SYSTEM_PROMPT}]},
+            "generationConfig": dict(GENERATION_CONFIG, response_schema=LP_RESPONSE_SCHEMA),
+            "safetySettings": [setting.to_dict() for setting in SAFETY_SETTINGS],
+            "labels": {"lp_id": lp_id.lower()},
+        }}
+
+    def batch_predict(self, submitter, work_dir: str = None, poll_interval: float = 60.0,
+                      timeout: float = None) -> dict:
+        """
+        Classifies all the pending LPs with one batch prediction job instead of online requests.
+
+        The texts are written into one JSONL request file, submitted, and the job is polled until
+        it ends. Its output is then split into the usual _ai_output.json files. Meant for backfills:
+        the job runs off the online per-minute quota. LPs without an answer stay pending for the
+        next run.
+
+        :param submitter: BatchJobSubmitter running the job, e.g. a VertexBatchSubmitter or a LocalBatchSubmitter.
+        :param work_dir: Folder of the request and output files, defaults to ds_pipeline/batch_jobs.
+        :param poll_interval: Seconds between two status checks of the job.
+        :param timeout: Seconds after which to stop waiting, None to wait until the job ends.
+        :return: Counts of the LPs sent, saved and left without output.
+        """
+        files_to_process = self._files_to_process()
+        if not files_to_process:
+            logging.info("No LP waiting for classification.")
+            return {"sent": 0, "saved": 0, "missing": 0}
+
+        work_dir = work_dir or os.path.join(self.TARGET_DIR, '..', 'batch_jobs')
+        run_id = time.strftime("%Y%m%d-%H%M%S")
+        request_file = os.path.join(work_dir, f"requests_{run_id}.jsonl")
+        write_request_file(request_file, [
+            self._batch_request(self._lp_id(file_path), self._read_document(file_path))
+            for file_path in files_to_process])
+
+        job_id = submitter.submit(request_file)
+        state = wait_for_job(submitter, job_id, poll_interval=poll_interval, timeout=timeout)
+        if state != JOB_SUCCEEDED:
+            raise RuntimeError(f"Batch prediction job {job_id} ended in state '{state}'.")
+
+        output_file = os.path.join(work_dir, f"predictions_{run_id}.jsonl")
+        submitter.download(job_id, output_file)
+        predictions = read_predictions(output_file)
+
+        saved = 0
+        for file_path in files_to_process:
+            response_text = predictions.get(self._lp_id(file_path).upper())
+            json_data = self._clean_json_from_response(response_text) if response_text else {}
+            if json_data:
+                file_name = os.path.basename(file_path).replace(
+                    "_combined.txt", "_ai_output.json")
+                self._save_json(json_data, file_name)
+                saved += 1
+
+        counts = {"sent": len(files_to_process), "saved": saved, "missing": len(files_to_process) - saved}
+        logging.info(
+            f"Batch prediction job {job_id}: {counts['saved']} of {counts['sent']} LPs saved, "
+            f"{counts['missing']} left for the next run.")
+        return counts
+
+    def benchmark_backends(self, backends: list, sample: int = 10, max_concurrency: int = 4) -> list:
+        """
+        Sends the same classification requests to several backends and prints their latency,
+        throughput and share of parseable answers side by side. The cache and the rate limiter
+        are bypassed and no output is written, keep the sample small on a backend with a quota.
+
+        :param backends: LLMBackend to compare, e.g. create_llm_backend("vertex") and create_llm_backend("ollama").
+        :param sample: Number of combined OCR texts of the input directory used as requests.
+        :param max_concurrency: Requests in flight at once on each backend.
+        :return: The result dictionary of each backend, see llm_backends.benchmark_backend.
+        """
+        txt_files = sorted(os.path.join(self.INPUT_DIR, f) for f in os.listdir(
+            self.INPUT_DIR) if f.endswith("_combined.txt"))[:sample]
+        requests = [[USER_PROMPT, self._read_document(file_path)] for file_path in txt_files]
+        return compare_backends(backends, requests, max_concurrency, response_schema=LP_RESPONSE_SCHEMA,
+                                validate=lambda text: bool(self._clean_json_from_response(text, repair=False)))
 
 
 if __name__ == "__main__":
-    classifier = AIClassifier()
-    classifier.batch_generate_inferences()
+    parser = argparse.ArgumentParser(description="Classify the OCR texts, or benchmark the LLM backends on them.")
+    parser.add_argument("--backend", choices=LLM_BACKENDS, default="vertex")
+    parser.add_argument("--benchmark", nargs="+", choices=LLM_BACKENDS, metavar="BACKEND",
+                        help="Compare these backends on the first --sample texts instead of classifying.")
+    parser.add_argument("--sample", type=int, default=10)
+    parser.add_argument("--max-concurrency", type=int, default=4)
+    args = parser.parse_args()
+
+    if args.benchmark:
+        backends = [create_llm_backend(name) for name in args.benchmark]
+        classifier = AIClassifier(use_cache=False, backend=backends[0], compactor=TextCompactor())
+        classifier.benchmark_backends(backends, sample=args.sample, max_concurrency=args.max_concurrency)
+    elif args.backend == "ollama":
+        # No per-minute quota on a local server
+        classifier = AIClassifier(max_concurrency=args.max_concurrency, requests_per_minute=None,
+                                  tokens_per_minute=None, backend=create_llm_backend("ollama"),
+                                  compactor=TextCompactor())
+        classifier.batch_generate_inferences()
+    else:
+        classifier = AIClassifier(compactor=TextCompactor())
+        classifier.batch_generate_inferences()
+    classifier.close()
 
 
 # Script Time-Log
-# quota to 10 requests per minute, we can adjust the sleep_interval accordingly. With a new quota of 10 requests per minute, the script can send a request every 6 seconds (since
-# 60seconds/10requests=6seconds/request). We can set the sleep_interval to 6 seconds to ensure that we don't exceed the quota.
+# With a quota of 10 requests per minute, the RateLimiter admits one request every 6 seconds
+# (60seconds/10requests=6seconds/request) across all the requests in flight, never more than 10 in any minute.
+# Set REQUESTS_PER_MINUTE and TOKENS_PER_MINUTE to the quotas of the project.
@@ -0,0 +1,83 @@
+import numpy as np
+
+# Word-level OCR annotations stored next to each _combined.txt, so layout-aware steps
+# (tracklist column detection, cropping, ...) can run offline without paying for OCR again.
+
+# Columns of the word annotations of one image
+WORD_COLUMNS = ("block", "paragraph", "line", "word",
+                "x0", "y0", "x1", "y1", "confidence", "text")
+INTEGER_COLUMNS = ("block", "paragraph", "line", "word", "x0", "y0", "x1", "y1")
+
+
+def new_word_columns() -> dict:
+    """
+    Returns empty word annotation columns, filled with add_word.
+    """
+    return {column: [] for column in WORD_COLUMNS}
+
+
+def add_word(columns: dict, block: int, paragraph: int, line: int, word: int,
+             box: tuple, confidence: float, text: str):
+    """
+    Appends one word to the annotation columns of an image.
+
+    Args:
+        columns (dict): Columns created by new_word_columns.
+        block (int): Index of the text block in the image.
+        paragraph (int): Index of the paragraph in its block.
+        line (int): Index of the line in its paragraph.
+        word (int): Index of the word in its line.
+        box (tuple): (x0, y0, x1, y1) bounding box of the word in pixels.
+        confidence (float): Recognition confidence between 0 and 1.
+        text (str): The recognized word.
+    """
+    for column, value in zip(WORD_COLUMNS, (block, paragraph, line, word, *box, confidence, text)):
+        columns[column].append(value)
+
+
+def save_annotations(file_path: str, sides: list):
+    """
+    Stores the word annotations of both covers of an LP in a compressed columnar .npz file.
+
+    Args:
+        file_path (str): Destination file, e.g. LP1234_annotations.npz.
+        sides (list): Word columns of the front and back covers, None for a cover without annotations.
+    """
+    merged = {column: [] for column in ("side",) + WORD_COLUMNS}
+    for side, words in enumerate(sides):
+        if not words:
+            continue
+        merged["side"].extend([side] * len(words["text"]))
+        for column in WORD_COLUMNS:
+            merged[column].extend(words[column])
+
+    arrays = {column: np.asarray(merged[column], dtype=np.int32)
+              for column in INTEGER_COLUMNS}
+    np.savez_compressed(
+        file_path,
+        side=np.asarray(merged["side"], dtype=np.int8),
+        confidence=np.asarray(merged["confidence"], dtype=np.float32),
+        text=np.asarray(merged["text"], dtype=np.str_),
+        **arrays)
+
+
+def load_annotations(file_path: str) -> dict:
+    """
+    Loads the word annotations of an LP.
+
+    Args:
+        file_path (str): File written by save_annotations.
+
+    Returns:
+        dict: One numpy array per column ("side" is 0 for the front and 1 for the back cover).
+    """
+    with np.load(file_path) as data:
+        return {column: data[column] for column in data.files}
+
+
+def load_annotations_frame(file_path: str):
+    """
+    Loads the word annotations of an LP as a pandas DataFrame, one row per word.
+    """
+    import pandas as pd
+    return pd.DataFrame(load_annotations(file_path))
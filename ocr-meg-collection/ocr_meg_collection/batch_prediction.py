@@ -0,0 +1,279 @@
+import os
+import re
+import json
+import time
+import uuid
+import logging
+import argparse
+import threading
+
+# Set up logging
+logging.basicConfig(level=logging.INFO,
+                    format='%(asctime)s - %(levelname)s - %(message)s')
+
+# States reported by the job submitters
+JOB_RUNNING = "running"
+JOB_SUCCEEDED = "succeeded"
+JOB_FAILED = "failed"
+
+LP_ID_PATTERN = re.compile(r"\bLP\s?-?\d{4}\b", re.IGNORECASE)
+
+
+def write_request_file(file_path: str, requests: list):
+    """
+    Writes the requests of a batch prediction job, one JSON object per line.
+
+    Args:
+        file_path (str): Location of the JSONL request file.
+        requests (list): {"request": GenerateContentRequest} dictionaries, see AIClassifier._batch_request.
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(file_path)), exist_ok=True)
+    with open(file_path, "w") as request_file:
+        for request in requests:
+            request_file.write(json.dumps(request, ensure_ascii=False) + "\n")
+    logging.info(f"Wrote {len(requests)} batch requests to {file_path}")
+
+
+def read_predictions(file_path: str) -> dict:
+    """
+    Reads the output JSONL of a batch prediction job.
+
+    Every output line repeats its request, whose lp_id label tells which LP it answers.
+
+    Args:
+        file_path (str): Location of the JSONL output file.
+
+    Returns:
+        dict: Response text per LP_ID, lines without a response (failed requests) are left out.
+    """
+    predictions = {}
+    with open(file_path, "r") as output_file:
+        for line in output_file:
+            if not line.strip():
+                continue
+            prediction = json.loads(line)
+            lp_id = prediction.get("request", {}).get("labels", {}).get("lp_id", "").upper()
+            candidates = (prediction.get("response") or {}).get("candidates") or []
+            if not lp_id or not candidates:
+                logging.warning(
+                    f"No response for batch request {lp_id or '?'}: {prediction.get('status', 'unknown status')}")
+                continue
+            parts = candidates[0].get("content", {}).get("parts", [])
+            predictions[lp_id] = "".join(part.get("text", "") for part in parts)
+    return predictions
+
+
+class BatchJobSubmitter:
+    """
+    Interface of the services running batch prediction jobs for AIClassifier.batch_predict.
+
+    A submitter takes a JSONL request file, runs it as one job, and hands back the
+    output JSONL once the job is done.
+    """
+    name = "base"
+
+    def submit(self, request_file: str) -> str:
+        """
+        Starts a job on a request file.
+
+        Returns:
+            str: Identifier of the job.
+        """
+        raise NotImplementedError
+
+    def status(self, job_id: str) -> str:
+        """
+        Returns JOB_RUNNING, JOB_SUCCEEDED or JOB_FAILED.
+        """
+        raise NotImplementedError
+
+    def download(self, job_id: str, output_file: str):
+        """
+        Copies the output JSONL of a succeeded job to output_file.
+        """
+        raise NotImplementedError
+
+
+def wait_for_job(submitter: BatchJobSubmitter, job_id: str, poll_interval: float = 60.0,
+                 timeout: float = None) -> str:
+    """
+    Polls a job until it ends.
+
+    Args:
+        submitter (BatchJobSubmitter): Submitter that started the job.
+        job_id (str): Identifier of the job.
+        poll_interval (float): Seconds between two status checks.
+        timeout (float): Seconds after which to stop waiting, None to wait until the job ends.
+
+    Returns:
+        str: The last state of the job, JOB_RUNNING if the timeout was reached.
+    """
+    start_time = time.monotonic()
+    while True:
+        state = submitter.status(job_id)
+        if state != JOB_RUNNING:
+            return state
+        if timeout is not None and time.monotonic() - start_time > timeout:
+            return state
+        logging.info(
+            f"Batch job {job_id} still running after {time.monotonic() - start_time:.0f} seconds.")
+        time.sleep(poll_interval)
+
+
+class VertexBatchSubmitter(BatchJobSubmitter):
+    name = "vertex"
+
+    def __init__(self, bucket: str, model_name: str, prefix: str = "batch_prediction"):
+        """
+        Initializes the VertexBatchSubmitter class.
+
+        Uploads the request file to Cloud Storage and runs it as a Vertex AI batch prediction
+        job, which is billed at the batch rate and does not count against the online quota.
+
+        Args:
+            bucket (str): Cloud Storage bucket holding the request and output files.
+            model_name (str): Gemini model of the job, e.g. MODEL_NAME.
+            prefix (str): Folder of the bucket used for the jobs.
+        """
+        from google.cloud import storage as gcs
+
+        self.bucket = gcs.Client().bucket(bucket)
+        self.model_name = model_name
+        self.prefix = prefix
+
+    def submit(self, request_file: str) -> str:
+        from vertexai.batch_prediction import BatchPredictionJob
+
+        folder = f"{self.prefix}/{time.strftime('%Y%m%d-%H%M%S')}"
+        blob = self.bucket.blob(f"{folder}/{os.path.basename(request_file)}")
+        blob.upload_from_filename(request_file)
+
+        job = BatchPredictionJob.submit(
+            source_model=self.model_name,
+            input_dataset=f"gs://{self.bucket.name}/{blob.name}",
+            output_uri_prefix=f"gs://{self.bucket.name}/{folder}/output")
+        logging.info(f"Submitted Vertex AI batch prediction job {job.resource_name}")
+        return job.resource_name
+
+    def status(self, job_id: str) -> str:
+        from vertexai.batch_prediction import BatchPredictionJob
+
+        job = BatchPredictionJob(job_id)
+        if not job.has_ended:
+            return JOB_RUNNING
+        if not job.has_succeeded:
+            logging.error(f"Batch prediction job {job_id} failed: {job.error}")
+            return JOB_FAILED
+        return JOB_SUCCEEDED
+
+    def download(self, job_id: str, output_file: str):
+        from vertexai.batch_prediction import BatchPredictionJob
+
+        output_location = BatchPredictionJob(job_id).output_location
+        prefix = output_location.replace(f"gs://{self.bucket.name}/", "", 1)
+        with open(output_file, "wb") as output:
+            for blob in self.bucket.list_blobs(prefix=prefix):
+                if blob.name.endswith(".jsonl"):
+                    output.write(blob.download_as_bytes())
+
+
+def echo_handler(request: dict) -> str:
+    """
+    Default answer of LocalBatchSubmitter: an empty entity structure holding the LP_ID read in the text.
+    """
+    text = "\n".join(part.get("text", "")
+                     for content in request.get("contents", []) for part in content.get("parts", []))
+    match = LP_ID_PATTERN.search(text.split("Text to Analyze:")[-1])
+    lp_id = re.sub(r"[\s-]", "", match.group()).upper() if match else ""
+    return json.dumps({"General Information": {"LP_ID": lp_id}, "Track Info": []})
+
+
+class LocalBatchSubmitter(BatchJobSubmitter):
+    name = "local"
+
+    def __init__(self, work_dir: str, handler=echo_handler, seconds_per_request: float = 0.0,
+                 fail_every: int = 0):
+        """
+        Initializes the LocalBatchSubmitter class.
+
+        File-based stand-in for a batch prediction service, to test the batch flow offline.
+        Each job gets a folder under work_dir with a copy of the requests, a state file and,
+        once done, the output JSONL in the Vertex AI format. The job runs on a background thread.
+
+        Args:
+            work_dir (str): Folder of the jobs.
+            handler (callable): Turns the request dictionary of one line into the response text,
+                                e.g. a call to a local model. Defaults to echo_handler.
+            seconds_per_request (float): Simulated processing time of each request.
+            fail_every (int): Every n-th request is answered with an error status, 0 for none.
+        """
+        self.work_dir = work_dir
+        self.handler = handler
+        self.seconds_per_request = seconds_per_request
+        self.fail_every = fail_every
+
+    def _job_dir(self, job_id: str) -> str:
+        return os.path.join(self.work_dir, job_id)
+
+    def _set_state(self, job_id: str, state: str):
+        state_path = os.path.join(self._job_dir(job_id), "state.json")
+        with open(f"{state_path}.tmp", "w") as state_file:
+            json.dump({"state": state}, state_file)
+        os.replace(f"{state_path}.tmp", state_path)
+
+    def submit(self, request_file: str) -> str:
+        job_id = f"job-{uuid.uuid4().hex[:12]}"
+        os.makedirs(self._job_dir(job_id))
+        with open(request_file, "r") as source, \
+                open(os.path.join(self._job_dir(job_id), "requests.jsonl"), "w") as copy:
+            copy.write(source.read())
+        self._set_state(job_id, JOB_RUNNING)
+        threading.Thread(target=self._run, args=(job_id,), daemon=True).start()
+        logging.info(f"Submitted local batch job {job_id}")
+        return job_id
+
+    def _run(self, job_id: str):
+        job_dir = self._job_dir(job_id)
+        try:
+            with open(os.path.join(job_dir, "requests.jsonl"), "r") as requests, \
+                    open(os.path.join(job_dir, "predictions.jsonl"), "w") as predictions:
+                for number, line in enumerate(requests, start=1):
+                    if not line.strip():
+                        continue
+                    request = json.loads(line)["request"]
+                    time.sleep(self.seconds_per_request)
+                    if self.fail_every and number % self.fail_every == 0:
+                        prediction = {"request": request, "status": "Simulated failure"}
+                    else:
+                        prediction = {"request": request, "status": "", "response": {"candidates": [
+                            {"content": {"role": "model", "parts": [{"text": self.handler(request)}]}}]}}
+                    predictions.write(json.dumps(prediction, ensure_ascii=False) + "\n")
+        except Exception as e:
+            logging.error(f"Local batch job {job_id} failed: {e}")
+            self._set_state(job_id, JOB_FAILED)
+            return
+        self._set_state(job_id, JOB_SUCCEEDED)
+
+    def status(self, job_id: str) -> str:
+        with open(os.path.join(self._job_dir(job_id), "state.json"), "r") as state_file:
+            return json.load(state_file)["state"]
+
+    def download(self, job_id: str, output_file: str):
+        with open(os.path.join(self._job_dir(job_id), "predictions.jsonl"), "r") as source, \
+                open(output_file, "w") as output:
+            output.write(source.read())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Run a batch prediction request file through the local stand-in.")
+    parser.add_argument("request_file", help="JSONL request file written by AIClassifier.batch_predict.")
+    parser.add_argument("--work-dir", default="batch_jobs")
+    parser.add_argument("--output", default="predictions.jsonl")
+    args = parser.parse_args()
+
+    submitter = LocalBatchSubmitter(args.work_dir)
+    job_id = submitter.submit(args.request_file)
+    if wait_for_job(submitter, job_id, poll_interval=1.0) == JOB_SUCCEEDED:
+        submitter.download(job_id, args.output)
+        print(f"{len(read_predictions(args.output))} predictions written to {args.output}")
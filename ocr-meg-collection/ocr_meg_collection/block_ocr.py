@@ -0,0 +1,248 @@
+import os
+import time
+import bisect
+import logging
+import argparse
+
+import cv2
+import numpy as np
+
+from ocr_meg_collection.annotation_store import new_word_columns, add_word
+
+# Block-level Tesseract OCR, promoted from the tests/ocr_tesseract.py prototype.
+# Text blocks are found with an OTSU threshold and a rectangular dilation, then all
+# crops are packed into a single canvas read by one tesseract invocation. pytesseract is
+# imported where it is used, so the block detection also serves Vision preprocessing.
+
+# Set up logging
+logging.basicConfig(level=logging.INFO,
+                    format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+def find_text_blocks(gray: np.ndarray, kernel_size: int = 25) -> list:
+    """
+    Finds the bounding boxes of the text blocks of a grayscale image.
+
+    Args:
+        gray (np.ndarray): Grayscale image.
+        kernel_size (int): Dilation kernel size, bigger means fewer and larger blocks.
+
+    Returns:
+        list: (x, y, w, h) boxes of the text blocks.
+    """
+    # Performing OTSU threshold
+    _, thresh = cv2.threshold(
+        gray, 0, 255, cv2.THRESH_OTSU | cv2.THRESH_BINARY_INV)
+
+    # Applying dilation on the threshold image to merge characters into blocks
+    rect_kernel = cv2.getStructuringElement(
+        cv2.MORPH_RECT, (kernel_size, kernel_size))
+    dilation = cv2.dilate(thresh, rect_kernel, iterations=1)
+
+    # Finding contours
+    contours, _ = cv2.findContours(
+        dilation, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_NONE)
+    return [cv2.boundingRect(contour) for contour in contours]
+
+
+def reading_order(boxes: list) -> list:
+    """
+    Sorts text blocks top to bottom, and left to right within a row.
+
+    Blocks whose vertical spans overlap by more than half of the smaller one are
+    considered on the same row.
+
+    Args:
+        boxes (list): (x, y, w, h) boxes of the text blocks.
+
+    Returns:
+        list: Indices of the boxes in reading order.
+    """
+    rows = []  # [top, bottom, [indices]]
+    for index in sorted(range(len(boxes)), key=lambda i: boxes[i][1]):
+        _, y, _, h = boxes[index]
+        for row in rows:
+            overlap = min(row[1], y + h) - max(row[0], y)
+            if overlap > 0.5 * min(h, row[1] - row[0]):
+                row[1] = max(row[1], y + h)
+                row[2].append(index)
+                break
+        else:
+            rows.append([y, y + h, [index]])
+
+    order = []
+    for _, _, indices in sorted(rows, key=lambda row: row[0]):
+        order.extend(sorted(indices, key=lambda i: boxes[i][0]))
+    return order
+
+
+def pack_blocks(gray: np.ndarray, boxes: list, order: list, padding: int = 10, gap: int = 30) -> tuple:
+    """
+    Stacks the crops of the text blocks on a white canvas, separated by blank gaps.
+
+    Args:
+        gray (np.ndarray): Grayscale image.
+        boxes (list): (x, y, w, h) boxes of the text blocks.
+        order (list): Indices of the boxes in the order they are stacked.
+        padding (int): White margin around each crop, in pixels.
+        gap (int): Blank space between two crops, in pixels.
+
+    Returns:
+        tuple: The canvas, and the top of each block on the canvas in stacking order.
+    """
+    width = max(boxes[index][2] for index in order) + 2 * padding
+    height = sum(boxes[index][3] for index in order) + gap * (len(order) - 1) + 2 * padding
+    canvas = np.full((height, width), 255, dtype=np.uint8)
+
+    offsets = []
+    top = padding
+    for index in order:
+        x, y, w, h = boxes[index]
+        canvas[top:top + h, padding:padding + w] = gray[y:y + h, x:x + w]
+        offsets.append(top)
+        top += h + gap
+    return canvas, offsets
+
+
+def extract_text_per_block(gray: np.ndarray, lang: str = "spa+eng") -> str:
+    """
+    Reads every text block with its own tesseract call, as in the original prototype.
+    Kept as the baseline of benchmark_block_ocr.
+
+    Args:
+        gray (np.ndarray): Grayscale image.
+        lang (str): Tesseract languages.
+
+    Returns:
+        str: The text of the blocks in reading order.
+    """
+    import pytesseract
+
+    boxes = find_text_blocks(gray)
+    texts = []
+    for index in reading_order(boxes):
+        x, y, w, h = boxes[index]
+        texts.append(pytesseract.image_to_string(
+            gray[y:y + h, x:x + w], lang=lang).strip())
+    return "\n".join(text for text in texts if text)
+
+
+def extract_text_packed(gray: np.ndarray, lang: str = "spa+eng", padding: int = 10, gap: int = 30) -> str:
+    """
+    Reads all text blocks of an image with a single tesseract call.
+
+    The crops are stacked in reading order on a white canvas, separated by blank
+    gaps. Each word returned by tesseract is mapped back to its block from its
+    vertical position on the canvas.
+
+    Args:
+        gray (np.ndarray): Grayscale image.
+        lang (str): Tesseract languages.
+        padding (int): White margin around each crop, in pixels.
+        gap (int): Blank space between two crops, in pixels.
+
+    Returns:
+        str: The text of the blocks in reading order.
+    """
+    return annotate_packed(gray, lang=lang, padding=padding, gap=gap)[0]
+
+
+def annotate_packed(gray: np.ndarray, lang: str = "spa+eng", padding: int = 10, gap: int = 30) -> tuple:
+    """
+    Same as extract_text_packed, also returning the words with their position on the original image.
+
+    Args:
+        gray (np.ndarray): Grayscale image.
+        lang (str): Tesseract languages.
+        padding (int): White margin around each crop, in pixels.
+        gap (int): Blank space between two crops, in pixels.
+
+    Returns:
+        tuple: The text of the blocks in reading order, and its word annotation columns
+               (see annotation_store.py), blocks numbered in reading order.
+    """
+    import pytesseract
+
+    words = new_word_columns()
+    boxes = find_text_blocks(gray)
+    if not boxes:
+        return "", words
+    order = reading_order(boxes)
+
+    # Stack the crops in reading order, offsets give the top of each block on the canvas
+    canvas, offsets = pack_blocks(gray, boxes, order, padding=padding, gap=gap)
+
+    data = pytesseract.image_to_data(
+        canvas, lang=lang, output_type=pytesseract.Output.DICT)
+
+    # Words of each block, grouped by tesseract line
+    block_lines = [{} for _ in order]
+    for i, word in enumerate(data["text"]):
+        word = word.strip()
+        if not word:
+            continue
+        center = data["top"][i] + data["height"][i] / 2
+        block = max(0, bisect.bisect_right(offsets, center) - 1)
+        line_key = (data["block_num"][i], data["par_num"][i], data["line_num"][i])
+        block_lines[block].setdefault(line_key, []).append(i)
+
+    texts = []
+    for block, lines in enumerate(block_lines):
+        # Shift from the canvas back to the block's position on the original image
+        x, y, _, _ = boxes[order[block]]
+        dx, dy = x - padding, y - offsets[block]
+        for line, indices in enumerate(lines.values()):
+            for position, i in enumerate(indices):
+                left, top = data["left"][i] + dx, data["top"][i] + dy
+                add_word(words, block, data["par_num"][i], line, position,
+                         (left, top, left + data["width"][i], top + data["height"][i]),
+                         max(0.0, float(data["conf"][i])) / 100, data["text"][i].strip())
+            texts.append(" ".join(data["text"][i].strip() for i in indices))
+    return "\n".join(text for text in texts if text), words
+
+
+def benchmark_block_ocr(image_paths: list, lang: str = "spa+eng") -> dict:
+    """
+    Compares the per-block tesseract calls with the packed single call.
+
+    Args:
+        image_paths (list): Cover images to read.
+        lang (str): Tesseract languages.
+
+    Returns:
+        dict: Images per second of both methods and the number of tesseract calls saved.
+    """
+    images = []
+    block_count = 0
+    for image_path in image_paths:
+        gray = cv2.cvtColor(cv2.imread(image_path), cv2.COLOR_BGR2GRAY)
+        images.append(gray)
+        block_count += len(find_text_blocks(gray))
+
+    results = {"images": len(images), "per_block_calls": block_count,
+               "packed_calls": len(images)}
+    for name, method in (("per_block", extract_text_per_block), ("packed", extract_text_packed)):
+        start_time = time.perf_counter()
+        for gray in images:
+            method(gray, lang=lang)
+        elapsed = time.perf_counter() - start_time
+        results[f"{name}_images_per_second"] = round(len(images) / elapsed, 3)
+
+    logging.info(
+        f"{results['images']} images: per-block {results['per_block_images_per_second']} img/s "
+        f"({results['per_block_calls']} tesseract calls), packed {results['packed_images_per_second']} img/s "
+        f"({results['packed_calls']} tesseract calls)")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmark per-block against packed tesseract OCR.")
+    parser.add_argument("images", nargs="+", help="Cover images to read.")
+    parser.add_argument("--lang", default="spa+eng")
+    args = parser.parse_args()
+
+    import pytesseract
+    pytesseract.pytesseract.tesseract_cmd = os.getenv(
+        "TESSERACT_CMD", pytesseract.pytesseract.tesseract_cmd)
+    print(benchmark_block_ocr(args.images, lang=args.lang))
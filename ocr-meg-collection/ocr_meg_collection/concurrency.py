@@ -0,0 +1,157 @@
+import time
+import logging
+import threading
+from contextlib import contextmanager
+
+# Set up logging
+logging.basicConfig(level=logging.INFO,
+                    format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+class OCRThrottledError(Exception):
+    """
+    Raised by an OCR backend when the API rejects a request for quota reasons
+    (RESOURCE_EXHAUSTED, HTTP 429/503). The image should be retried, not dropped.
+    """
+
+
+class AdaptiveConcurrencyLimiter:
+    def __init__(self, initial=4, min_limit=1, max_limit=32, target_latency=None,
+                 latency_tolerance=2.0, backoff_factor=0.5, cooldown=1.0):
+        """
+        Initializes the AdaptiveConcurrencyLimiter class.
+
+        Bounds the number of in-flight API requests with an AIMD policy: the limit grows
+        by one after a full window of healthy requests, and is multiplied by backoff_factor
+        when the API throttles. Slow requests and errors hold the limit where it is.
+
+        Args:
+            initial (int): Starting number of in-flight requests.
+            min_limit (int): Lowest limit the controller backs off to.
+            max_limit (int): Highest limit the controller grows to.
+            target_latency (float): Seconds above which a request is considered slow. If None,
+                                    a request is slow when it takes more than latency_tolerance
+                                    times the best average latency observed so far.
+            latency_tolerance (float): Allowed slowdown against the best average latency.
+            backoff_factor (float): Multiplier applied to the limit on throttling.
+            cooldown (float): Minimum seconds between two decreases, so a burst of rejections
+                              from the same window only backs off once.
+        """
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit)
+        self.limit = float(min(max(initial, self.min_limit), self.max_limit))
+        self.target_latency = target_latency
+        self.latency_tolerance = latency_tolerance
+        self.backoff_factor = backoff_factor
+        self.cooldown = cooldown
+
+        self.in_flight = 0
+        self._condition = threading.Condition()
+        self._healthy_in_window = 0
+        self._average_latency = None
+        self._best_latency = None
+        self._last_decrease = 0.0
+
+        # Metrics
+        self.peak_limit = int(self.limit)
+        self.lowest_limit = int(self.limit)
+        self.successes = 0
+        self.errors = 0
+        self.throttles = 0
+
+    @property
+    def current_limit(self) -> int:
+        """
+        The number of requests currently allowed in flight.
+        """
+        return int(self.limit)
+
+    @contextmanager
+    def slot(self):
+        """
+        Waits until a request may be sent and holds its slot for the duration of the block.
+        """
+        with self._condition:
+            while self.in_flight >= int(self.limit):
+                self._condition.wait()
+            self.in_flight += 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self.in_flight -= 1
+                self._condition.notify()
+
+    def on_success(self, latency: float):
+        """
+        Records a successful request and grows the limit after a healthy window.
+
+        Args:
+            latency (float): Duration of the request in seconds.
+        """
+        with self._condition:
+            self.successes += 1
+            self._average_latency = latency if self._average_latency is None \
+                else 0.8 * self._average_latency + 0.2 * latency
+            if self._best_latency is None or self._average_latency < self._best_latency:
+                self._best_latency = self._average_latency
+
+            if not self._is_healthy(latency):
+                self._healthy_in_window = 0
+                return
+
+            self._healthy_in_window += 1
+            if self._healthy_in_window >= int(self.limit) and self.limit < self.max_limit:
+                self.limit = min(self.max_limit, self.limit + 1)
+                self._healthy_in_window = 0
+                self.peak_limit = max(self.peak_limit, int(self.limit))
+                self._condition.notify_all()
+
+    def _is_healthy(self, latency: float) -> bool:
+        if self.target_latency is not None:
+            return latency <= self.target_latency
+        return latency <= self.latency_tolerance * self._best_latency
+
+    def on_error(self):
+        """
+        Records a failed request, which restarts the healthy window.
+        """
+        with self._condition:
+            self.errors += 1
+            self._healthy_in_window = 0
+
+    def on_throttle(self):
+        """
+        Records a throttled request and backs off the limit.
+        """
+        with self._condition:
+            self.throttles += 1
+            self._healthy_in_window = 0
+
+            now = time.monotonic()
+            if now - self._last_decrease < self.cooldown:
+                return
+            self._last_decrease = now
+
+            previous = self.current_limit
+            self.limit = max(self.min_limit, self.limit * self.backoff_factor)
+            self.lowest_limit = min(self.lowest_limit, int(self.limit))
+            if self.current_limit != previous:
+                logging.warning(
+                    f"API throttling, concurrency lowered from {previous} to {self.current_limit}.")
+
+    def stats(self) -> dict:
+        """
+        Returns the current concurrency level and the counts behind it.
+        """
+        with self._condition:
+            return {
+                "concurrency": int(self.limit),
+                "peak_concurrency": self.peak_limit,
+                "lowest_concurrency": self.lowest_limit,
+                "in_flight": self.in_flight,
+                "successes": self.successes,
+                "errors": self.errors,
+                "throttles": self.throttles,
+                "average_latency": round(self._average_latency or 0.0, 3),
+            }
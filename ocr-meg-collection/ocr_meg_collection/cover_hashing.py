@@ -0,0 +1,373 @@
+import os
+import json
+import hashlib
+import logging
+import argparse
+import threading
+from io import BytesIO
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+from ocr_meg_collection.storage import DirectoryStorage, open_storage
+
+# Perceptual hashes of the cover scans, used to find reissues, multi-copy folders and
+# gatefold sleeves whose covers are near-identical, so their OCR result can be reused.
+
+# Set up logging
+logging.basicConfig(level=logging.INFO,
+                    format='%(asctime)s - %(levelname)s - %(message)s')
+
+HASH_METHODS = ("phash", "dhash")
+
+
+def _load_gray(image: Image.Image, size: tuple) -> np.ndarray:
+    """
+    Downscales an image to a small grayscale array, decoding JPEGs at reduced size.
+    """
+    image.draft("L", (size[0] * 4, size[1] * 4))
+    return np.asarray(image.convert("L").resize(size, Image.LANCZOS), dtype=np.float64)
+
+
+def _bits_to_int(bits: np.ndarray) -> int:
+    return int("".join("1" if bit else "0" for bit in bits.flatten()), 2)
+
+
+def dhash(image: Image.Image, hash_size: int = 8) -> int:
+    """
+    Difference hash: compares each pixel of a downscaled grayscale image to its right neighbour.
+
+    Args:
+        image (Image.Image): The cover image.
+        hash_size (int): Side of the hash grid, the hash has hash_size ** 2 bits.
+
+    Returns:
+        int: The hash.
+    """
+    pixels = _load_gray(image, (hash_size + 1, hash_size))
+    return _bits_to_int(pixels[:, 1:] > pixels[:, :-1])
+
+
+def _dct_matrix(size: int) -> np.ndarray:
+    """
+    Returns the orthonormal DCT-II matrix of the given size.
+    """
+    k = np.arange(size)[:, None]
+    n = np.arange(size)[None, :]
+    matrix = np.cos(np.pi * (2 * n + 1) * k / (2 * size)) * np.sqrt(2.0 / size)
+    matrix[0] /= np.sqrt(2.0)
+    return matrix
+
+
+def phash(image: Image.Image, hash_size: int = 8, highfreq_factor: int = 4) -> int:
+    """
+    Perceptual hash: compares the low frequencies of the DCT of a downscaled grayscale image to their median.
+
+    Args:
+        image (Image.Image): The cover image.
+        hash_size (int): Side of the kept low frequency block, the hash has hash_size ** 2 bits.
+        highfreq_factor (int): The image is downscaled to hash_size * highfreq_factor pixels per side.
+
+    Returns:
+        int: The hash.
+    """
+    size = hash_size * highfreq_factor
+    pixels = _load_gray(image, (size, size))
+    dct = _dct_matrix(size)
+    low_frequencies = (dct @ pixels @ dct.T)[:hash_size, :hash_size]
+    return _bits_to_int(low_frequencies > np.median(low_frequencies))
+
+
+def hamming_distance(a: int, b: int) -> int:
+    """
+    Returns the number of differing bits of two hashes.
+    """
+    return bin(a ^ b).count("1")
+
+
+class BKTree:
+    """
+    Burkhard-Keller tree over the Hamming distance, to find all hashes within a
+    distance of a query without comparing it to every hash.
+    """
+
+    def __init__(self):
+        self._root = None  # [hash, items, {distance: child}]
+
+    def add(self, value: int, item):
+        """
+        Adds an item under its hash.
+        """
+        if self._root is None:
+            self._root = [value, [item], {}]
+            return
+
+        node = self._root
+        while True:
+            distance = hamming_distance(value, node[0])
+            if distance == 0:
+                node[1].append(item)
+                return
+            child = node[2].get(distance)
+            if child is None:
+                node[2][distance] = [value, [item], {}]
+                return
+            node = child
+
+    def search(self, value: int, max_distance: int) -> list:
+        """
+        Finds the items whose hash is within max_distance of value.
+
+        Returns:
+            list: (distance, item) tuples.
+        """
+        if self._root is None:
+            return []
+
+        matches = []
+        nodes = [self._root]
+        while nodes:
+            node = nodes.pop()
+            distance = hamming_distance(value, node[0])
+            if distance <= max_distance:
+                matches.extend((distance, item) for item in node[1])
+            # Triangle inequality: only children at distance-max..distance+max can match
+            for child_distance, child in node[2].items():
+                if distance - max_distance <= child_distance <= distance + max_distance:
+                    nodes.append(child)
+        return matches
+
+
+def iter_cover_paths(storage):
+    """
+    Yields the front and back cover scans of every LP folder of a storage (see storage.py).
+    """
+    for lp_id in storage.list_lps():
+        for pattern in ("*_cover01.jpg", "*_cover02.jpg"):
+            yield from storage.glob(lp_id, pattern)
+
+
+class CoverHashIndex:
+    def __init__(self, threshold=4, method="phash", hash_size=8, hash_cache_file=None, storage=None):
+        """
+        Initializes the CoverHashIndex class.
+
+        Indexes the perceptual hash of every cover, and groups covers whose hashes are within
+        threshold bits of each other into duplicate clusters for the report. The SHA-256 of each
+        cover is kept as well, so the OCR cache entries of its near-duplicates can be found.
+
+        Args:
+            threshold (int): Maximum Hamming distance between two near-duplicate covers. Back covers
+                             of the same label share their layout, so keep it tight and review the report.
+            method (str): "phash" (DCT, robust to rescans and recompression) or "dhash" (gradients, faster).
+            hash_size (int): Side of the hash grid, the hashes have hash_size ** 2 bits.
+            hash_cache_file (str): Optional JSON file keeping the hashes across runs, keyed by
+                                   path, size and modification time.
+            storage (Storage): Where the covers are read from, defaults to the file system.
+        """
+        if method not in HASH_METHODS:
+            raise ValueError(f"Unknown hash method: {method}")
+        self.threshold = threshold
+        self.method = method
+        self.hash_size = hash_size
+        self.hash_cache_file = hash_cache_file
+        self.storage = storage or DirectoryStorage(os.getcwd())
+
+        self._lock = threading.Lock()
+        self._hashes = {}   # path -> perceptual hash
+        self._digests = {}  # path -> SHA-256 of the file
+        self._tree = BKTree()
+        self._parent = {}   # union-find over the paths
+        self._members = {}  # cluster root -> paths of the cluster
+        self._distances = {}  # cluster root -> largest distance of a merged pair
+
+    def _hash_file(self, path: str) -> tuple:
+        """
+        Returns the perceptual hash and the SHA-256 of a cover file.
+        """
+        content = self.storage.read_bytes(path)
+        digest = hashlib.sha256(content).hexdigest()
+
+        with Image.open(BytesIO(content)) as image:
+            if self.method == "phash":
+                value = phash(image, hash_size=self.hash_size)
+            else:
+                value = dhash(image, hash_size=self.hash_size)
+        return value, digest
+
+    def _load_hash_cache(self) -> dict:
+        if not self.hash_cache_file or not os.path.exists(self.hash_cache_file):
+            return {}
+        with open(self.hash_cache_file, "r") as cache_file:
+            cached = json.load(cache_file)
+        if cached.get("method") != self.method or cached.get("hash_size") != self.hash_size:
+            return {}
+        return cached.get("covers", {})
+
+    def _save_hash_cache(self, covers: dict):
+        os.makedirs(os.path.dirname(os.path.abspath(self.hash_cache_file)), exist_ok=True)
+        tmp_path = f"{self.hash_cache_file}.tmp"
+        with open(tmp_path, "w") as cache_file:
+            json.dump({"method": self.method, "hash_size": self.hash_size, "covers": covers}, cache_file)
+        os.replace(tmp_path, self.hash_cache_file)
+
+    def build(self, paths, max_workers=8):
+        """
+        Hashes the covers and adds them to the index.
+
+        Args:
+            paths (iterable): Paths of the cover scans, e.g. iter_cover_paths(storage).
+            max_workers (int): Number of threads decoding the images.
+
+        Returns:
+            CoverHashIndex: The index itself.
+        """
+        paths = list(paths)
+        cached = self._load_hash_cache()
+        covers = {}
+
+        def hash_path(path):
+            size, mtime = self.storage.stat(path)
+            entry = cached.get(path)
+            if entry and entry["size"] == size and entry["mtime"] == mtime:
+                value, digest = int(entry["hash"], 16), entry["sha256"]
+            else:
+                value, digest = self._hash_file(path)
+            covers[path] = {"size": size, "mtime": mtime,
+                            "hash": format(value, "x"), "sha256": digest}
+            return path, value, digest
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for path, value, digest in executor.map(hash_path, paths):
+                self.add(path, value, digest)
+
+        if self.hash_cache_file:
+            self._save_hash_cache(covers)
+        logging.info(
+            f"Hashed {len(paths)} covers, {len(self.clusters())} duplicate clusters found "
+            f"(threshold {self.threshold} bits).")
+        return self
+
+    def add(self, path: str, value: int, digest: str):
+        """
+        Adds a hashed cover to the index and merges it with its near-duplicates.
+
+        Args:
+            path (str): Path of the cover scan.
+            value (int): Its perceptual hash.
+            digest (str): The SHA-256 of its bytes.
+        """
+        with self._lock:
+            self._hashes[path] = value
+            self._digests[path] = digest
+            self._parent[path] = path
+            self._members[path] = [path]
+            for distance, other in self._tree.search(value, self.threshold):
+                self._union(path, other, distance)
+            self._tree.add(value, path)
+
+    def _find(self, path: str) -> str:
+        root = path
+        while self._parent[root] != root:
+            root = self._parent[root]
+        # Path compression
+        while self._parent[path] != root:
+            self._parent[path], path = root, self._parent[path]
+        return root
+
+    def _union(self, a: str, b: str, distance: int):
+        root_a, root_b = self._find(a), self._find(b)
+        largest = max(distance, self._distances.get(root_a, 0), self._distances.get(root_b, 0))
+        if root_a != root_b:
+            self._parent[root_a] = root_b
+            self._members[root_b].extend(self._members.pop(root_a))
+            self._distances.pop(root_a, None)
+        self._distances[root_b] = largest
+
+    def cluster_of(self, path: str):
+        """
+        Returns the identifier of the duplicate cluster of a cover, None if the cover is not indexed.
+        """
+        with self._lock:
+            if path not in self._parent:
+                return None
+            return self._find(path)
+
+    def near_duplicates(self, path: str) -> list:
+        """
+        Returns the other covers whose hash is within threshold bits of the hash of a cover, closest first.
+
+        Unlike the clusters, which chain neighbours of neighbours and are only meant for the report,
+        every cover returned is itself a near-duplicate of this one, so its OCR result can be reused.
+        """
+        with self._lock:
+            if path not in self._hashes:
+                return []
+            matches = self._tree.search(self._hashes[path], self.threshold)
+        return [other for _, other in sorted(matches) if other != path]
+
+    def duplicate_digests(self, path: str) -> list:
+        """
+        Returns the SHA-256 of the near-duplicates of a cover (see near_duplicates), whose OCR result can be reused.
+        """
+        others = self.near_duplicates(path)
+        with self._lock:
+            return [self._digests[other] for other in others]
+
+    def clusters(self) -> list:
+        """
+        Returns the clusters of near-duplicate covers, largest first.
+
+        Returns:
+            list: One dictionary per cluster of at least two covers, with its members and the
+                  largest Hamming distance between two merged members.
+        """
+        with self._lock:
+            clusters = [{"members": sorted(paths), "max_distance": self._distances.get(root, 0)}
+                        for root, paths in self._members.items() if len(paths) > 1]
+        return sorted(clusters, key=lambda cluster: -len(cluster["members"]))
+
+    def write_report(self, file_path: str, extra: dict = None) -> dict:
+        """
+        Writes the duplicate clusters to a JSON report.
+
+        Args:
+            file_path (str): Destination of the report.
+            extra (dict): Additional run statistics to include, e.g. the OCR calls saved.
+
+        Returns:
+            dict: The report.
+        """
+        clusters = self.clusters()
+        report = {
+            "method": self.method,
+            "threshold": self.threshold,
+            "covers": len(self._hashes),
+            "clusters": len(clusters),
+            "duplicate_covers": sum(len(cluster["members"]) - 1 for cluster in clusters),
+            **(extra or {}),
+            "duplicate_clusters": clusters,
+        }
+        os.makedirs(os.path.dirname(os.path.abspath(file_path)), exist_ok=True)
+        with open(file_path, "w") as report_file:
+            json.dump(report, report_file, indent=2)
+        logging.info(
+            f"Duplicate cover report stored in {file_path}: {report['clusters']} clusters, "
+            f"{report['duplicate_covers']} duplicate covers.")
+        return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Find near-duplicate LP covers with perceptual hashes.")
+    parser.add_argument("base_dir", help="Directory containing the LP folders, or their archives.")
+    parser.add_argument("--threshold", type=int, default=4)
+    parser.add_argument("--method", choices=HASH_METHODS, default="phash")
+    parser.add_argument("--report", default="duplicate_covers.json")
+    args = parser.parse_args()
+
+    storage = open_storage(args.base_dir)
+    index = CoverHashIndex(threshold=args.threshold, method=args.method, storage=storage)
+    index.build(iter_cover_paths(storage))
+    index.write_report(args.report)
@@ -0,0 +1,96 @@
+import os
+import json
+import time
+import logging
+import threading
+
+# Set up logging
+logging.basicConfig(level=logging.INFO,
+                    format='%(asctime)s - %(levelname)s - %(message)s')
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+
+# Cover images whose OCR failed, waiting for a retry-failed run
+DEAD_LETTER_FILE = os.path.join(
+    script_dir, '..', 'ds_pipeline', 'ocr_dead_letter.json')
+
+
+class DeadLetterStore:
+    def __init__(self, file_path=DEAD_LETTER_FILE):
+        """
+        Initializes the DeadLetterStore class.
+
+        A small JSON file listing the cover images whose OCR failed, keyed by image path, with
+        their LP, cover side, error class and message, and the number of failed attempts. An
+        image leaves the store as soon as it is read successfully.
+
+        Args:
+            file_path (str): Location of the dead-letter file.
+        """
+        self.file_path = file_path
+        self._lock = threading.Lock()
+        self._entries = {}
+        if os.path.exists(file_path):
+            with open(file_path, "r") as dead_letter_file:
+                self._entries = json.load(dead_letter_file)
+
+    def _save(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.file_path)), exist_ok=True)
+        tmp_path = f"{self.file_path}.tmp"
+        with open(tmp_path, "w") as dead_letter_file:
+            json.dump(self._entries, dead_letter_file, indent=2)
+        os.replace(tmp_path, self.file_path)
+
+    def record(self, lp_id: str, side: int, image_path: str, error: Exception):
+        """
+        Records a failed OCR attempt of a cover image.
+
+        Args:
+            lp_id (str): The LP of the image.
+            side (int): 0 for the front cover, 1 for the back cover.
+            image_path (str): Path of the image in the storage it was read from.
+            error (Exception): The error that made the OCR fail.
+        """
+        now = time.strftime("%Y-%m-%dT%H:%M:%S")
+        with self._lock:
+            entry = self._entries.setdefault(
+                image_path, {"lp_id": lp_id, "side": side, "attempts": 0, "first_failed": now})
+            entry.update({"error_class": type(error).__name__, "error": str(error),
+                          "last_failed": now})
+            entry["attempts"] += 1
+            self._save()
+
+    def resolve(self, image_path: str):
+        """
+        Removes an image that was read successfully.
+        """
+        with self._lock:
+            if self._entries.pop(image_path, None) is not None:
+                self._save()
+
+    def entries(self, max_attempts: int = None) -> dict:
+        """
+        Returns the failed images, only those that failed fewer than max_attempts times if given.
+        """
+        with self._lock:
+            return {image_path: dict(entry) for image_path, entry in self._entries.items()
+                    if max_attempts is None or entry["attempts"] < max_attempts}
+
+    def lp_ids(self, max_attempts: int = None) -> list:
+        """
+        Returns the LPs with at least one failed image, see entries.
+        """
+        return sorted({entry["lp_id"] for entry in self.entries(max_attempts).values()})
+
+    def error_counts(self) -> dict:
+        """
+        Returns the number of failed images per error class.
+        """
+        counts = {}
+        for entry in self.entries().values():
+            counts[entry["error_class"]] = counts.get(entry["error_class"], 0) + 1
+        return counts
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
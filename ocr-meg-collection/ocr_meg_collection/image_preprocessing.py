@@ -0,0 +1,255 @@
+import logging
+import threading
+import time
+from io import BytesIO
+
+from PIL import Image, ImageOps
+
+# Set up logging
+logging.basicConfig(level=logging.INFO,
+                    format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+class CoverPreprocessor:
+    def __init__(self, max_long_edge=2048, target_dpi=None, jpeg_quality=85):
+        """
+        Initializes the CoverPreprocessor class.
+
+        Shrinks a cover scan before it is uploaded for OCR: the image is decoded at reduced
+        size, downscaled to the target long edge and/or DPI, stripped of its EXIF/ICC
+        metadata and re-encoded as JPEG at the given quality.
+
+        Args:
+            max_long_edge (int): Maximum length in pixels of the longest side, None to disable.
+            target_dpi (int): Resolution to downscale to when the scan records its DPI, None to disable.
+            jpeg_quality (int): JPEG quality used to re-encode the cover (1-95).
+        """
+        self.max_long_edge = max_long_edge
+        self.target_dpi = target_dpi
+        self.jpeg_quality = jpeg_quality
+
+        self._lock = threading.Lock()
+        self.images = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.seconds = 0.0
+
+    def settings(self) -> dict:
+        """
+        Returns the settings that change the uploaded payload, part of the OCR cache key.
+        """
+        return {
+            "stage": "downscale",
+            "max_long_edge": self.max_long_edge,
+            "target_dpi": self.target_dpi,
+            "jpeg_quality": self.jpeg_quality,
+        }
+
+    def _target_size(self, size: tuple, dpi) -> tuple:
+        """
+        Computes the size of the downscaled cover, never larger than the original.
+
+        Args:
+            size (tuple): Width and height of the scan in pixels.
+            dpi (tuple): Horizontal and vertical resolution recorded in the scan, if any.
+
+        Returns:
+            tuple: Target width and height in pixels.
+        """
+        width, height = size
+        scale = 1.0
+        if self.max_long_edge:
+            scale = min(scale, self.max_long_edge / max(width, height))
+        if self.target_dpi and dpi and dpi[0]:
+            scale = min(scale, self.target_dpi / float(dpi[0]))
+        return max(1, int(width * scale)), max(1, int(height * scale))
+
+    def process(self, content: bytes) -> bytes:
+        """
+        Downscales and recompresses the bytes of a cover scan.
+
+        Args:
+            content (bytes): The original image file.
+
+        Returns:
+            bytes: The re-encoded JPEG, or the original bytes if re-encoding did not make them smaller.
+        """
+        start_time = time.perf_counter()
+
+        with Image.open(BytesIO(content)) as image:
+            target_size = self._target_size(image.size, image.info.get("dpi"))
+
+            # Let the JPEG decoder scale down by 1/2, 1/4 or 1/8 while decoding, so the
+            # full resolution bitmap of a large scan is never held in memory
+            image.draft("RGB", target_size)
+
+            # Apply the EXIF orientation before the metadata is dropped
+            cover = ImageOps.exif_transpose(image).convert("RGB")
+            if cover.size[0] > target_size[0] or cover.size[1] > target_size[1]:
+                cover.thumbnail(target_size, Image.LANCZOS)
+
+            # Saving without exif/icc_profile arguments strips the metadata
+            output = BytesIO()
+            cover.save(output, "JPEG", quality=self.jpeg_quality, optimize=True)
+            processed = output.getvalue()
+
+        if len(processed) >= len(content):
+            processed = content
+
+        with self._lock:
+            self.images += 1
+            self.bytes_in += len(content)
+            self.bytes_out += len(processed)
+            self.seconds += time.perf_counter() - start_time
+        return processed
+
+    def stats(self) -> dict:
+        """
+        Returns the number of processed covers and the bytes saved on the uploads.
+        """
+        with self._lock:
+            return {
+                "stage": "downscale",
+                "images": self.images,
+                "bytes_in": self.bytes_in,
+                "bytes_out": self.bytes_out,
+                "bytes_saved": self.bytes_in - self.bytes_out,
+                "seconds": round(self.seconds, 3),
+            }
+
+
+class TextRegionCropper:
+    def __init__(self, kernel_size=25, min_block_area=0.0005, max_ink_ratio=0.6, max_blocks=80,
+                 max_coverage=0.6, padding=10, gap=30, jpeg_quality=85):
+        """
+        Initializes the TextRegionCropper class.
+
+        Sends only the text of a cover to OCR: text blocks are found with the OTSU threshold
+        and dilation of block_ocr.find_text_blocks, and their crops are stacked in reading
+        order into a grayscale mosaic that replaces the full scan. Back covers are mostly
+        artwork and margins, so the mosaic is usually a fraction of the upload.
+
+        The full image is sent instead when detection is unsure: no block found, too many
+        blocks (artwork breaking up into noise), or blocks covering most of the cover.
+
+        Args:
+            kernel_size (int): Dilation kernel size, bigger means fewer and larger blocks.
+            min_block_area (float): Blocks smaller than this fraction of the cover are dropped as specks.
+            max_ink_ratio (float): Blocks whose thresholded pixels are darker than this fraction are
+                                   solid artwork rather than text, and are dropped.
+            max_blocks (int): Above this many blocks the detection is considered unreliable.
+            max_coverage (float): Above this fraction of the cover covered by blocks, cropping saves
+                                  little and risks cutting text, so the full image is kept.
+            padding (int): White margin around the mosaic, in pixels.
+            gap (int): Blank space between two crops, in pixels.
+            jpeg_quality (int): JPEG quality used to encode the mosaic (1-95).
+        """
+        self.kernel_size = kernel_size
+        self.min_block_area = min_block_area
+        self.max_ink_ratio = max_ink_ratio
+        self.max_blocks = max_blocks
+        self.max_coverage = max_coverage
+        self.padding = padding
+        self.gap = gap
+        self.jpeg_quality = jpeg_quality
+
+        self._lock = threading.Lock()
+        self.images = 0
+        self.cropped = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.seconds = 0.0
+
+    def settings(self) -> dict:
+        """
+        Returns the settings that change the uploaded payload, part of the OCR cache key.
+        """
+        return {
+            "stage": "text-regions",
+            "kernel_size": self.kernel_size,
+            "min_block_area": self.min_block_area,
+            "max_ink_ratio": self.max_ink_ratio,
+            "max_blocks": self.max_blocks,
+            "max_coverage": self.max_coverage,
+            "padding": self.padding,
+            "gap": self.gap,
+            "jpeg_quality": self.jpeg_quality,
+        }
+
+    def _text_blocks(self, gray) -> list:
+        """
+        Finds the text blocks worth sending, or an empty list when the full image should be sent.
+
+        Args:
+            gray (np.ndarray): Grayscale cover.
+
+        Returns:
+            list: (x, y, w, h) boxes of the text blocks.
+        """
+        import cv2
+        from ocr_meg_collection.block_ocr import find_text_blocks
+
+        height, width = gray.shape
+        area = float(width * height)
+        _, ink = cv2.threshold(gray, 0, 1, cv2.THRESH_OTSU | cv2.THRESH_BINARY_INV)
+        boxes = [(x, y, w, h) for x, y, w, h in find_text_blocks(gray, kernel_size=self.kernel_size)
+                 if w * h >= self.min_block_area * area
+                 and ink[y:y + h, x:x + w].mean() <= self.max_ink_ratio]
+
+        if not boxes or len(boxes) > self.max_blocks:
+            return []
+        if sum(w * h for _, _, w, h in boxes) > self.max_coverage * area:
+            return []
+        return boxes
+
+    def process(self, content: bytes) -> bytes:
+        """
+        Replaces the cover by a mosaic of its text regions.
+
+        Args:
+            content (bytes): The image file.
+
+        Returns:
+            bytes: The JPEG mosaic, or the original bytes when detection is unsure or the
+                   mosaic is not smaller.
+        """
+        import cv2
+        import numpy as np
+        from ocr_meg_collection.block_ocr import reading_order, pack_blocks
+
+        start_time = time.perf_counter()
+
+        processed = content
+        gray = cv2.imdecode(np.frombuffer(content, np.uint8), cv2.IMREAD_GRAYSCALE)
+        boxes = self._text_blocks(gray) if gray is not None else []
+        if boxes:
+            mosaic, _ = pack_blocks(gray, boxes, reading_order(boxes),
+                                    padding=self.padding, gap=self.gap)
+            encoded, buffer = cv2.imencode(
+                ".jpg", mosaic, [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])
+            if encoded and len(buffer) < len(content):
+                processed = buffer.tobytes()
+
+        with self._lock:
+            self.images += 1
+            self.cropped += processed is not content
+            self.bytes_in += len(content)
+            self.bytes_out += len(processed)
+            self.seconds += time.perf_counter() - start_time
+        return processed
+
+    def stats(self) -> dict:
+        """
+        Returns the number of cropped covers, the full image fallbacks and the bytes saved on the uploads.
+        """
+        with self._lock:
+            return {
+                "stage": "text-regions",
+                "images": self.images,
+                "cropped": self.cropped,
+                "fallbacks": self.images - self.cropped,
+                "bytes_in": self.bytes_in,
+                "bytes_out": self.bytes_out,
+                "bytes_saved": self.bytes_in - self.bytes_out,
+                "seconds": round(self.seconds, 3),
+            }
@@ -0,0 +1,168 @@
+import os
+import json
+import time
+import logging
+import argparse
+import statistics
+
+# Set up logging
+logging.basicConfig(level=logging.INFO,
+                    format='%(asctime)s - %(levelname)s - %(message)s')
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+
+# One JSONL file of request metrics per classification run
+METRICS_DIR = os.path.join(script_dir, '..', 'ds_pipeline', 'inference_metrics')
+
+# Price in USD per 1000 characters (input, output) of each backend, see the Cost Breakdown of the README.
+# Gemini 1.5 Pro on Vertex AI bills characters, not tokens. Backends not listed are free (local models).
+PRICES_PER_1K_CHARS = {
+    "vertex": (0.00125, 0.00375),
+}
+
+# Fields summarized at the end of a run
+SUMMARY_FIELDS = ("latency", "ttft", "quota_wait", "model_seconds", "input_tokens", "output_tokens", "cost_usd")
+
+
+def percentile(values: list, q: int):
+    """
+    Returns the q-th percentile of values, None if there are none.
+    """
+    if len(values) < 2:
+        return values[0] if values else None
+    return statistics.quantiles(values, n=100, method="inclusive")[q - 1]
+
+
+def estimate_cost(backend_name: str, input_chars: int, output_chars: int) -> float:
+    """
+    Estimates the price of a request in USD from its billed characters.
+
+    Args:
+        backend_name (str): Name of the LLM backend, e.g. "vertex".
+        input_chars (int): Characters sent, system instruction included, over all the attempts.
+        output_chars (int): Characters received over all the attempts, aborted streams included.
+
+    Returns:
+        float: The estimated cost, 0 for a local backend.
+    """
+    input_price, output_price = PRICES_PER_1K_CHARS.get(backend_name, (0.0, 0.0))
+    return input_chars / 1000 * input_price + output_chars / 1000 * output_price
+
+
+class InferenceMetrics:
+    def __init__(self, metrics_file: str = None):
+        """
+        Initializes the InferenceMetrics class.
+
+        Collects one record per LLM request of a classification run: LPs, token usage, time to
+        first token, latency, time waited for quota, retries and estimated cost. Each record is
+        appended to a JSONL file as soon as the request ends, so an interrupted run keeps its
+        metrics, and summary() gives the percentiles of the run.
+
+        Args:
+            metrics_file (str): JSONL file of the run, ds_pipeline/inference_metrics/inference_metrics_<run>.jsonl
+                                by default. Created on the first record.
+        """
+        self.metrics_file = metrics_file or os.path.join(
+            METRICS_DIR, f"inference_metrics_{time.strftime('%Y%m%d-%H%M%S')}.jsonl")
+        self.records = []
+        self._file = None
+
+    def record(self, record: dict):
+        """
+        Stores the metrics of one request and appends them to the metrics file.
+
+        Args:
+            record (dict): Metrics of the request, see AIClassifier._generate_text.
+        """
+        self.records.append(record)
+        if self._file is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.metrics_file)), exist_ok=True)
+            self._file = open(self.metrics_file, "a", buffering=1)
+        self._file.write(json.dumps(record) + "\n")
+
+    def close(self):
+        """
+        Closes the metrics file.
+        """
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def summary(self) -> dict:
+        """
+        Summarizes the recorded requests.
+
+        Returns:
+            dict: Request, retry and cost totals, and the p50/p95/p99 of each SUMMARY_FIELDS field.
+        """
+        return summarize(self.records)
+
+    def log_summary(self):
+        """
+        Logs the summary of the recorded requests.
+        """
+        if not self.records:
+            return
+        summary = self.summary()
+        logging.info(
+            f"Inference metrics: {summary['requests']} requests, {summary['retries']} retries, "
+            f"{summary['input_tokens']} input / {summary['output_tokens']} output tokens, "
+            f"estimated cost ${summary['cost_usd']:.4f}, stored in {self.metrics_file}")
+        for field in SUMMARY_FIELDS:
+            values = summary[field + "_percentiles"]
+            if values["p50"] is None:
+                continue
+            # Seconds, whole tokens, or fractions of a cent
+            precision = 0 if field.endswith("tokens") else 5 if field == "cost_usd" else 3
+            logging.info(f"  {field}: " + ", ".join(
+                f"{q} {value:.{precision}f}" for q, value in values.items()))
+
+
+def summarize(records: list) -> dict:
+    """
+    Summarizes request records, as written by InferenceMetrics.
+
+    Args:
+        records (list): Metrics of each request.
+
+    Returns:
+        dict: Request, retry, token and cost totals, and the p50/p95/p99 of each SUMMARY_FIELDS field.
+    """
+    summary = {
+        "requests": len(records),
+        "retries": sum(record["throttle_retries"] + record["stream_retries"] for record in records),
+        "input_tokens": sum(record["input_tokens"] for record in records),
+        "output_tokens": sum(record["output_tokens"] for record in records),
+        "cost_usd": sum(record["cost_usd"] for record in records),
+    }
+    for field in SUMMARY_FIELDS:
+        values = sorted(record[field] for record in records if record.get(field) is not None)
+        summary[field + "_percentiles"] = {f"p{q}": percentile(values, q) for q in (50, 95, 99)}
+    return summary
+
+
+def read_metrics(metrics_file: str) -> list:
+    """
+    Reads the records of a metrics file.
+    """
+    with open(metrics_file, "r") as file:
+        return [json.loads(line) for line in file if line.strip()]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Summarize the request metrics of a classification run.")
+    parser.add_argument("metrics_file", nargs="?",
+                        help="JSONL metrics file, the latest one of ds_pipeline/inference_metrics by default.")
+    args = parser.parse_args()
+
+    metrics_file = args.metrics_file
+    if metrics_file is None:
+        files = sorted(f for f in os.listdir(METRICS_DIR) if f.endswith(".jsonl"))
+        if not files:
+            raise SystemExit(f"No metrics file in {METRICS_DIR}")
+        metrics_file = os.path.join(METRICS_DIR, files[-1])
+
+    metrics = InferenceMetrics(metrics_file)
+    metrics.records = read_metrics(metrics_file)
+    metrics.log_summary()
@@ -0,0 +1,362 @@
+import os
+import time
+import asyncio
+import logging
+import statistics
+import vertexai
+from vertexai.generative_models import GenerativeModel
+from google.api_core import exceptions as core_exceptions
+from dotenv import load_dotenv
+from ocr_meg_collection.tokens import CHARS_PER_TOKEN
+
+# Set up logging
+logging.basicConfig(level=logging.INFO,
+                    format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Load environment variables from the .env file
+load_dotenv()
+
+# Local Ollama server, or a stand-in (python -m ocr_meg_collection.stand_in_servers --api ollama)
+OLLAMA_HOST = os.getenv("OLLAMA_HOST", "http://127.0.0.1:11434")
+OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "mistral-nemo:12b-instruct-2407-q3_K_S")
+
+# API errors meaning the quota is exhausted or the service is overloaded
+THROTTLING_ERRORS = (core_exceptions.ResourceExhausted,
+                     core_exceptions.TooManyRequests,
+                     core_exceptions.ServiceUnavailable)
+
+
+class LLMThrottledError(Exception):
+    """
+    Raised by an LLM backend when the request is rejected for quota or load reasons
+    (RESOURCE_EXHAUSTED, HTTP 429/503). The request should be retried, not dropped.
+    """
+
+
+class LLMChunk:
+    """
+    Part of a streamed LLM response. The last chunk of a response carries its finish
+    reason (e.g. "STOP", "MAX_TOKENS") and its token usage ({"input_tokens", "output_tokens"}),
+    the others only text.
+    """
+    __slots__ = ("text", "finish_reason", "usage")
+
+    def __init__(self, text: str = "", finish_reason: str = None, usage: dict = None):
+        self.text = text
+        self.finish_reason = finish_reason
+        self.usage = usage
+
+
+class LLMBackend:
+    """
+    Interface of the LLM engines AIClassifier sends its requests to.
+
+    A backend turns the prompt parts of a request (the prompt and the OCR text) into a
+    stream of LLMChunk. Prompt construction, JSON extraction and output writing stay in
+    AIClassifier, so every backend answers the same requests. Quota rejections are
+    reported as LLMThrottledError so the classifier can retry them.
+    """
+    name = "base"
+
+    def __init__(self, model_name: str, system_prompt: str, generation_config: dict):
+        self.model_name = model_name
+        self.system_prompt = system_prompt
+        self.generation_config = generation_config
+
+    def estimate_tokens(self, contents: list) -> int:
+        """
+        Estimates the input tokens of a request from its characters, system instruction included.
+        """
+        return sum(len(part) for part in [self.system_prompt] + contents) // CHARS_PER_TOKEN + 1
+
+    async def count_tokens(self, contents: list) -> int:
+        """
+        Counts the input tokens of a request, system instruction included.
+
+        Args:
+            contents (list): Prompt parts of the request.
+
+        Returns:
+            int: Number of input tokens.
+        """
+        return self.estimate_tokens(contents)
+
+    async def stream(self, contents: list, response_schema: dict = None):
+        """
+        Sends a request and yields its response as it is generated.
+
+        Args:
+            contents (list): Prompt parts of the request.
+            response_schema (dict): Structure the JSON answer must follow (OpenAPI subset),
+                                    for the backends supporting constrained generation.
+
+        Yields:
+            LLMChunk: The parts of the response.
+        """
+        raise NotImplementedError
+        yield
+
+    async def close(self):
+        """
+        Releases the resources held by the backend.
+        """
+
+
+class VertexBackend(LLMBackend):
+    name = "vertex"
+
+    def __init__(self, model_name: str, system_prompt: str, generation_config: dict,
+                 safety_settings: list = None, project: str = None, location: str = "us-central1"):
+        """
+        Initializes the VertexBackend class.
+
+        Gemini on Vertex AI, through the async API of one GenerativeModel shared by all the requests
+        of an event loop. The model caches its grpc.aio clients, which belong to the loop they were
+        opened on, so a new model is created for each loop (e.g. each asyncio.run of the sync wrappers).
+
+        Args:
+            model_name (str): Gemini model, e.g. "gemini-1.5-pro-001".
+            system_prompt (str): System instruction of the requests.
+            generation_config (dict): Generation settings (temperature, output tokens, ...).
+            safety_settings (list): SafetySetting of the requests.
+            project (str): Google Cloud project billed for the requests.
+            location (str): Region of the Vertex AI endpoint.
+        """
+        super().__init__(model_name, system_prompt, generation_config)
+
+        # Initialize Vertex AI
+        vertexai.init(project=project, location=location)
+        logging.info("Initialized Vertex AI.")
+
+        self.safety_settings = safety_settings
+        self.model = None
+        self._model_loop = None
+
+    def _get_model(self) -> GenerativeModel:
+        loop = asyncio.get_running_loop()
+        if self._model_loop is not loop:
+            # Instantiate the generative model once per event loop, shared by all its requests
+            self.model = GenerativeModel(
+                self.model_name,
+                generation_config=self.generation_config,
+                system_instruction=self.system_prompt,
+                safety_settings=self.safety_settings
+            )
+            self._model_loop = loop
+        return self.model
+
+    async def count_tokens(self, contents: list) -> int:
+        return (await self._get_model().count_tokens_async(contents)).total_tokens
+
+    async def stream(self, contents: list, response_schema: dict = None):
+        generation_config = None
+        if response_schema:
+            generation_config = dict(self.generation_config, response_schema=response_schema)
+        try:
+            responses = await self._get_model().generate_content_async(
+                contents, generation_config=generation_config, stream=True)
+            async for response in responses:
+                yield self._read_chunk(response)
+        except THROTTLING_ERRORS as e:
+            raise LLMThrottledError(str(e)) from e
+
+    @staticmethod
+    def _read_chunk(response) -> LLMChunk:
+        finish_reason = None
+        candidates = getattr(response, "candidates", None)
+        if candidates:
+            reason = getattr(candidates[0].finish_reason, "name", None)
+            if reason and reason != "FINISH_REASON_UNSPECIFIED":
+                finish_reason = reason
+
+        usage = None
+        usage_metadata = getattr(response, "usage_metadata", None)
+        if usage_metadata is not None:
+            usage = {"input_tokens": usage_metadata.prompt_token_count,
+                     "output_tokens": usage_metadata.candidates_token_count}
+        return LLMChunk(response.text, finish_reason, usage)
+
+    async def close(self):
+        if self.model is not None and self._model_loop is asyncio.get_running_loop():
+            close_async_client = getattr(self.model, "_close_async_client", None)
+            if close_async_client is not None:
+                await close_async_client()
+            else:
+                # Clients cached by the model (google-cloud-aiplatform 1.66)
+                for attribute in ("_prediction_async_client_value", "_llm_utility_async_client_value"):
+                    client = getattr(self.model, attribute, None)
+                    if client is not None:
+                        await client.transport.close()
+        self.model = self._model_loop = None
+
+
+class OllamaBackend(LLMBackend):
+    name = "ollama"
+
+    def __init__(self, system_prompt: str, generation_config: dict, model_name: str = OLLAMA_MODEL,
+                 host: str = OLLAMA_HOST, context_tokens: int = 16384, keep_alive: str = "30m"):
+        """
+        Initializes the OllamaBackend class.
+
+        A model served by a local Ollama server, through ollama.AsyncClient. There is no
+        per-minute quota: the throughput is bound by the hardware and the number of requests
+        the server runs in parallel (OLLAMA_NUM_PARALLEL), so pair it with a RateLimiter
+        without quotas and a max_concurrency matching the server.
+
+        Ollama constrains a JSON answer to a single object, in packed mode the LPs after the
+        first one are then re-run on their own: prefer the default one-LP-per-request mode.
+
+        Args:
+            system_prompt (str): System message of the requests.
+            generation_config (dict): Generation settings, temperature, top_p and max_output_tokens
+                                      are mapped to the Ollama options.
+            model_name (str): Ollama model tag.
+            host (str): URL of the Ollama server.
+            context_tokens (int): Context window of the model (num_ctx). The Ollama default (2048)
+                                  truncates the prompt of an LP.
+            keep_alive (str): How long the server keeps the model loaded after a request.
+        """
+        options = {
+            "temperature": generation_config.get("temperature"),
+            "top_p": generation_config.get("top_p"),
+            "num_predict": generation_config.get("max_output_tokens"),
+            "num_ctx": context_tokens,
+        }
+        options = {key: value for key, value in options.items() if value is not None}
+        self.format = "json" if generation_config.get("response_mime_type") == "application/json" else ""
+        super().__init__(model_name, system_prompt, dict(options, format=self.format))
+
+        self.host = host
+        self.options = options
+        self.keep_alive = keep_alive
+        # The HTTP connections belong to the event loop they were opened on
+        self._client = None
+        self._client_loop = None
+
+    def _get_client(self):
+        from ollama import AsyncClient
+
+        loop = asyncio.get_running_loop()
+        if self._client_loop is not loop:
+            self._client = AsyncClient(host=self.host)
+            self._client_loop = loop
+        return self._client
+
+    async def stream(self, contents: list, response_schema: dict = None):
+        # Ollama only constrains the answer to JSON, the schema is described by the prompt
+        from ollama import ResponseError
+
+        messages = [{"role": "system", "content": self.system_prompt},
+                    {"role": "user", "content": "".join(contents)}]
+        try:
+            parts = await self._get_client().chat(model=self.model_name, messages=messages, stream=True,
+                                           format=self.format, options=self.options,
+                                           keep_alive=self.keep_alive)
+            async for part in parts:
+                text = part.get("message", {}).get("content", "")
+                if not part.get("done"):
+                    yield LLMChunk(text)
+                    continue
+                yield LLMChunk(text, part.get("done_reason", "stop").upper(), {
+                    "input_tokens": part.get("prompt_eval_count", 0),
+                    "output_tokens": part.get("eval_count", 0)})
+        except ResponseError as e:
+            if e.status_code in (429, 503):
+                raise LLMThrottledError(e.error) from e
+            raise
+
+    async def close(self):
+        if self._client is not None and self._client_loop is asyncio.get_running_loop():
+            await self._client._client.aclose()
+        self._client = self._client_loop = None
+
+
+async def benchmark_backend(backend: LLMBackend, requests: list, max_concurrency: int = 4,
+                            validate=None, response_schema: dict = None) -> dict:
+    """
+    Sends the same requests to a backend and measures its latency and throughput.
+
+    Args:
+        backend (LLMBackend): Backend to measure.
+        requests (list): Prompt parts of each request.
+        max_concurrency (int): Requests in flight at once.
+        validate (callable): Tells whether a response is usable, e.g. parses as JSON.
+        response_schema (dict): Structure the answers must follow.
+
+    Returns:
+        dict: Request, failure and throttle counts, time to first token and latency percentiles
+              in seconds, output tokens per second and share of valid responses.
+    """
+    semaphore = asyncio.Semaphore(max_concurrency)
+    first_token_times, latencies, output_tokens = [], [], []
+    counts = {"failed": 0, "throttled": 0, "valid": 0}
+
+    async def send(contents):
+        async with semaphore:
+            start_time = time.monotonic()
+            first_token, texts, usage = None, [], None
+            try:
+                async for chunk in backend.stream(contents, response_schema):
+                    if chunk.text and first_token is None:
+                        first_token = time.monotonic() - start_time
+                    texts.append(chunk.text)
+                    usage = chunk.usage or usage
+            except LLMThrottledError:
+                counts["throttled"] += 1
+                return
+            except Exception as e:
+                logging.warning(f"Benchmark request to '{backend.name}' failed: {e}")
+                counts["failed"] += 1
+                return
+            latencies.append(time.monotonic() - start_time)
+            first_token_times.append(first_token if first_token is not None else latencies[-1])
+            output_tokens.append(usage["output_tokens"] if usage else 0)
+            if validate is None or validate("".join(texts)):
+                counts["valid"] += 1
+
+    start_time = time.monotonic()
+    await asyncio.gather(*(send(contents) for contents in requests))
+    elapsed = time.monotonic() - start_time
+
+    def percentile(values, q):
+        if len(values) < 2:
+            return round(values[0], 3) if values else None
+        return round(statistics.quantiles(values, n=100, method="inclusive")[q - 1], 3)
+
+    return {
+        "backend": backend.name,
+        "model": backend.model_name,
+        "requests": len(requests),
+        "failed": counts["failed"],
+        "throttled": counts["throttled"],
+        "ttft_p50": percentile(first_token_times, 50),
+        "latency_p50": percentile(latencies, 50),
+        "latency_p95": percentile(latencies, 95),
+        "requests_per_second": round(len(latencies) / elapsed, 3) if elapsed else None,
+        "output_tokens_per_second": round(sum(output_tokens) / elapsed, 1) if elapsed else None,
+        "valid_rate": round(counts["valid"] / len(requests), 3) if requests else None,
+    }
+
+
+def compare_backends(backends: list, requests: list, max_concurrency: int = 4, validate=None,
+                     response_schema: dict = None) -> list:
+    """
+    Runs benchmark_backend on each backend in turn with the same requests, and prints the results side by side.
+
+    Returns:
+        list: The result dictionary of each backend.
+    """
+    async def run():
+        results = []
+        for backend in backends:
+            logging.info(f"Benchmarking '{backend.name}' ({backend.model_name}) on {len(requests)} requests.")
+            results.append(await benchmark_backend(backend, requests, max_concurrency, validate, response_schema))
+            await backend.close()
+        return results
+
+    results = asyncio.run(run())
+    columns = list(results[0]) if results else []
+    print(" | ".join(columns))
+    for result in results:
+        print(" | ".join(str(result[column]) for column in columns))
+    return results
@@ -0,0 +1,206 @@
+import os
+import json
+import time
+import asyncio
+import sqlite3
+import hashlib
+import logging
+import threading
+
+# Set up logging
+logging.basicConfig(level=logging.INFO,
+                    format='%(asctime)s - %(levelname)s - %(message)s')
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+
+# LLM responses, reused across runs and output directories for identical requests
+LLM_CACHE_FILE = os.path.join(
+    script_dir, '..', 'ds_pipeline', 'llm_cache.sqlite')
+
+
+class LLMResponseCache:
+    def __init__(self, db_path: str = LLM_CACHE_FILE, max_bytes=256 * 1024 * 1024):
+        """
+        Initializes the LLMResponseCache class.
+
+        A persistent store of LLM responses in a SQLite file. Entries are keyed by the hash
+        of the model name, generation config, prompt and OCR text (see make_key), so the same
+        request is never paid twice, whatever the LP it belongs to or the output directory.
+        Once the responses grow past max_bytes, the least recently used ones are evicted.
+        Identical requests in flight at the same time are coalesced into one call
+        (see get_or_compute).
+
+        Args:
+            db_path (str): Location of the SQLite file.
+            max_bytes (int): Maximum total size of the stored responses.
+        """
+        self.db_path = db_path
+        self.max_bytes = max_bytes
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.coalesced = 0
+
+        self._lock = threading.Lock()
+        # key -> future of the request in flight, on the event loop of the classifier
+        self._in_flight = {}
+
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._connection = sqlite3.connect(db_path, check_same_thread=False)
+        with self._lock, self._connection:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, model TEXT, response TEXT NOT NULL, "
+                "size INTEGER NOT NULL, created REAL NOT NULL, last_used REAL NOT NULL)")
+            self._connection.execute(
+                "CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)")
+            entries, total_bytes = self._connection.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        logging.info(
+            f"LLM cache at {self.db_path} holds {entries} responses ({total_bytes / 1e6:.1f} MB).")
+
+    @staticmethod
+    def make_key(model_name: str, generation_config: dict, prompt: str, text: str) -> str:
+        """
+        Builds the cache key of a request.
+
+        Args:
+            model_name (str): Name of the model.
+            generation_config (dict): Generation settings (temperature, output tokens, ...).
+            prompt (str): Fixed part of the request, system instruction included.
+            text (str): Variable part of the request, the OCR text.
+
+        Returns:
+            str: The hex digest identifying the cache entry.
+        """
+        payload = json.dumps({"model": model_name, "config": generation_config,
+                              "prompt": prompt, "text": text}, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def __contains__(self, key: str) -> bool:
+        with self._lock:
+            return self._connection.execute(
+                "SELECT 1 FROM responses WHERE key = ?", (key,)).fetchone() is not None
+
+    def get(self, key: str):
+        """
+        Returns the cached response for the key.
+
+        Args:
+            key (str): Key built with make_key.
+
+        Returns:
+            str: The stored response, or None on a cache miss.
+        """
+        with self._lock, self._connection:
+            row = self._connection.execute(
+                "SELECT response FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._connection.execute(
+                "UPDATE responses SET last_used = ? WHERE key = ?", (time.time(), key))
+            self.hits += 1
+        return row[0]
+
+    def put(self, key: str, response: str, model_name: str = None):
+        """
+        Stores a response in the cache and evicts old entries if the cache is too large.
+
+        Args:
+            key (str): Key built with make_key.
+            response (str): The response text.
+            model_name (str): Model that produced the response, kept for inspection.
+        """
+        now = time.time()
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO responses (key, model, response, size, created, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, model_name, response, len(response.encode("utf-8")), now, now))
+            self._evict()
+
+    def _evict(self):
+        """
+        Removes the least recently used responses until the cache fits in max_bytes.
+        Must be called with the lock held, inside a transaction.
+        """
+        total_bytes = self._connection.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total_bytes <= self.max_bytes:
+            return
+
+        for key, size in self._connection.execute(
+                "SELECT key, size FROM responses ORDER BY last_used").fetchall():
+            if total_bytes <= self.max_bytes:
+                break
+            self._connection.execute("DELETE FROM responses WHERE key = ?", (key,))
+            total_bytes -= size
+            self.evictions += 1
+
+    async def get_or_compute(self, key: str, compute, cacheable=None, model_name: str = None) -> str:
+        """
+        Returns the cached response of a request, or computes and stores it.
+
+        A request already in flight under the same key is not sent again: the later callers
+        wait for the first one and share its response.
+
+        Args:
+            key (str): Key built with make_key.
+            compute (callable): Coroutine function sending the request and returning its response.
+            cacheable (callable): Tells whether a response may be stored, e.g. only valid JSON.
+            model_name (str): Model that produces the response.
+
+        Returns:
+            str: The response.
+        """
+        future = self._in_flight.get(key)
+        if future is not None:
+            with self._lock:
+                self.coalesced += 1
+            return await asyncio.shield(future)
+
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        try:
+            response = await asyncio.to_thread(self.get, key)
+            if response is None:
+                response = await compute()
+                if cacheable is None or cacheable(response):
+                    await asyncio.to_thread(self.put, key, response, model_name)
+            future.set_result(response)
+            return response
+        except BaseException as e:
+            if isinstance(e, asyncio.CancelledError):
+                future.cancel()
+            else:
+                future.set_exception(e)
+                # The callers sharing the future get the error, it must not be reported as unretrieved
+                future.exception()
+            raise
+        finally:
+            del self._in_flight[key]
+
+    def stats(self) -> dict:
+        """
+        Returns the hit, miss, eviction and coalescing counts of the cache.
+        """
+        with self._lock:
+            entries, total_bytes = self._connection.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "evictions": self.evictions,
+                "coalesced": self.coalesced,
+                "entries": entries,
+                "size_bytes": total_bytes,
+            }
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
@@ -0,0 +1,126 @@
+import json
+from typing import Annotated, NotRequired, Required, TypedDict, get_args, get_origin, get_type_hints, is_typeddict
+
+# Entities extracted from the OCR text of one LP, declared once: the prompt (entity_prompt)
+# and the response schema of the model (response_schema) are both generated from them.
+# Annotated descriptions become the // comments of the prompt and the schema descriptions.
+
+GeneralInformation = TypedDict("GeneralInformation", {
+    "LP_ID": Annotated[str, 'Extract the ID of the LP, **always** starts with "LP" followed by a 4-digit number + appears only in the *Front Cover* section.'],
+    "Country": Annotated[str, "Extract the country"],
+    "Title": Annotated[str, "Extract the title of the LP, typically found on the front cover."],
+    "Subtitle": Annotated[str, "If present, extract the subtitle of the LP."],
+    "Performer": Annotated[str, "Extract the full names of the performers or music composer involved, separated by a semicolon if multiple."],
+    "Publisher": Annotated[str, "Extract the name of the publisher (company or organization responsible for the release)."],
+    "Publishing Year": Annotated[str, "Identify the publishing year of the LP if mentioned."],
+    "Label Company": Annotated[str, "Extract the name of the label company."],
+    "Label Number": Annotated[str, "Identify the unique label identifier, usually appearing after the label company's name and always starting with 2 or 3 letters followed by numbers."],
+    "Language": Annotated[str, "Determine the language used in the text (e.g., Spanish)."],
+    "Recording Info": Annotated[str, "Extract information about where or by whom the LP was recorded, if available."],
+    "Genre/Style": Annotated[str, "Determine the music genre of the album if mentioned, sometimes found in parentheses on the track name, often Iberic/South American genres."],
+    "Notes": Annotated[str, "Extract any additional notes or contextual information found on the cover that may provide insights into the album's content or production."],
+    "Other Information": Annotated[str, "Include any other relevant information that doesn't fall into the above categories."],
+})
+
+TrackInfo = TypedDict("TrackInfo", {
+    "Face": Annotated[str, 'Determine whether the track is on Face "A" or "B". [example: 1.a, 1b, etc.]'],
+    "Track_Number": Annotated[str, "Correctly identify the track's number or position in the list. Write it as a whole number without any punctuation marks."],
+    "Track_Name": Annotated[str, "Correctly extract the name of the track."],
+    "Track_Composer": Annotated[str, "Extract the composer’s name, follows the track name."],
+    "Track_Length": Annotated[str, "Extract the track length if mentioned."],
+})
+
+LPEntities = TypedDict("LPEntities", {
+    "General Information": GeneralInformation,
+    "Track Info": list[Annotated[TrackInfo, "In most cases, there should be 6 tracks on both Faces."]],
+})
+
+# One item of the JSON array answering a packed request, only the LP_ID when nothing is found
+PackedLPEntities = TypedDict("PackedLPEntities", {
+    "LP_ID": Required[Annotated[str, "The <id> of the delimiter lines of the LP's text."]],
+    "General Information": GeneralInformation,
+    "Track Info": list[Annotated[TrackInfo, "In most cases, there should be 6 tracks on both Faces."]],
+}, total=False)
+
+
+def _unwrap(hint) -> tuple:
+    """
+    Splits a type hint into the bare type and its Annotated description.
+    """
+    description = None
+    while True:
+        if get_origin(hint) in (Required, NotRequired):
+            hint = get_args(hint)[0]
+        elif get_origin(hint) is Annotated:
+            hint, description = get_args(hint)[0], get_args(hint)[1]
+        else:
+            return hint, description
+
+
+def _render(hint, indent: int) -> str:
+    """
+    Writes the template of a value, its lines indented by indent spaces after the first one.
+    """
+    hint, _ = _unwrap(hint)
+    padding = " " * indent
+    if is_typeddict(hint):
+        fields = list(get_type_hints(hint, include_extras=True).items())
+        lines = []
+        for position, (key, field) in enumerate(fields):
+            bare, description = _unwrap(field)
+            line = f"{padding}    {json.dumps(key)}: {_render(field, indent + 4)}"
+            if position < len(fields) - 1:
+                line += ","
+            # Descriptions of objects and arrays go on their items
+            if description and bare is str:
+                line += f"  // {description}"
+            lines.append(line)
+        return "{\n" + "\n".join(lines) + f"\n{padding}}}"
+    if get_origin(hint) is list:
+        item = get_args(hint)[0]
+        _, description = _unwrap(item)
+        line = f"{padding}    {_render(item, indent + 4)}"
+        if description:
+            line += f"  // {description}"
+        return f"[\n{line}\n{padding}]"
+    return '""'
+
+
+def entity_prompt(structure=LPEntities) -> str:
+    """
+    Writes a structure as the commented JSON template of the extraction prompt.
+
+    Args:
+        structure (TypedDict): The entities to extract, e.g. LPEntities.
+
+    Returns:
+        str: The template, every field holding an empty string followed by its description.
+    """
+    return _render(structure, 0)
+
+
+def response_schema(hint=LPEntities) -> dict:
+    """
+    Converts a structure into the OpenAPI subset accepted as response_schema by Gemini.
+
+    Args:
+        hint (TypedDict): The entities to extract, e.g. LPEntities, or list[PackedLPEntities].
+
+    Returns:
+        dict: The schema, every key of the structure required unless declared NotRequired.
+    """
+    hint, description = _unwrap(hint)
+    if is_typeddict(hint):
+        fields = get_type_hints(hint, include_extras=True)
+        schema = {
+            "type": "OBJECT",
+            "properties": {key: response_schema(field) for key, field in fields.items()},
+            "required": [key for key in fields if key in hint.__required_keys__],
+        }
+    elif get_origin(hint) is list:
+        schema = {"type": "ARRAY", "items": response_schema(get_args(hint)[0])}
+    else:
+        schema = {"type": "STRING"}
+    if description:
+        schema["description"] = description
+    return schema
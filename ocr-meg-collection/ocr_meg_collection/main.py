@@ -1,12 +1,26 @@
 import os
 import time
 import re
+import json
+import random
+import argparse
 from dotenv import load_dotenv
-from ocr_meg_collection.ocr_pipeline import OCRPipeline
-from ocr_meg_collection.ai_classification_inf import AIClassifier
+from ocr_meg_collection.ocr_pipeline import OCRPipeline, TARGET_DIR
+from ocr_meg_collection.image_preprocessing import CoverPreprocessor, TextRegionCropper
+from ocr_meg_collection.ocr_backends import LocalOCRBackend, VisionBackend
+from ocr_meg_collection.quality_gate import QualityGate, ReOCRQueue
+from ocr_meg_collection.text_compaction import TextCompactor
+from ocr_meg_collection.dead_letter import DeadLetterStore
+from google.cloud import vision
+from ocr_meg_collection.tiered_ocr import (
+    TieredOCRBackend, load_vocabulary, add_to_vocabulary, text_words, VISION_VOCABULARY_FILE)
+from ocr_meg_collection.cover_hashing import CoverHashIndex, iter_cover_paths
+from ocr_meg_collection.ai_classification_inf import AIClassifier, MODEL_NAME, LLM_BACKENDS, create_llm_backend
+from ocr_meg_collection.batch_prediction import LocalBatchSubmitter, VertexBatchSubmitter
 from ocr_meg_collection.post_processing import Orchestrator
 from ocr_meg_collection.utils import get_lp_subfolders
 from ocr_meg_collection.cleaner import Cleaner
+from ocr_meg_collection.storage import open_storage
 
 # Load environment variables
 load_dotenv()
@@ -20,6 +34,10 @@ BASE_DIR = os.getenv("BASE_DIR")
 
 print("Base Directory PATH for LP Processing:", BASE_DIR)
 
+# OCR settings of the last run_ocr call, reused by run_retry_failed so that its cache keys match
+OCR_RUN_OPTIONS_FILE = os.path.join(
+    os.getcwd(), 'ocr-meg-collection', 'ds_pipeline', 'ocr_run_options.json')
+
 
 def natural_sort(lp_list):
     """
@@ -57,12 +75,43 @@ def get_lp_subfolders(base_dir):
         return []
 
 
-def run_ocr(base_dir: str, lp_selection: str = "all"):
+def select_lps(lp_subfolders_list: list, lp_selection: str = "all") -> list:
+    """
+    Selects LPs from the naturally sorted list of LP subfolders.
+
+    Args:
+        lp_subfolders_list (list): LP subfolder names, in natural order.
+        lp_selection (str, optional): "all", "first-X" or "X", "last-X", or "start-end", see run_ocr.
+
+    Returns:
+        list: The selected LPs.
+    """
+    if lp_selection == "all":
+        return lp_subfolders_list
+
+    elif "last-" in lp_selection:
+        count = int(lp_selection.split("-")[1])
+        return lp_subfolders_list[-count:]
+
+    elif "first-" in lp_selection or lp_selection.isdigit():
+        count = int(lp_selection.split(
+            "-")[1] if "first-" in lp_selection else lp_selection)
+        return lp_subfolders_list[:count]
+    elif "-" in lp_selection:
+        start, end = map(int, lp_selection.split("-"))
+        return lp_subfolders_list[start-1:end]
+    raise ValueError(
+        "Invalid lp_selection format. Use 'all', 'first-X', 'X', 'last-X', or 'start-end'.")
+
+
+def run_ocr(base_dir: str, lp_selection: str = "all", batch_mode: bool = False,
+            max_long_edge: int = None, ocr_engine: str = "vision", adaptive_concurrency: bool = True,
+            store_annotations: bool = False, duplicate_threshold: int = None, crop_text_regions: bool = False):
     """
     Running the OCR Process on the LP covers.
 
     Args:
-        base_dir (str): Base directory containing LP subfolders.
+        base_dir (str): Base directory containing LP subfolders, or the zip/tar archives holding them.
         lp_selection (str, optional): A string to specify which LPs to process.
                                       Formats:
                                         - "all": Process all LPs.
@@ -70,72 +119,330 @@ def run_ocr(base_dir: str, lp_selection: str = "all"):
                                         - "last-X": Process the last X LPs.
                                         - "start-end": Process LPs from index start to end.
                                       Defaults to "all".
+        batch_mode (bool, optional): Send covers through batched Vision requests. Defaults to False.
+        max_long_edge (int, optional): Downscale and recompress covers to this long edge before upload.
+                                       Defaults to None (upload the original scans).
+        ocr_engine (str, optional): "vision" for Google Cloud Vision, or "tesseract"/"tesseract-blocks"/"easyocr"
+                                    to run OCR offline on all CPU cores, or "tiered" to read every cover with
+                                    tesseract and only send low confidence covers to Vision. Defaults to "vision".
+        adaptive_concurrency (bool, optional): Let the number of in-flight Vision requests follow the API's
+                                               latency and throttling. Defaults to True.
+        store_annotations (bool, optional): Also store the word boxes and confidences of the covers in
+                                            {LP}_annotations.npz files. Defaults to False.
+        duplicate_threshold (int, optional): Hash every cover under base_dir and reuse the OCR result of
+                                             covers within this many bits of an already read one.
+                                             Defaults to None (no duplicate detection).
+        crop_text_regions (bool, optional): Upload a mosaic of the detected text regions instead of the
+                                            full cover, falling back to the full cover when detection is
+                                            unsure. Defaults to False.
     """
-    # Change to base directory and list subdirectories
-    original_dir = os.getcwd()  # Store original directory
-    os.chdir(base_dir)
-    lp_subfolders_list = [d for d in os.listdir(
-    ) if os.path.isdir(d) and d.startswith('LP')]
+    # List the LP folders, extracted on disk or inside the batch archives
+    storage = open_storage(base_dir)
+    lp_subfolders_list = storage.list_lps()
 
     # Sort LP subfolders in natural order
     lp_subfolders_list = natural_sort(lp_subfolders_list)
 
     # Determine LP selection based on lp_selection argument
-    if lp_selection == "all":
-        lp_list = lp_subfolders_list
+    lp_list = select_lps(lp_subfolders_list, lp_selection)
 
-    elif "last-" in lp_selection:
-        count = int(lp_selection.split("-")[1])
-        lp_list = lp_subfolders_list[-count:]
-
-    elif "first-" in lp_selection or lp_selection.isdigit():
-        count = int(lp_selection.split(
-            "-")[1] if "first-" in lp_selection else lp_selection)
-        lp_list = lp_subfolders_list[:count]
-    elif "-" in lp_selection:
-        start, end = map(int, lp_selection.split("-"))
-        lp_list = lp_subfolders_list[start-1:end]
-    else:
-        raise ValueError(
-            "Invalid lp_selection format. Use 'all', 'first-X', 'X', 'last-X', or 'start-end'.")
+    ocr_options = {"batch_mode": batch_mode, "max_long_edge": max_long_edge, "ocr_engine": ocr_engine,
+                   "adaptive_concurrency": adaptive_concurrency, "store_annotations": store_annotations,
+                   "duplicate_threshold": duplicate_threshold, "crop_text_regions": crop_text_regions}
+    os.makedirs(os.path.dirname(OCR_RUN_OPTIONS_FILE), exist_ok=True)
+    with open(OCR_RUN_OPTIONS_FILE, "w") as options_file:
+        json.dump(ocr_options, options_file, indent=2)
 
     # Initialize the OCR pipeline
-    ocr_pipeline = OCRPipeline(base_dir, lp_list)
+    ocr_pipeline = build_ocr_pipeline(base_dir, lp_list, storage, **ocr_options)
 
     # Process OCR on LP covers
     start_time = time.time()
     print("Starting OCR processing...")
     ocr_pipeline.process_ocr()
+    ocr_pipeline.close()
+    storage.close()
+    if ocr_engine == "vision":
+        learn_vision_vocabulary(lp_list)
     end_time = time.time()
     print(f"OCR processing completed in {end_time - start_time:.2f} seconds.")
 
-    # Revert back to the original directory
-    os.chdir(original_dir)
 
+def learn_vision_vocabulary(lp_list: list):
+    """
+    Adds the words of combined texts read by Vision to the vocabulary of the tiered OCR.
+
+    Args:
+        lp_list (list): LPs whose _combined.txt was written by a Vision run.
+    """
+    words = set()
+    for lp in lp_list:
+        file_path = os.path.join(TARGET_DIR, f"{lp}_combined.txt")
+        if os.path.exists(file_path):
+            with open(file_path, "r") as text_file:
+                words.update(text_words(text_file.read()))
+    add_to_vocabulary(words, VISION_VOCABULARY_FILE)
+
+
+def build_ocr_pipeline(base_dir: str, lp_list: list, storage, dead_letters=None, batch_mode: bool = False,
+                       max_long_edge: int = None, ocr_engine: str = "vision", adaptive_concurrency: bool = True,
+                       store_annotations: bool = False, duplicate_threshold: int = None,
+                       crop_text_regions: bool = False) -> OCRPipeline:
+    """
+    Builds the OCR pipeline of a list of LPs from the run_ocr options.
+
+    Args:
+        base_dir (str): Base directory containing LP subfolders, or the zip/tar archives holding them.
+        lp_list (list): LPs to read.
+        storage (Storage): Where the covers are read from, see open_storage.
+        dead_letters (DeadLetterStore, optional): Store of the failed images, the default file if None.
+        Other arguments: see run_ocr.
+
+    Returns:
+        OCRPipeline: The pipeline, ready for process_ocr.
+    """
+    preprocessors = [CoverPreprocessor(
+        max_long_edge=max_long_edge)] if max_long_edge else []
+    if crop_text_regions:
+        # Crop after downscaling, so a tall mosaic is not shrunk by max_long_edge
+        preprocessors.append(TextRegionCropper())
+    duplicate_index = None
+    if duplicate_threshold is not None:
+        duplicate_index = CoverHashIndex(
+            threshold=duplicate_threshold, storage=storage,
+            hash_cache_file=os.path.join(os.getcwd(), 'ocr-meg-collection', 'ds_pipeline', 'cover_hashes.json'))
+        duplicate_index.build(iter_cover_paths(storage))
+
+    if ocr_engine == "vision":
+        return OCRPipeline(
+            base_dir, lp_list, batch_mode=batch_mode, preprocessors=preprocessors,
+            adaptive_concurrency=adaptive_concurrency, store_annotations=store_annotations,
+            duplicate_index=duplicate_index, storage=storage, dead_letters=dead_letters)
+    elif ocr_engine == "tiered":
+        # The local tier bounds the useful concurrency, Vision only sees the escalated covers
+        local_backend = LocalOCRBackend(engine="tesseract")
+        backend = TieredOCRBackend(
+            local_backend, VisionBackend(pool_size=local_backend.processes),
+            vocabulary=load_vocabulary(VISION_VOCABULARY_FILE), vocabulary_file=VISION_VOCABULARY_FILE)
+        return OCRPipeline(
+            base_dir, lp_list, max_workers=local_backend.processes, batch_mode=batch_mode,
+            preprocessors=preprocessors, backend=backend, store_annotations=store_annotations,
+            duplicate_index=duplicate_index, storage=storage, dead_letters=dead_letters)
+    # One feeding thread per worker process keeps every core busy
+    backend = LocalOCRBackend(engine=ocr_engine)
+    return OCRPipeline(
+        base_dir, lp_list, max_workers=backend.processes, batch_mode=batch_mode,
+        preprocessors=preprocessors, backend=backend, store_annotations=store_annotations,
+        duplicate_index=duplicate_index, storage=storage, dead_letters=dead_letters)
+
+
+def run_reocr(base_dir: str, max_attempts: int = 1):
+    """
+    Reads again the LPs rejected by the quality gate, with Vision's DOCUMENT_TEXT_DETECTION on the
+    original scans instead of the settings of the first pass.
 
-def run_ai_classification_inference():
+    Args:
+        base_dir (str): Base directory containing LP subfolders.
+        max_attempts (int, optional): Number of re-OCR passes an LP gets before it is left for manual review.
+    """
+    queue = ReOCRQueue()
+    lp_list = queue.pending(max_attempts=max_attempts)
+    if not lp_list:
+        print("No LP waiting for re-OCR.")
+        return
+
+    storage = open_storage(base_dir)
+    backend = VisionBackend(feature_type=vision.Feature.Type.DOCUMENT_TEXT_DETECTION)
+    ocr_pipeline = OCRPipeline(base_dir, lp_list, backend=backend, storage=storage)
+
+    start_time = time.time()
+    print(f"Starting re-OCR of {len(lp_list)} LPs...")
+    ocr_pipeline.process_ocr()
+    ocr_pipeline.close()
+    storage.close()
+    for lp in lp_list:
+        queue.record_attempt(lp)
+    learn_vision_vocabulary(lp_list)
+    end_time = time.time()
+    print(f"Re-OCR completed in {end_time - start_time:.2f} seconds.")
+
+
+def run_retry_failed(base_dir: str, max_attempts: int = 5, max_rounds: int = 4, base_delay: float = 30.0,
+                     **ocr_options):
+    """
+    Reads again only the cover images recorded in the dead-letter store, instead of re-running a
+    whole LP range to recover a few transient API errors.
+
+    The LPs of the failed images are run through OCR in rounds, with an exponential backoff between
+    rounds. The LPs are read with the options of the last run_ocr call (OCR_RUN_OPTIONS_FILE), so the
+    other cover of these LPs is served from the OCR cache and only the failed images reach the API.
+    Their _combined.txt is rewritten, so the next classification run classifies them again.
+
+    Args:
+        base_dir (str): Base directory containing LP subfolders, or the zip/tar archives holding them.
+        max_attempts (int, optional): Failed attempts after which an image is left in the store for review.
+        max_rounds (int, optional): Number of retry rounds of this run.
+        base_delay (float, optional): Seconds waited before the second round, doubled for each next round.
+        **ocr_options: run_ocr options overriding the stored ones, e.g. ocr_engine or max_long_edge.
+    """
+    stored_options = {}
+    if os.path.exists(OCR_RUN_OPTIONS_FILE):
+        with open(OCR_RUN_OPTIONS_FILE, "r") as options_file:
+            stored_options = json.load(options_file)
+    else:
+        print(f"No stored OCR options ({OCR_RUN_OPTIONS_FILE}), retrying with the run_ocr defaults.")
+    ocr_options = {**stored_options, **ocr_options}
+
+    dead_letters = DeadLetterStore()
+    storage = open_storage(base_dir)
+
+    start_time = time.time()
+    for round_index in range(max_rounds):
+        lp_list = dead_letters.lp_ids(max_attempts=max_attempts)
+        if not lp_list:
+            break
+        if round_index:
+            delay = min(600.0, base_delay * 2 ** (round_index - 1)) * random.uniform(0.5, 1.0)
+            print(f"Waiting {delay:.0f} seconds before retry round {round_index + 1}...")
+            time.sleep(delay)
+
+        print(f"Retry round {round_index + 1}: {len(dead_letters.entries(max_attempts))} failed images "
+              f"of {len(lp_list)} LPs ({dead_letters.error_counts()})")
+        ocr_pipeline = build_ocr_pipeline(base_dir, natural_sort(lp_list), storage,
+                                          dead_letters=dead_letters, **ocr_options)
+        ocr_pipeline.process_ocr()
+        ocr_pipeline.close()
+    storage.close()
+
+    end_time = time.time()
+    print(f"Retry of failed images completed in {end_time - start_time:.2f} seconds, "
+          f"{len(dead_letters)} images still failing.")
+
+
+def run_preprocessing_comparison(base_dir: str, lp_selection: str = "first-5", long_edges: list = (2048, 1600, 1024),
+                                 jpeg_quality: int = 85):
+    """
+    Sends the covers of a sample of LPs to Vision as-is and downscaled to each long edge, and prints the
+    mean payload, upload latency and text similarity of each variant, to choose max_long_edge for run_ocr.
+    The OCR cache is bypassed, every image is paid once per variant.
+
+    Args:
+        base_dir (str): Base directory containing LP subfolders, or the zip/tar archives holding them.
+        lp_selection (str, optional): LPs of the sample, see run_ocr. Defaults to "first-5".
+        long_edges (list, optional): Long edges to compare, in pixels.
+        jpeg_quality (int, optional): JPEG quality of the downscaled covers.
+    """
+    storage = open_storage(base_dir)
+    lp_list = select_lps(natural_sort(storage.list_lps()), lp_selection)
+    ocr_pipeline = OCRPipeline(base_dir, lp_list, storage=storage)
+
+    print(f"Comparing cover preprocessing on {len(lp_list)} LPs...")
+    report = ocr_pipeline.compare_preprocessing(candidates=[
+        CoverPreprocessor(max_long_edge=long_edge, jpeg_quality=jpeg_quality) for long_edge in long_edges])
+    ocr_pipeline.close()
+    storage.close()
+    for row in report:
+        print(f"{row['variant']}: {row['mean_bytes'] / 1e6:.2f} MB per cover, "
+              f"{row['mean_upload_seconds']:.3f}s ({row['latency_change_seconds']:+.3f}s), "
+              f"text similarity {row['mean_text_similarity']:.3f}")
+
+
+def run_cropping_savings(base_dir: str, lp_selection: str = "first-5", report_path: str = None):
+    """
+    Sends the covers of a sample of LPs to Vision as-is and through a TextRegionCropper, and reports the
+    bytes and OCR seconds saved per LP, to check the cropping before enabling crop_text_regions.
+    The OCR cache is bypassed, every image is paid twice.
+
+    Args:
+        base_dir (str): Base directory containing LP subfolders, or the zip/tar archives holding them.
+        lp_selection (str, optional): LPs of the sample, see run_ocr. Defaults to "first-5".
+        report_path (str, optional): CSV file receiving one row per LP.
+                                     Defaults to ds_pipeline/cropping_savings.csv.
+    """
+    report_path = report_path or os.path.join(
+        os.getcwd(), 'ocr-meg-collection', 'ds_pipeline', 'cropping_savings.csv')
+    storage = open_storage(base_dir)
+    lp_list = select_lps(natural_sort(storage.list_lps()), lp_selection)
+    ocr_pipeline = OCRPipeline(base_dir, lp_list, storage=storage)
+
+    print(f"Measuring text-region cropping on {len(lp_list)} LPs...")
+    rows = ocr_pipeline.report_preprocessing_savings(TextRegionCropper(), report_path=report_path)
+    ocr_pipeline.close()
+    storage.close()
+    if rows:
+        bytes_original = sum(row["bytes_original"] for row in rows)
+        bytes_saved = sum(row["bytes_saved"] for row in rows)
+        print(f"Cropping saved {bytes_saved / 1e6:.2f} MB of {bytes_original / 1e6:.2f} MB "
+              f"({bytes_saved / (bytes_original or 1):.1%}) and {sum(row['seconds_saved'] for row in rows):.1f}s "
+              f"of OCR over {len(rows)} LPs, mean text similarity "
+              f"{sum(row['text_similarity'] for row in rows) / len(rows):.3f}.")
+
+
+def run_ai_classification_inference(packed: bool = False, llm_backend: str = "vertex"):
     """
     This function runs the AI Classification Inference on the OCR Text.
+
+    Args:
+        packed (bool, optional): Send several LPs per request, within a token budget. Defaults to False.
+        llm_backend (str, optional): "vertex" for Gemini on Vertex AI, "ollama" for the local Ollama
+                                     server at OLLAMA_HOST, without per-minute quota. Defaults to "vertex".
     """
-    classifier = AIClassifier()
+    if llm_backend == "ollama":
+        classifier = AIClassifier(quality_gate=QualityGate(), compactor=TextCompactor(), packed=packed,
+                                  max_concurrency=4, requests_per_minute=None, tokens_per_minute=None,
+                                  backend=create_llm_backend("ollama"))
+    else:
+        classifier = AIClassifier(quality_gate=QualityGate(), compactor=TextCompactor(), packed=packed)
 
     start_time = time.time()
     print("Starting AI classification inference...")
-    classifier.batch_generate_inferences()
+    try:
+        classifier.batch_generate_inferences()
+    finally:
+        classifier.close()
     end_time = time.time()
     print(
         f"AI classification inference completed in {end_time - start_time:.2f} seconds.")
 
 
+def run_batch_prediction(local_dir: str = None, poll_interval: float = 60.0):
+    """
+    Classifies all the pending LPs with one batch prediction job, for backfills that do not need
+    the online quota.
+
+    Args:
+        local_dir (str, optional): Run the job with the file-based local stand-in in this folder instead
+                                   of Vertex AI. Defaults to None (Vertex AI, with the request and output
+                                   files in the BATCH_PREDICTION_BUCKET bucket).
+        poll_interval (float, optional): Seconds between two status checks of the job.
+    """
+    if local_dir:
+        submitter = LocalBatchSubmitter(local_dir)
+    else:
+        submitter = VertexBatchSubmitter(os.getenv("BATCH_PREDICTION_BUCKET"), MODEL_NAME)
+    classifier = AIClassifier(quality_gate=QualityGate(), compactor=TextCompactor())
+
+    start_time = time.time()
+    print(f"Starting batch prediction with the '{submitter.name}' submitter...")
+    try:
+        counts = classifier.batch_predict(submitter, poll_interval=poll_interval)
+    finally:
+        classifier.close()
+    end_time = time.time()
+    print(f"Batch prediction completed in {end_time - start_time:.2f} seconds: {counts}")
+
+
 def run_post_processing():
     """
     Run the post-processing step to merge the JSON files into 2 different CSV files.
     """
-    orchestrator = Orchestrator(lp_base_dir=BASE_DIR)
+    storage = open_storage(BASE_DIR)
+    orchestrator = Orchestrator(lp_base_dir=BASE_DIR, storage=storage)
 
     start_time = time.time()
     print("Starting post-processing...")
     orchestrator.run()
+    storage.close()
     end_time = time.time()
     print(f"Post-processing completed in {end_time - start_time:.2f} seconds.")
 
@@ -158,11 +465,14 @@ def run_cleaner():
     print(f"Cleaning completed in {end_time - start_time:.2f} seconds.")
 
 
-def main(lp_selection: str = "all"):
+def main(lp_selection: str = "all", llm_backend: str = "vertex"):
     global_start_time = time.time()
 
     run_ocr(base_dir=BASE_DIR, lp_selection=lp_selection)
-    run_ai_classification_inference()
+    run_ai_classification_inference(llm_backend=llm_backend)
+    # LPs rejected by the quality gate are read again, then classified if they now pass
+    run_reocr(base_dir=BASE_DIR)
+    run_ai_classification_inference(llm_backend=llm_backend)
     run_post_processing()
     run_cleaner()
 
@@ -174,5 +484,49 @@ def main(lp_selection: str = "all"):
 if __name__ == "__main__":
     # Only print the list of LPs
     # print(get_lp_subfolders(base_dir=BASE_DIR))
+    parser = argparse.ArgumentParser(description="OCR and AI classification of the MEG LP collection.")
+    subparsers = parser.add_subparsers(dest="command")
+
+    run_parser = subparsers.add_parser("run", help="Run the whole pipeline (default).")
     # Example: Change "all" to "5", "first-7", "last-20", "21-56" as needed
-    main(lp_selection="382-383")
+    run_parser.add_argument("--lp-selection", default="382-383")
+    run_parser.add_argument("--llm-backend", choices=LLM_BACKENDS, default="vertex")
+
+    retry_parser = subparsers.add_parser(
+        "retry-failed", help="Read again only the images of the OCR dead-letter store, then classify them.")
+    retry_parser.add_argument("--max-attempts", type=int, default=5)
+    retry_parser.add_argument("--max-rounds", type=int, default=4)
+    retry_parser.add_argument("--base-delay", type=float, default=30.0)
+    retry_parser.add_argument("--llm-backend", choices=LLM_BACKENDS, default="vertex")
+
+    batch_parser = subparsers.add_parser(
+        "batch-predict", help="Classify all pending LPs with one batch prediction job.")
+    batch_parser.add_argument("--local-dir", help="Run the job with the local stand-in in this folder.")
+    batch_parser.add_argument("--poll-interval", type=float, default=60.0)
+
+    compare_parser = subparsers.add_parser(
+        "compare-preprocessing", help="Compare the upload size, latency and OCR text of downscaled covers.")
+    compare_parser.add_argument("--lp-selection", default="first-5")
+    compare_parser.add_argument("--long-edges", type=int, nargs="+", default=[2048, 1600, 1024])
+    compare_parser.add_argument("--jpeg-quality", type=int, default=85)
+
+    cropping_parser = subparsers.add_parser(
+        "measure-cropping", help="Measure the bytes and OCR time saved per LP by text-region cropping.")
+    cropping_parser.add_argument("--lp-selection", default="first-5")
+    cropping_parser.add_argument("--report", help="CSV file of the per-LP savings.")
+
+    args = parser.parse_args()
+    if args.command == "measure-cropping":
+        run_cropping_savings(base_dir=BASE_DIR, lp_selection=args.lp_selection, report_path=args.report)
+    elif args.command == "compare-preprocessing":
+        run_preprocessing_comparison(base_dir=BASE_DIR, lp_selection=args.lp_selection,
+                                     long_edges=args.long_edges, jpeg_quality=args.jpeg_quality)
+    elif args.command == "batch-predict":
+        run_batch_prediction(local_dir=args.local_dir, poll_interval=args.poll_interval)
+    elif args.command == "retry-failed":
+        run_retry_failed(base_dir=BASE_DIR, max_attempts=args.max_attempts,
+                         max_rounds=args.max_rounds, base_delay=args.base_delay)
+        run_ai_classification_inference(llm_backend=args.llm_backend)
+    else:
+        main(lp_selection=getattr(args, "lp_selection", "382-383"),
+             llm_backend=getattr(args, "llm_backend", "vertex"))
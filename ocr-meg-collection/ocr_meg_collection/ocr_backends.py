@@ -0,0 +1,413 @@
+import os
+import time
+import logging
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from google.api_core import exceptions as core_exceptions
+from google.cloud import vision
+from ocr_meg_collection.annotation_store import new_word_columns, add_word
+from ocr_meg_collection.concurrency import OCRThrottledError
+from ocr_meg_collection.vision_client_pool import VisionClientPool
+
+# Set up logging
+logging.basicConfig(level=logging.INFO,
+                    format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Vision accepts at most 16 images per batch_annotate_images request
+VISION_MAX_IMAGES_PER_REQUEST = 16
+# Keep the inline payload of a batch request under ~10 MB once base64 encoded
+VISION_MAX_REQUEST_BYTES = 7 * 1024 * 1024
+
+# Optional endpoint override, e.g. a local stand-in server (http://127.0.0.1:8765)
+VISION_API_ENDPOINT = os.getenv("VISION_API_ENDPOINT")
+
+# API errors meaning the quota is exhausted or the service is overloaded
+THROTTLING_ERRORS = (core_exceptions.ResourceExhausted,
+                     core_exceptions.TooManyRequests,
+                     core_exceptions.ServiceUnavailable)
+# google.rpc.Code of a per-image RESOURCE_EXHAUSTED error in a batch response
+RESOURCE_EXHAUSTED = 8
+
+# Breaks ending a line of text in a Vision full text annotation
+LINE_BREAKS = (vision.TextAnnotation.DetectedBreak.BreakType.LINE_BREAK,
+               vision.TextAnnotation.DetectedBreak.BreakType.EOL_SURE_SPACE)
+
+# Tesseract language packs matching the OCR language hints
+TESSERACT_LANGUAGES = {"es": "spa", "en": "eng"}
+
+
+class OCRResult:
+    """
+    Text of one image and, when the engine provides them, its word annotations
+    (columns described in annotation_store.py, None otherwise). A failed read has an
+    empty text and the error that caused it.
+    """
+    __slots__ = ("text", "words", "error")
+
+    def __init__(self, text: str, words: dict = None, error: Exception = None):
+        self.text = text
+        self.words = words
+        self.error = error
+
+
+class OCRBackend:
+    """
+    Interface of the OCR engines OCRPipeline sends the cover images to.
+
+    A backend turns the bytes of one image into an OCRResult. Failures are raised
+    by annotate, and returned in place of the result by annotate_batch so that one bad
+    image does not fail the others of its batch. Quota rejections are reported as
+    OCRThrottledError so the pipeline can retry them.
+    """
+    name = "base"
+    # Largest number of images handed to annotate_batch at once, and their byte budget
+    max_batch_size = 1
+    max_batch_bytes = None
+    # Whether annotate returns word annotations along with the text
+    provides_words = False
+
+    def settings(self) -> dict:
+        """
+        Returns the settings that change the OCR result of an image, part of its cache key.
+        """
+        raise NotImplementedError
+
+    def annotate(self, content: bytes) -> OCRResult:
+        """
+        Reads a single image.
+
+        Args:
+            content (bytes): The image file to read.
+
+        Returns:
+            OCRResult: The detected text, an empty string if the image holds no text, and its words.
+        """
+        raise NotImplementedError
+
+    def annotate_batch(self, contents: list) -> list:
+        """
+        Reads several images.
+
+        Args:
+            contents (list): The image files to read.
+
+        Returns:
+            list: The OCRResult of each image, or the exception raised for it.
+        """
+        results = []
+        for content in contents:
+            try:
+                results.append(self.annotate(content))
+            except Exception as e:
+                results.append(e)
+        return results
+
+    def extract_text(self, content: bytes) -> str:
+        """
+        Extracts the text of a single image.
+        """
+        return self.annotate(content).text
+
+    def stats(self) -> dict:
+        """
+        Returns the usage statistics of the backend.
+        """
+        return {}
+
+    def log_stats(self):
+        """
+        Logs the usage statistics of the backend at the end of a run.
+        """
+        stats = self.stats()
+        if stats:
+            logging.info(f"OCR backend '{self.name}': " +
+                         ", ".join(f"{key}: {value}" for key, value in stats.items()))
+
+    def close(self):
+        """
+        Releases the resources held by the backend.
+        """
+
+
+class VisionBackend(OCRBackend):
+    name = "vision"
+    max_batch_size = VISION_MAX_IMAGES_PER_REQUEST
+    max_batch_bytes = VISION_MAX_REQUEST_BYTES
+    provides_words = True
+
+    def __init__(self, api_endpoint=VISION_API_ENDPOINT, pool_size=4, request_timeout=60.0,
+                 language_hints=("es", "en"), feature_type=vision.Feature.Type.TEXT_DETECTION):
+        """
+        Initializes the VisionBackend class.
+
+        Args:
+            api_endpoint (str): Optional Vision API endpoint, e.g. a local stand-in server.
+            pool_size (int): Number of long-lived clients, usually the number of worker threads.
+            request_timeout (float): Deadline in seconds applied to every Vision API call.
+            language_hints (tuple): Languages expected on the covers.
+            feature_type (vision.Feature.Type): Vision feature used to detect the text.
+        """
+        self.language_hints = list(language_hints)
+        self.feature_type = feature_type
+
+        # Long-lived clients shared by the worker threads, warmed up before any OCR starts
+        self.client_pool = VisionClientPool(
+            size=pool_size, api_endpoint=api_endpoint, timeout=request_timeout)
+
+    def settings(self) -> dict:
+        return {
+            "language_hints": list(self.language_hints),
+            "feature": vision.Feature.Type(self.feature_type).name,
+        }
+
+    def annotate(self, content: bytes) -> OCRResult:
+        response = self._call(
+            "annotate_image", request=self._build_request(content))
+        return self._read_response(response)
+
+    def annotate_batch(self, contents: list) -> list:
+        batch_response = self._call(
+            "batch_annotate_images", requests=[self._build_request(content) for content in contents])
+
+        results = []
+        for response in batch_response.responses:
+            try:
+                results.append(self._read_response(response))
+            except Exception as e:
+                results.append(e)
+        return results
+
+    def _call(self, method: str, **kwargs):
+        """
+        Calls the Vision API through the client pool, reporting quota errors as OCRThrottledError.
+        """
+        try:
+            return self.client_pool.call(method, **kwargs)
+        except THROTTLING_ERRORS as e:
+            raise OCRThrottledError(str(e)) from e
+
+    def _build_request(self, content: bytes) -> vision.AnnotateImageRequest:
+        """
+        Builds the annotation request of one image with the backend's OCR settings.
+        """
+        return vision.AnnotateImageRequest(
+            image=vision.Image(content=content),
+            features=[vision.Feature(type_=self.feature_type)],
+            image_context=vision.ImageContext(language_hints=self.language_hints))
+
+    def _read_response(self, response) -> OCRResult:
+        """
+        Reads the text and the words of a single image annotation response.
+
+        Args:
+            response (vision.AnnotateImageResponse): The annotation of one image.
+
+        Returns:
+            OCRResult: The first detected text, or an empty string if nothing was detected, and its words.
+        """
+        if response.error.code == RESOURCE_EXHAUSTED:
+            raise OCRThrottledError(response.error.message)
+
+        if response.error.message:
+            raise Exception(
+                f"{response.error.message}\nFor more info on error messages, "
+                "check: https://cloud.google.com/apis/design/errors"
+            )
+
+        words = self._read_words(response.full_text_annotation)
+        texts = response.text_annotations
+        if texts:
+            return OCRResult(texts[0].description.strip(), words)
+
+        logging.info("No text detected.")
+        return OCRResult("", words)
+
+    @staticmethod
+    def _read_words(annotation) -> dict:
+        """
+        Flattens the page/block/paragraph/word hierarchy of a full text annotation into word columns.
+        Lines are counted within each paragraph from the line breaks Vision detects after a word.
+        """
+        words = new_word_columns()
+        block_index = 0
+        for page in annotation.pages:
+            for block in page.blocks:
+                for paragraph_index, paragraph in enumerate(block.paragraphs):
+                    line, position = 0, 0
+                    for word in paragraph.words:
+                        vertices = word.bounding_box.vertices
+                        xs = [vertex.x for vertex in vertices] or [0]
+                        ys = [vertex.y for vertex in vertices] or [0]
+                        add_word(words, block_index, paragraph_index, line, position,
+                                 (min(xs), min(ys), max(xs), max(ys)), word.confidence,
+                                 "".join(symbol.text for symbol in word.symbols))
+                        position += 1
+
+                        last_break = word.symbols[-1].property.detected_break.type_ if word.symbols else None
+                        if last_break in LINE_BREAKS:
+                            line, position = line + 1, 0
+                block_index += 1
+        return words
+
+    def stats(self) -> dict:
+        return self.client_pool.stats()
+
+    def log_stats(self):
+        """
+        Logs how the Vision time was split between connection setup, waiting for a client and the requests.
+        """
+        stats = self.stats()
+        logging.info(
+            f"Vision clients: {stats['clients']}, requests: {stats['requests']}, "
+            f"connection setup: {stats['setup_seconds']:.2f}s, waiting for a client: {stats['wait_seconds']:.2f}s, "
+            f"requests: {stats['request_seconds']:.2f}s ({stats['mean_request_seconds']:.3f}s per request)")
+
+    def close(self):
+        self.client_pool.close()
+
+
+# State of a local OCR worker process, loaded once by _init_local_worker
+_worker_engine = None
+_worker_model = None
+_worker_languages = None
+
+
+def _init_local_worker(engine: str, languages: tuple):
+    """
+    Loads the OCR engine of a worker process once, before it handles any image.
+    """
+    global _worker_engine, _worker_model, _worker_languages
+    _worker_engine = engine
+
+    if engine in ("tesseract", "tesseract-blocks"):
+        import pytesseract
+        pytesseract.pytesseract.tesseract_cmd = os.getenv(
+            "TESSERACT_CMD", pytesseract.pytesseract.tesseract_cmd)
+        _worker_languages = "+".join(TESSERACT_LANGUAGES.get(language, language)
+                                     for language in languages)
+    elif engine == "easyocr":
+        import easyocr
+        _worker_model = easyocr.Reader(list(languages), gpu=False)
+    else:
+        raise ValueError(f"Unknown local OCR engine: {engine}")
+
+
+def _local_worker_extract(content: bytes) -> tuple:
+    """
+    Reads one image inside a worker process.
+
+    Returns:
+        tuple: The detected text and its word annotation columns, None if the engine has none.
+    """
+    import cv2
+    import numpy as np
+
+    image = cv2.imdecode(np.frombuffer(content, np.uint8), cv2.IMREAD_COLOR)
+    if image is None:
+        raise ValueError("Unable to decode the image.")
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+
+    if _worker_engine == "tesseract":
+        import pytesseract
+        data = pytesseract.image_to_data(
+            gray, lang=_worker_languages, output_type=pytesseract.Output.DICT)
+        return _read_tesseract_data(data)
+
+    if _worker_engine == "tesseract-blocks":
+        from ocr_meg_collection.block_ocr import annotate_packed
+        return annotate_packed(gray, lang=_worker_languages)
+
+    return "\n".join(_worker_model.readtext(gray, detail=0, paragraph=True)).strip(), None
+
+
+def _read_tesseract_data(data: dict) -> tuple:
+    """
+    Rebuilds the text of a tesseract image_to_data result, one line per tesseract line,
+    along with its word annotation columns.
+    """
+    words = new_word_columns()
+    lines = {}
+    for i, word in enumerate(data["text"]):
+        word = word.strip()
+        if not word:
+            continue
+        line_key = (data["block_num"][i], data["par_num"][i], data["line_num"][i])
+        line = lines.setdefault(line_key, [])
+        add_word(words, data["block_num"][i], data["par_num"][i], data["line_num"][i], len(line),
+                 (data["left"][i], data["top"][i],
+                  data["left"][i] + data["width"][i], data["top"][i] + data["height"][i]),
+                 max(0.0, float(data["conf"][i])) / 100, word)
+        line.append(word)
+    return "\n".join(" ".join(line) for line in lines.values()), words
+
+
+class LocalOCRBackend(OCRBackend):
+    def __init__(self, engine="tesseract", languages=("es", "en"), processes=None):
+        """
+        Initializes the LocalOCRBackend class.
+
+        Runs Tesseract or EasyOCR offline on a pool of worker processes. Each process
+        loads its engine once, so models are not rebuilt for every image, and images
+        are read in parallel across all CPU cores.
+
+        Args:
+            engine (str): "tesseract", "tesseract-blocks" (text blocks packed into one
+                          tesseract call, see block_ocr.py) or "easyocr".
+            languages (tuple): Languages expected on the covers.
+            processes (int): Number of worker processes, defaults to the number of CPU cores.
+        """
+        self.name = engine
+        self.engine = engine
+        self.languages = tuple(languages)
+        self.processes = processes or os.cpu_count() or 1
+        self.max_batch_size = self.processes
+        self.provides_words = engine != "easyocr"
+
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.processes,
+            initializer=_init_local_worker,
+            initargs=(self.engine, self.languages))
+
+        self._lock = threading.Lock()
+        self.image_count = 0
+        self.seconds = 0.0
+
+    def settings(self) -> dict:
+        return {"engine": self.engine, "language_hints": list(self.languages)}
+
+    def annotate(self, content: bytes) -> OCRResult:
+        start_time = time.perf_counter()
+        try:
+            return OCRResult(*self._executor.submit(_local_worker_extract, content).result())
+        finally:
+            self._record(1, time.perf_counter() - start_time)
+
+    def annotate_batch(self, contents: list) -> list:
+        start_time = time.perf_counter()
+        futures = [self._executor.submit(_local_worker_extract, content)
+                   for content in contents]
+
+        results = []
+        for future in futures:
+            try:
+                results.append(OCRResult(*future.result()))
+            except Exception as e:
+                results.append(e)
+        self._record(len(contents), time.perf_counter() - start_time)
+        return results
+
+    def _record(self, image_count: int, seconds: float):
+        with self._lock:
+            self.image_count += image_count
+            self.seconds += seconds
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "processes": self.processes,
+                "images": self.image_count,
+                "seconds": round(self.seconds, 3),
+            }
+
+    def close(self):
+        self._executor.shutdown()
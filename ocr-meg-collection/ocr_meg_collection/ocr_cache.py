@@ -0,0 +1,180 @@
+import os
+import json
+import hashlib
+import logging
+import threading
+import time
+
+# Set up logging
+logging.basicConfig(level=logging.INFO,
+                    format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+class OCRResultCache:
+    def __init__(self, cache_dir: str, max_bytes=512 * 1024 * 1024):
+        """
+        Initializes the OCRResultCache class.
+
+        A persistent, content-addressed store of OCR results. Entries are keyed by the
+        SHA-256 of the image bytes combined with the OCR settings, so an unchanged cover
+        is never sent to the OCR API twice. Once the cache grows past max_bytes, the
+        least recently used entries are evicted.
+
+        Args:
+            cache_dir (str): Directory where the cache entries are stored.
+            max_bytes (int): Maximum total size of the cache entries on disk.
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._lock = threading.Lock()
+        # key -> [size in bytes, last access time], rebuilt from disk on startup
+        self._entries = {}
+        self._total_bytes = 0
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._load_index()
+
+    @staticmethod
+    def image_digest(content: bytes) -> str:
+        """
+        Returns the SHA-256 hex digest of the image bytes.
+        """
+        return hashlib.sha256(content).hexdigest()
+
+    @staticmethod
+    def make_key(image_digest: str, settings: dict) -> str:
+        """
+        Builds the cache key of an image for the given OCR settings.
+
+        Args:
+            image_digest (str): SHA-256 hex digest of the image bytes.
+            settings (dict): OCR settings that influence the result (language hints, feature type, ...).
+
+        Returns:
+            str: The hex digest identifying the cache entry.
+        """
+        payload = json.dumps({"image": image_digest, "settings": settings},
+                             sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _entry_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+    def _load_index(self):
+        """
+        Scans the cache directory to rebuild the size and access time of every entry.
+        """
+        for root, _, files in os.walk(self.cache_dir):
+            for file in files:
+                if not file.endswith(".json"):
+                    continue
+                stat = os.stat(os.path.join(root, file))
+                self._entries[file[:-len(".json")]] = [stat.st_size, stat.st_atime]
+                self._total_bytes += stat.st_size
+        logging.info(
+            f"OCR cache at {self.cache_dir} holds {len(self._entries)} entries ({self._total_bytes / 1e6:.1f} MB).")
+
+    def get(self, key: str, count: bool = True):
+        """
+        Returns the cached result for the key.
+
+        Args:
+            key (str): Key built with make_key.
+            count (bool): Count the lookup in the hit rate. Callers that may still reject the entry,
+                          or probe other keys, count it themselves with record_lookup.
+
+        Returns:
+            dict: The stored result, or None on a cache miss.
+        """
+        entry_path = self._entry_path(key)
+        try:
+            with open(entry_path, "r") as entry_file:
+                value = json.load(entry_file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            if count:
+                self.record_lookup(False)
+            return None
+
+        now = time.time()
+        os.utime(entry_path, (now, now))
+        if count:
+            self.record_lookup(True)
+        with self._lock:
+            if key in self._entries:
+                self._entries[key][1] = now
+        return value
+
+    def record_lookup(self, hit: bool):
+        """
+        Counts a lookup in the hit rate.
+        """
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def put(self, key: str, value: dict):
+        """
+        Stores a result in the cache and evicts old entries if the cache is too large.
+
+        Args:
+            key (str): Key built with make_key.
+            value (dict): JSON serializable result, e.g. {"text": "..."}.
+        """
+        entry_path = self._entry_path(key)
+        os.makedirs(os.path.dirname(entry_path), exist_ok=True)
+
+        # Write to a temporary file first so a crash never leaves a truncated entry
+        tmp_path = f"{entry_path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w") as entry_file:
+            json.dump(value, entry_file)
+        os.replace(tmp_path, entry_path)
+        size = os.path.getsize(entry_path)
+
+        with self._lock:
+            previous = self._entries.get(key)
+            if previous:
+                self._total_bytes -= previous[0]
+            self._entries[key] = [size, time.time()]
+            self._total_bytes += size
+            self._evict()
+
+    def _evict(self):
+        """
+        Removes the least recently used entries until the cache fits in max_bytes.
+        Must be called with the lock held.
+        """
+        if self._total_bytes <= self.max_bytes:
+            return
+
+        for key, (size, _) in sorted(self._entries.items(), key=lambda item: item[1][1]):
+            if self._total_bytes <= self.max_bytes:
+                break
+            try:
+                os.remove(self._entry_path(key))
+            except FileNotFoundError:
+                pass
+            del self._entries[key]
+            self._total_bytes -= size
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        """
+        Returns the hit, miss and eviction counts of the cache.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "size_bytes": self._total_bytes,
+            }
@@ -1,10 +1,21 @@
 import os
+import csv
+import time
+import random
+import difflib
 import logging
-from ocr_meg_collection.utils import fetch_lp_covers_path
-from google.cloud import vision
+import itertools
+import threading
+from contextlib import nullcontext
+from ocr_meg_collection.storage import DirectoryStorage
+from ocr_meg_collection.ocr_backends import OCRResult, VisionBackend, VISION_API_ENDPOINT, VISION_MAX_IMAGES_PER_REQUEST
+from ocr_meg_collection.annotation_store import save_annotations
+from ocr_meg_collection.ocr_cache import OCRResultCache
+from ocr_meg_collection.dead_letter import DeadLetterStore
+from ocr_meg_collection.concurrency import AdaptiveConcurrencyLimiter, OCRThrottledError
 from dotenv import load_dotenv
 from tqdm import tqdm
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 
 # Set up logging
 logging.basicConfig(level=logging.INFO,
@@ -21,146 +32,726 @@ print("Google Service Account JSON File Creds Loaded Successfully for OCR PROCES
 TARGET_DIR = os.path.join(os.getcwd(),
                           'ocr-meg-collection', 'ds_pipeline', '0_raw_ocr_txt')
 
+# Content-addressed OCR results, reused across runs for unchanged covers
+CACHE_DIR = os.path.join(os.getcwd(),
+                         'ocr-meg-collection', 'ds_pipeline', 'ocr_cache')
+
+# Clusters of near-duplicate covers found by the perceptual hash index
+DUPLICATE_REPORT = os.path.join(os.getcwd(),
+                                'ocr-meg-collection', 'ds_pipeline', 'duplicate_covers.json')
+
 
 class OCRPipeline:
-    def __init__(self, base_dir: str, lp_list: list, max_workers=4):
+    def __init__(self, base_dir: str, lp_list: list, max_workers=4, batch_mode=False,
+                 batch_size=VISION_MAX_IMAGES_PER_REQUEST, api_endpoint=VISION_API_ENDPOINT,
+                 request_timeout=60.0, use_cache=True, cache_dir=CACHE_DIR,
+                 cache_max_bytes=512 * 1024 * 1024, preprocessors=None, backend=None,
+                 adaptive_concurrency=False, max_concurrency=32, max_retries=5, retry_base_delay=1.0,
+                 submission_window=None, store_annotations=False, duplicate_index=None, storage=None,
+                 dead_letters=None):
         """
         Initializes the OCRPipeline class.
 
         Args:
             base_dir (str): Path to the directory containing the numerical folders of each LP.
-            lp_list (list): List of the LPs to be processed by OCR.
+            lp_list (list): List (or any iterable) of the LPs to be processed by OCR. Cover paths
+                            are looked up lazily as the LPs are scheduled.
             max_workers (int): The maximum number of threads to use for concurrent processing.
+            batch_mode (bool): Send the covers of many LPs together in batched backend calls
+                               (batch_annotate_images for Vision) instead of one call per cover.
+            batch_size (int): Number of images per batch request, capped at the backend limit.
+            api_endpoint (str): Optional Vision API endpoint for the default backend, e.g. a local stand-in server.
+            request_timeout (float): Deadline in seconds applied to every Vision API call of the default backend.
+            use_cache (bool): Reuse the stored OCR result of covers whose bytes and settings are unchanged.
+            cache_dir (str): Directory of the persistent OCR result cache.
+            cache_max_bytes (int): Size above which the least recently used cache entries are evicted.
+            preprocessors (list): Optional stages applied in order to the cover bytes before upload,
+                                  e.g. a CoverPreprocessor that downscales and recompresses the scans.
+            backend (OCRBackend): OCR engine to use, defaults to a VisionBackend.
+            adaptive_concurrency (bool): Start with max_workers requests in flight and let an AIMD
+                                         controller raise it up to max_concurrency while the API stays
+                                         healthy, and back off when it throttles.
+            max_concurrency (int): Ceiling of in-flight requests when adaptive_concurrency is enabled.
+            max_retries (int): Number of retries of a throttled image before giving up on it.
+            retry_base_delay (float): Initial backoff in seconds between retries, doubled on each attempt.
+            submission_window (int): Maximum number of OCR tasks submitted but not finished, defaults to
+                                     twice the number of worker threads.
+            store_annotations (bool): Also store the word boxes, confidences and block/line structure of
+                                      both covers in {album}_annotations.npz next to the combined text.
+            duplicate_index (CoverHashIndex): Optional perceptual hash index of the covers. A cover
+                                              whose near-duplicate was already read reuses its OCR result,
+                                              and the duplicate clusters are reported in DUPLICATE_REPORT.
+            storage (Storage): Where the LP folders are read from, defaults to the folders under base_dir.
+                               An ArchiveStorage reads the covers straight out of zip/tar archives.
+            dead_letters (DeadLetterStore): Where the images whose OCR failed are recorded with their error
+                                            and attempt count, defaults to DEAD_LETTER_FILE. Images read
+                                            successfully are removed from it.
         """
         self.base_dir = base_dir
         self.lp_list = lp_list
-        self.cover_paths = self._get_all_lp_covers_path()
+        self.storage = storage or DirectoryStorage(base_dir)
         self.max_workers = max_workers
-
-    def _get_all_lp_covers_path(self) -> dict:
+        self.max_retries = max_retries
+        self.retry_base_delay = retry_base_delay
+
+        # Bounds the in-flight backend calls, fixed at max_workers unless adaptive
+        self.limiter = AdaptiveConcurrencyLimiter(
+            initial=max_workers,
+            min_limit=1 if adaptive_concurrency else max_workers,
+            max_limit=max_concurrency if adaptive_concurrency else max_workers)
+        self.backend = backend or VisionBackend(
+            api_endpoint=api_endpoint, pool_size=self.limiter.max_limit, request_timeout=request_timeout)
+        self.batch_mode = batch_mode
+        self.batch_size = max(
+            1, min(batch_size, self.backend.max_batch_size))
+        self.cache = OCRResultCache(
+            cache_dir, cache_max_bytes) if use_cache else None
+        self.preprocessors = preprocessors or []
+        self.submission_window = submission_window or 2 * self.limiter.max_limit
+        self.store_annotations = store_annotations
+        self.dead_letters = dead_letters if dead_letters is not None else DeadLetterStore()
+        self.failed_images = 0
+
+        self.duplicate_index = duplicate_index
+        self.duplicates_reused = 0
+        # Results read in this run per cover, and one lock per duplicate cluster so that
+        # near-duplicates in flight together are sent once
+        self._duplicate_results = {}
+        self._cluster_locks = {}
+        self._duplicates_lock = threading.Lock()
+
+    def _iter_lp_covers_path(self):
         """
-        Retrieves the paths of all LP covers for each LP in the list.
+        Lazily retrieves the paths of the LP covers for each LP in the list.
 
-        Uses the fetch_lp_covers_path utility function to obtain the front and back cover paths
-        for each LP specified in the lp_list.
+        Asks the storage for the front and back cover paths of each LP only when it is about
+        to be scheduled.
 
-        Returns:
-            dict: A dictionary where each key is an LP identifier and the value is a list containing the paths
-                  to the front and back covers of the LP.
+        Yields:
+            tuple: The LP identifier and a list containing the paths to its front and back covers.
         """
-        covers_path_dict = {}
-        for lp in tqdm(self.lp_list, desc="Fetching LP cover paths", unit="LP"):
+        for lp in self.lp_list:
             try:
-                cover_paths = fetch_lp_covers_path(self.base_dir, lp)
-                covers_path_dict[lp] = cover_paths
+                cover_paths = self.storage.cover_paths(lp)
                 logging.info(f"Fetched paths for LP: {lp}")
+                yield lp, cover_paths
             except FileNotFoundError:
                 logging.error(
                     f"LP '{lp}' does not exist in the specified directory: {self.base_dir}")
-        return covers_path_dict
+
+    def _iter_images(self, on_skip=None):
+        """
+        Yields the cover images of the LPs that can be processed, front cover first.
+
+        Args:
+            on_skip (callable): Called with the LP identifier of every LP that is skipped.
+
+        Yields:
+            tuple: (album, side, path) where side is 0 for the front and 1 for the back cover.
+        """
+        for album, paths in self._iter_lp_covers_path():
+            if not self._has_valid_covers(album, paths):
+                if on_skip:
+                    on_skip(album)
+                continue
+            for side, path in enumerate(paths):
+                yield album, side, path
+
+    def _iter_tasks(self, images):
+        """
+        Groups the images into OCR tasks: one task per image, or one per batch request in batch mode.
+
+        Args:
+            images (iterable): (album, side, path) tuples of the images to send.
+
+        Yields:
+            list: The (album, side, path) tuples of one task.
+        """
+        if self.batch_mode:
+            yield from self._chunk_images(images)
+        else:
+            for image in images:
+                yield [image]
+
+    def _run_task(self, task: list) -> list:
+        """
+        Reads the images of one task.
+
+        Args:
+            task (list): (album, side, path) tuples of the images.
+
+        Returns:
+            list: The OCRResult of each image of the task.
+        """
+        if self.batch_mode:
+            return self._annotate_images([path for _, _, path in task])
+        return [self._annotate_image(path) for _, _, path in task]
 
     def process_ocr(self):
         """
         Processes OCR on the LP covers and stores the extracted text in the target directory.
+
+        Each cover (or batch of covers in batch mode) is scheduled as its own task, so both
+        covers of an LP are in flight at the same time and joined once both are done. Tasks
+        are pulled lazily from the LP list through a bounded submission window, which keeps
+        memory and startup time flat regardless of how many LPs are selected.
         """
         logging.info("Starting OCR process...")
 
-        # Use a ThreadPoolExecutor to handle multiple images concurrently
-        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
-            future_to_album = {
-                executor.submit(self._process_single_album, album, paths): album
-                for album, paths in self.cover_paths.items()
-            }
+        # OCR results of the LPs in flight, indexed by side (0: front, 1: back)
+        album_results = {}
+        total = len(self.lp_list) if hasattr(self.lp_list, "__len__") else None
+
+        # Use a ThreadPoolExecutor to handle multiple images concurrently, the limiter
+        # decides how many of the threads may have a request in flight
+        with ThreadPoolExecutor(max_workers=self.limiter.max_limit) as executor, \
+                tqdm(total=total, desc="Processing OCR for LPs", unit="LP") as progress:
+            tasks = self._iter_tasks(self._iter_images(
+                on_skip=lambda album: progress.update(1)))
+
+            in_flight = {}
+
+            def submit(count):
+                for task in itertools.islice(tasks, count):
+                    in_flight[executor.submit(self._run_task, task)] = task
+
+            submit(self.submission_window)
+            while in_flight:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    task = in_flight.pop(future)
+                    try:
+                        results = future.result()
+                    except Exception as e:
+                        logging.error(f"Error processing OCR task: {e}")
+                        results = [OCRResult("", error=e)] * len(task)
+
+                    for (album, side, path), result in zip(task, results):
+                        self._track_failure(album, side, path, result)
+                        sides = album_results.setdefault(album, [None, None])
+                        sides[side] = result
+                        if None not in sides:
+                            self._store_results(album, *sides)
+                            del album_results[album]
+                            progress.update(1)
+
+                progress.set_postfix(concurrency=self.limiter.current_limit)
+                submit(self.submission_window - len(in_flight))
+
+        self._log_run_stats()
+        if self.duplicate_index:
+            self.duplicate_index.write_report(
+                DUPLICATE_REPORT, extra={"ocr_results_reused": self.duplicates_reused})
+        logging.info("OCR process completed.")
 
-            # Use tqdm to display progress
-            for future in tqdm(as_completed(future_to_album), total=len(future_to_album), desc="Processing OCR for LPs", unit="LP"):
-                album = future_to_album[future]
-                try:
-                    future.result()  # Get the result to check for any raised exceptions
-                except Exception as e:
-                    logging.error(f"Error processing LP '{album}': {e}")
+    def _log_run_stats(self):
+        """
+        Logs the cache hit/miss counts, the bytes saved by preprocessing and the backend statistics.
+        """
+        if self.cache:
+            cache_stats = self.cache.stats()
+            logging.info(
+                f"OCR cache hits: {cache_stats['hits']}, misses: {cache_stats['misses']} "
+                f"(hit rate {cache_stats['hit_rate']:.1%}), evictions: {cache_stats['evictions']}")
 
-        logging.info("OCR process completed.")
+        if self.duplicate_index:
+            logging.info(
+                f"Near-duplicate covers reusing an OCR result: {self.duplicates_reused}")
+
+        if self.failed_images:
+            logging.warning(
+                f"{self.failed_images} images failed OCR and were stored with an empty text, "
+                f"{len(self.dead_letters)} images are in the dead-letter store "
+                f"({self.dead_letters.file_path}), run 'retry-failed' to read them again.")
+
+        for preprocessor in self.preprocessors:
+            stage_stats = preprocessor.stats()
+            logging.info(
+                f"Preprocessing '{stage_stats['stage']}': {stage_stats['images']} images, "
+                f"{stage_stats['bytes_in'] / 1e6:.1f} MB -> {stage_stats['bytes_out'] / 1e6:.1f} MB "
+                f"({stage_stats['bytes_saved'] / 1e6:.1f} MB saved) in {stage_stats['seconds']:.2f}s"
+                + (f", full image sent for {stage_stats['fallbacks']}" if "fallbacks" in stage_stats else ""))
+
+        limiter_stats = self.limiter.stats()
+        logging.info(
+            f"Concurrency: {limiter_stats['concurrency']} in flight (range {limiter_stats['lowest_concurrency']}-"
+            f"{limiter_stats['peak_concurrency']}), throttled requests: {limiter_stats['throttles']}, "
+            f"failed requests: {limiter_stats['errors']}")
+
+        self.backend.log_stats()
+
+    def _track_failure(self, album: str, side: int, image_path: str, result: OCRResult):
+        """
+        Records a failed image in the dead-letter store, or clears it once it was read.
+        """
+        if result.error is None:
+            self.dead_letters.resolve(image_path)
+            return
+        self.failed_images += 1
+        self.dead_letters.record(album, side, image_path, result.error)
 
-    def _process_single_album(self, album, paths):
+    def close(self):
         """
-        Processes a single album by extracting text from its front and back covers.
+        Releases the resources held by the OCR backend.
+        """
+        self.backend.close()
+
+    def _chunk_images(self, images):
+        """
+        Groups images into batches that respect the per-request image and payload limits.
+
+        Args:
+            images (iterable): (album, side, path) tuples of the images to send.
+
+        Yields:
+            list: The (album, side, path) tuples of one batch request.
+        """
+        batch, batch_bytes = [], 0
+        for image in images:
+            image_bytes = self.storage.stat(image[2])[0]
+            if batch and (len(batch) >= self.batch_size
+                          or (self.backend.max_batch_bytes
+                              and batch_bytes + image_bytes > self.backend.max_batch_bytes)):
+                yield batch
+                batch, batch_bytes = [], 0
+            batch.append(image)
+            batch_bytes += image_bytes
+        if batch:
+            yield batch
+
+    def _has_valid_covers(self, album, paths) -> bool:
+        """
+        Checks that both cover images of an album are known and present on disk.
 
         Args:
             album (str): The album identifier.
             paths (list): A list containing paths to the front and back covers.
+
+        Returns:
+            bool: True if both covers can be processed.
         """
         if not paths or len(paths) != 2:
             logging.warning(
                 f"Skipping LP '{album}' due to missing cover images.")
-            return
-
-        # Extract front and back image paths
-        front_image_path, back_image_path = paths
+            return False
 
         # Check if front and back images are not None and exist
-        if not front_image_path or not back_image_path:
+        if not all(paths):
             logging.warning(
                 f"Skipping LP '{album}' due to one or both image paths being None.")
-            return
+            return False
 
-        if not all(os.path.exists(p) for p in [front_image_path, back_image_path]):
+        if not all(self.storage.exists(p) for p in paths):
             logging.warning(
                 f"Skipping LP '{album}' due to missing image files.")
-            return
-
-        # Extract text from front and back covers
-        front_text = self._extract_text_from_image(front_image_path)
-        back_text = self._extract_text_from_image(back_image_path)
+            return False
 
-        # Store the extracted text in a single file
-        self._store_text_to_file(album, front_text, back_text)
+        return True
 
-    def _extract_text_from_image(self, image_path: str) -> str:
+    def _annotate_image(self, image_path: str) -> OCRResult:
         """
-        Extracts only the first detected text from the provided image path using Google Cloud Vision API.
+        Reads the provided image path with the OCR backend (Google Cloud Vision API by default).
 
         Args:
             image_path (str): Path to the image from which to extract text.
 
         Returns:
-            str: The first detected text as a single string.
+            OCRResult: The first detected text as a single string, and its words.
         """
-        if not image_path or not os.path.exists(image_path):
+        if not image_path or not self.storage.exists(image_path):
             logging.error(f"Image file '{image_path}' does not exist.")
-            return ""
+            return OCRResult("", error=FileNotFoundError(image_path))
 
         logging.info(f"Extracting text from image: {image_path}")
 
         try:
-            client = vision.ImageAnnotatorClient()
+            content = self.storage.read_bytes(image_path)
+
+            cache_key = self._cache_key(content)
+            cached = self._cached_result(cache_key)
+            if cached is not None:
+                logging.info(f"Using cached OCR result for: {image_path}")
+                return cached
+
+            with self._cluster_lock(image_path):
+                duplicate = self._duplicate_result(image_path)
+                if duplicate is not None:
+                    self._cache_result(cache_key, duplicate)
+                    return duplicate
+
+                result = self._call_backend(
+                    self.backend.annotate, self._prepare_payload(content))
+                self._cache_result(cache_key, result)
+                self._remember_duplicate(image_path, result)
+            return result
 
-            with open(image_path, "rb") as image_file:
-                content = image_file.read()
+        except Exception as e:
+            logging.error(f"Error occurred while extracting text: {e}")
+            return OCRResult("", error=e)
 
-            image = vision.Image(content=content)
-            image_context = vision.ImageContext(language_hints=["es", "en"])
+    def _annotate_images(self, image_paths: list) -> list:
+        """
+        Reads several images with a single batched backend call.
 
-            response = client.text_detection(
-                image=image, image_context=image_context)
-            texts = response.text_annotations
+        Args:
+            image_paths (list): Paths to the images, at most the backend's max_batch_size.
 
-            if response.error.message:
-                raise Exception(
-                    f"{response.error.message}\nFor more info on error messages, "
-                    "check: https://cloud.google.com/apis/design/errors"
-                )
+        Returns:
+            list: The OCRResult of each image, in the order of image_paths.
+                  Images whose annotation failed yield an empty text and their error. Images found in
+                  the OCR cache, or near-duplicates of an image already read, are not sent.
+        """
+        logging.info(f"Extracting text from a batch of {len(image_paths)} images.")
+
+        results = [None] * len(image_paths)
+        pending = []  # (index, cache key, payload) of the images not found in the cache
+        followers = []  # (index, cache key, index of the pending near-duplicate) sent only once
+        pending_paths = {}  # path -> index of the pending images
+        for index, image_path in enumerate(image_paths):
+            content = self.storage.read_bytes(image_path)
+
+            cache_key = self._cache_key(content)
+            cached = self._cached_result(cache_key)
+            if cached is None:
+                cached = self._duplicate_result(image_path)
+                if cached is not None:
+                    self._cache_result(cache_key, cached)
+            if cached is not None:
+                results[index] = cached
+                continue
+
+            neighbours = self.duplicate_index.near_duplicates(image_path) if self.duplicate_index else []
+            leader = next((pending_paths[other] for other in neighbours if other in pending_paths), None)
+            if leader is not None:
+                followers.append((index, cache_key, leader))
+                continue
+            pending_paths[image_path] = index
+            pending.append(
+                (index, cache_key, self._prepare_payload(content)))
+
+        if not pending:
+            logging.info("All images of the batch were found in the OCR cache.")
+            return results
+
+        for attempt in range(self.max_retries + 1):
+            batch_results = self._call_backend(
+                self.backend.annotate_batch, [payload for _, _, payload in pending])
+
+            # Images throttled inside an accepted batch are sent again on their own
+            throttled = []
+            for item, result in zip(pending, batch_results):
+                index, cache_key, _ = item
+                if isinstance(result, OCRThrottledError) and attempt < self.max_retries:
+                    throttled.append(item)
+                elif isinstance(result, Exception):
+                    logging.error(
+                        f"Error occurred while extracting text from '{image_paths[index]}': {result}")
+                    results[index] = OCRResult("", error=result)
+                else:
+                    results[index] = result
+                    self._cache_result(cache_key, result)
+                    self._remember_duplicate(image_paths[index], result)
+
+            if not throttled:
+                break
+            logging.warning(
+                f"{len(throttled)} images of the batch were throttled, retrying them.")
+            self.limiter.on_throttle()
+            self._backoff(attempt)
+            pending = throttled
+
+        for index, cache_key, leader in followers:
+            results[index] = results[leader]
+            if results[leader].text:
+                self._cache_result(cache_key, results[leader])
+                with self._duplicates_lock:
+                    self.duplicates_reused += 1
+        return results
+
+    def _cluster_lock(self, image_path: str):
+        """
+        Returns the lock of the duplicate cluster of a cover, a no-op context for covers without duplicates.
+        """
+        cluster = self.duplicate_index.cluster_of(image_path) if self.duplicate_index else None
+        if cluster is None:
+            return nullcontext()
+        with self._duplicates_lock:
+            return self._cluster_locks.setdefault(cluster, threading.Lock())
 
-            if texts:
-                first_detected_text = texts[0].description.strip()
-                return first_detected_text
-            else:
-                logging.info("No text detected.")
-                return ""
+    def _duplicate_result(self, image_path: str):
+        """
+        Finds an OCR result of a near-duplicate of the cover, read in this run or stored in the cache.
 
-        except Exception as e:
-            logging.error(f"Error occurred while extracting text: {e}")
-            return ""
+        Only covers within the threshold of this cover's own hash are considered, not the whole
+        cluster: a chain of neighbours can link covers of different LPs.
+
+        Returns:
+            OCRResult: The result to reuse, or None if no duplicate was read yet.
+        """
+        if not self.duplicate_index:
+            return None
+        neighbours = self.duplicate_index.near_duplicates(image_path)
+        if not neighbours:
+            return None
+
+        with self._duplicates_lock:
+            result = next((self._duplicate_results[other] for other in neighbours
+                           if other in self._duplicate_results), None)
+        if result is None and self.cache:
+            settings = self._ocr_settings()
+            for digest in self.duplicate_index.duplicate_digests(image_path):
+                result = self._cached_result(OCRResultCache.make_key(digest, settings), count=False)
+                if result is not None:
+                    break
+        if result is None:
+            return None
+
+        logging.info(f"Reusing the OCR result of a near-duplicate cover for: {image_path}")
+        # Not remembered for this cover: its own neighbours may be too far from the cover actually read
+        with self._duplicates_lock:
+            self.duplicates_reused += 1
+        return result
+
+    def _remember_duplicate(self, image_path: str, result: OCRResult):
+        """
+        Keeps the OCR result of a cover read by the backend for its near-duplicates.
+        """
+        if not self.duplicate_index or not result.text:
+            return
+        with self._duplicates_lock:
+            self._duplicate_results[image_path] = result
+
+    def _cached_result(self, cache_key: str, count: bool = True):
+        """
+        Looks up the OCR result of an image in the cache.
+
+        Entries stored without words do not satisfy a run storing annotations when the
+        backend can provide them, so the image is read again.
+
+        Args:
+            cache_key (str): Key of the image.
+            count (bool): Count the lookup in the cache hit rate, False for the near-duplicate probes.
+
+        Returns:
+            OCRResult: The cached result, or None if the image must be sent to the backend.
+        """
+        if not self.cache:
+            return None
+        cached = self.cache.get(cache_key, count=False)
+        if cached is not None and self.store_annotations and self.backend.provides_words \
+                and cached.get("words") is None:
+            cached = None
+        # Counted once the entry is accepted, a rejected entry is a miss
+        if count:
+            self.cache.record_lookup(cached is not None)
+        if cached is None:
+            return None
+        return OCRResult(cached["text"], cached.get("words"))
+
+    def _cache_result(self, cache_key: str, result: OCRResult):
+        """
+        Stores the OCR result of an image in the cache, with its words when the backend provides them.
+        """
+        if not self.cache:
+            return
+        entry = {"text": result.text}
+        if result.words is not None:
+            entry["words"] = result.words
+        self.cache.put(cache_key, entry)
+
+    def _call_backend(self, call, *args):
+        """
+        Calls the OCR backend within a concurrency slot, retrying throttled calls with exponential backoff.
+
+        Args:
+            call (callable): Backend method to call.
+            *args: Arguments of the method.
+
+        Returns:
+            The result of the backend call.
+        """
+        for attempt in range(self.max_retries + 1):
+            with self.limiter.slot():
+                start_time = time.perf_counter()
+                try:
+                    result = call(*args)
+                except OCRThrottledError:
+                    self.limiter.on_throttle()
+                    if attempt == self.max_retries:
+                        raise
+                    logging.warning(
+                        f"OCR request throttled, retrying (attempt {attempt + 1}/{self.max_retries}).")
+                except Exception:
+                    self.limiter.on_error()
+                    raise
+                else:
+                    self.limiter.on_success(time.perf_counter() - start_time)
+                    return result
+            # Wait outside of the slot so other requests are not held back
+            self._backoff(attempt)
+
+    def _backoff(self, attempt: int):
+        """
+        Sleeps before a retry, doubling the delay on each attempt with some jitter.
+        """
+        delay = min(60.0, self.retry_base_delay * 2 ** attempt)
+        time.sleep(delay * random.uniform(0.5, 1.0))
+
+    def _prepare_payload(self, content: bytes) -> bytes:
+        """
+        Runs the cover bytes through the preprocessing stages before upload.
+        """
+        for preprocessor in self.preprocessors:
+            content = preprocessor.process(content)
+        return content
+
+    def _ocr_settings(self) -> dict:
+        """
+        Returns the settings that change the OCR result of an image, part of its cache key.
+        """
+        settings = dict(self.backend.settings())
+        if self.preprocessors:
+            settings["preprocessing"] = [preprocessor.settings()
+                                         for preprocessor in self.preprocessors]
+        return settings
+
+    def _cache_key(self, content: bytes) -> str:
+        """
+        Returns the cache key of the image bytes under the current OCR settings.
+        """
+        return OCRResultCache.make_key(
+            OCRResultCache.image_digest(content), self._ocr_settings())
+
+    def compare_preprocessing(self, image_paths: list = None, candidates: list = ()) -> list:
+        """
+        Compares the upload of the original covers with the output of candidate preprocessors.
+
+        Each image is sent once as-is and once per candidate, bypassing the cache. For every
+        variant the payload size, the upload latency and the similarity of the text to the
+        full resolution OCR are reported, to find the smallest payload that keeps OCR quality.
+
+        Args:
+            image_paths (list): Sample of cover images to send, both covers of each LP of the list if None.
+            candidates (list): Preprocessors to compare, e.g. CoverPreprocessor instances
+                               with different long edges or JPEG qualities.
+
+        Returns:
+            list: One dictionary per variant with its mean payload size, mean upload time,
+                  latency change against the original and mean text similarity.
+        """
+        if image_paths is None:
+            image_paths = [path for album, paths in self._iter_lp_covers_path()
+                           if self._has_valid_covers(album, paths) for path in paths]
+        variants = [("original", None)] + [
+            (", ".join(f"{key}={value}" for key, value in candidate.settings().items()), candidate)
+            for candidate in candidates
+        ]
+        totals = {name: {"bytes": 0, "seconds": 0.0, "similarity": 0.0}
+                  for name, _ in variants}
+
+        for image_path in tqdm(image_paths, desc="Comparing preprocessing", unit="image"):
+            content = self.storage.read_bytes(image_path)
+
+            reference_text = None
+            for name, candidate in variants:
+                payload = candidate.process(content) if candidate else content
+
+                start_time = time.perf_counter()
+                text = self.backend.extract_text(payload)
+                elapsed = time.perf_counter() - start_time
+
+                if reference_text is None:
+                    reference_text = text
+                totals[name]["bytes"] += len(payload)
+                totals[name]["seconds"] += elapsed
+                totals[name]["similarity"] += difflib.SequenceMatcher(
+                    None, reference_text, text).ratio()
+
+        count = max(1, len(image_paths))
+        original_seconds = totals["original"]["seconds"] / count
+        report = []
+        for name, _ in variants:
+            mean_seconds = totals[name]["seconds"] / count
+            row = {
+                "variant": name,
+                "mean_bytes": int(totals[name]["bytes"] / count),
+                "mean_upload_seconds": round(mean_seconds, 3),
+                "latency_change_seconds": round(mean_seconds - original_seconds, 3),
+                "mean_text_similarity": round(totals[name]["similarity"] / count, 3),
+            }
+            report.append(row)
+            logging.info(
+                f"{row['variant']}: {row['mean_bytes'] / 1e6:.2f} MB, {row['mean_upload_seconds']:.3f}s "
+                f"({row['latency_change_seconds']:+.3f}s), similarity {row['mean_text_similarity']:.3f}")
+        return report
+
+    def report_preprocessing_savings(self, candidate, report_path: str = None) -> list:
+        """
+        Measures, for each LP of the list, the payload and OCR latency saved by a preprocessing stage.
+
+        Both covers of every LP are sent as-is and through the candidate, bypassing the cache,
+        e.g. to check on a sample how much a TextRegionCropper saves before enabling it.
+
+        Args:
+            candidate: Preprocessor to measure, e.g. a TextRegionCropper.
+            report_path (str): Optional CSV file receiving one row per LP.
+
+        Returns:
+            list: One dictionary per LP with the bytes and seconds of both variants, what was
+                  saved, and the similarity of the processed text to the original text.
+        """
+        rows = []
+        for album, paths in tqdm(self._iter_lp_covers_path(), desc="Measuring preprocessing", unit="LP"):
+            if not self._has_valid_covers(album, paths):
+                continue
+
+            row = {"lp": album, "bytes_original": 0, "bytes_processed": 0,
+                   "seconds_original": 0.0, "seconds_processed": 0.0, "text_similarity": 0.0}
+            for path in paths:
+                content = self.storage.read_bytes(path)
+
+                texts = {}
+                for variant, payload in (("original", content), ("processed", candidate.process(content))):
+                    start_time = time.perf_counter()
+                    texts[variant] = self.backend.extract_text(payload)
+                    row[f"seconds_{variant}"] += time.perf_counter() - start_time
+                    row[f"bytes_{variant}"] += len(payload)
+                row["text_similarity"] += difflib.SequenceMatcher(
+                    None, texts["original"], texts["processed"]).ratio() / len(paths)
+
+            row["bytes_saved"] = row["bytes_original"] - row["bytes_processed"]
+            row["seconds_saved"] = round(row["seconds_original"] - row["seconds_processed"], 3)
+            for key in ("seconds_original", "seconds_processed", "text_similarity"):
+                row[key] = round(row[key], 3)
+            rows.append(row)
+            logging.info(
+                f"{album}: {row['bytes_original'] / 1e6:.2f} MB -> {row['bytes_processed'] / 1e6:.2f} MB, "
+                f"{row['seconds_original']:.3f}s -> {row['seconds_processed']:.3f}s, "
+                f"similarity {row['text_similarity']:.3f}")
+
+        if report_path and rows:
+            with open(report_path, "w", newline="") as report_file:
+                writer = csv.DictWriter(report_file, fieldnames=list(rows[0]))
+                writer.writeheader()
+                writer.writerows(rows)
+            logging.info(f"Preprocessing savings per LP stored in {report_path}")
+        return rows
+
+    def _store_results(self, album_name: str, front: OCRResult, back: OCRResult):
+        """
+        Stores the OCR results of both covers of an LP: the combined text, and the
+        word annotations when store_annotations is enabled.
+
+        Args:
+            album_name (str): The name of the LP album.
+            front (OCRResult): OCR result of the front cover.
+            back (OCRResult): OCR result of the back cover.
+        """
+        self._store_text_to_file(album_name, front.text, back.text)
+        if self.store_annotations and (front.words or back.words):
+            file_path = os.path.join(TARGET_DIR, f"{album_name}_annotations.npz")
+            save_annotations(file_path, [front.words, back.words])
+            logging.info(f"Word annotations of the album covers stored in {file_path}")
 
     def _store_text_to_file(self, album_name: str, front_text: str, back_text: str):
         """
@@ -189,3 +780,4 @@ if __name__ == "__main__":
         base_dir=base_dir, lp_list=lp_list, max_workers=4)
 
     ocr_pipeline.process_ocr()
+    ocr_pipeline.close()
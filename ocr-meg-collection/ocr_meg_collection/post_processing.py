@@ -4,6 +4,7 @@ import logging
 import pandas as pd
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from ocr_meg_collection.utils import fetch_track_duration, map_tracks_to_audio_files, normalize_track_number
+from ocr_meg_collection.storage import DirectoryStorage
 import re
 
 # Setup I/O Directories
@@ -14,11 +15,13 @@ TARGET_DIR = os.path.join(
 
 
 class Orchestrator:
-    def __init__(self, input_dir=INPUT_DIR, output_dir=TARGET_DIR, lp_base_dir=None, max_workers=4):
+    def __init__(self, input_dir=INPUT_DIR, output_dir=TARGET_DIR, lp_base_dir=None, max_workers=4, storage=None):
         self.input_dir = input_dir
         self.output_dir = output_dir
         self.lp_base_dir = lp_base_dir
         self.max_workers = max_workers
+        # Where the audio files are read from, the LP folders under lp_base_dir by default
+        self.storage = storage or DirectoryStorage(lp_base_dir)
 
     def split_info(self):
         # Split JSON files into General Info and Track Info
@@ -131,13 +134,13 @@ class Orchestrator:
 
         # Construct the expected filename based on the LP_ID, Face, and Track Number
         constructed_filename = f"{lp_id}_1z1_{face}{track_number}.mp3"
-        constructed_filepath = os.path.join(
-            self.lp_base_dir, lp_id, constructed_filename)
+        constructed_filepath = self.storage.path(lp_id, constructed_filename)
 
-        if os.path.exists(constructed_filepath):
-            # If the file exists, use it
+        if self.storage.exists(constructed_filepath):
+            # If the file exists, use it (mutagen reads the seekable stream, even inside an archive)
             track_filename = constructed_filename
-            track_length = fetch_track_duration(constructed_filepath)
+            with self.storage.open(constructed_filepath) as audio_file:
+                track_length = fetch_track_duration(audio_file)
         else:
             # If no exact match is found, fallback to the first available file
             track_filename = constructed_filename
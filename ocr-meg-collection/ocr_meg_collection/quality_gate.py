@@ -0,0 +1,204 @@
+import os
+import re
+import json
+import logging
+import threading
+
+# Set up logging
+logging.basicConfig(level=logging.INFO,
+                    format='%(asctime)s - %(levelname)s - %(message)s')
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+
+# LPs whose OCR text failed the quality gate, waiting to be read again with other OCR settings
+REOCR_QUEUE_FILE = os.path.join(
+    script_dir, '..', 'ds_pipeline', 'reocr_queue.json')
+
+LP_ID_PATTERN = re.compile(r"\bLP\s?-?\d{4}\b", re.IGNORECASE)
+# Track listing lines: "A1", "B-2", "1.", "2)", "1a", or a duration such as 3'45 / 3:45
+TRACK_LINE_PATTERN = re.compile(
+    r"^\s*(?:[AB]\s?-?\s?\d{1,2}\b|\d{1,2}\s?[.)]|\d{1,2}\s?[.-]?\s?[ab]\b)"
+    r"|\b\d{1,2}\s?[:'’′]\s?\d{2}\b",
+    re.IGNORECASE)
+SECTION_HEADERS = ("Front Cover:", "Back Cover:")
+
+
+def text_features(combined_text: str) -> dict:
+    """
+    Measures the features of a _combined.txt text used by the quality gate.
+
+    Args:
+        combined_text (str): Content of the combined text file, section headers included.
+
+    Returns:
+        dict: Number of characters, shares of letters, digits and symbols among the non-blank
+              characters, whether an LP identifier was read and the number of track-like lines.
+    """
+    text = combined_text
+    for header in SECTION_HEADERS:
+        text = text.replace(header, "")
+
+    characters = [character for character in text if not character.isspace()]
+    count = len(characters) or 1
+    letters = sum(character.isalpha() for character in characters)
+    digits = sum(character.isdigit() for character in characters)
+    return {
+        "characters": len(characters),
+        "letter_ratio": round(letters / count, 3),
+        "digit_ratio": round(digits / count, 3),
+        "symbol_ratio": round((len(characters) - letters - digits) / count, 3),
+        "has_lp_id": bool(LP_ID_PATTERN.search(text)),
+        "track_lines": sum(bool(TRACK_LINE_PATTERN.search(line)) for line in text.splitlines()),
+    }
+
+
+class ReOCRQueue:
+    def __init__(self, file_path=REOCR_QUEUE_FILE):
+        """
+        Initializes the ReOCRQueue class.
+
+        A small JSON file listing the LPs whose OCR text failed the quality gate, with the
+        reasons and the number of re-OCR attempts already made.
+
+        Args:
+            file_path (str): Location of the queue file.
+        """
+        self.file_path = file_path
+        self._lock = threading.Lock()
+        self._entries = {}
+        if os.path.exists(file_path):
+            with open(file_path, "r") as queue_file:
+                self._entries = json.load(queue_file)
+
+    def _save(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.file_path)), exist_ok=True)
+        tmp_path = f"{self.file_path}.tmp"
+        with open(tmp_path, "w") as queue_file:
+            json.dump(self._entries, queue_file, indent=2)
+        os.replace(tmp_path, self.file_path)
+
+    def add(self, lp_id: str, report: dict):
+        """
+        Queues an LP with the gate report explaining why its text was rejected.
+        """
+        with self._lock:
+            entry = self._entries.setdefault(lp_id, {"reocr_attempts": 0})
+            entry.update({"score": report["score"], "reasons": report["reasons"]})
+            self._save()
+
+    def remove(self, lp_id: str):
+        """
+        Removes an LP whose text now passes the gate.
+        """
+        with self._lock:
+            if self._entries.pop(lp_id, None) is not None:
+                self._save()
+
+    def record_attempt(self, lp_id: str):
+        """
+        Counts one more re-OCR of a queued LP.
+        """
+        with self._lock:
+            if lp_id in self._entries:
+                self._entries[lp_id]["reocr_attempts"] += 1
+                self._save()
+
+    def pending(self, max_attempts: int = 1) -> list:
+        """
+        Returns the queued LPs that were re-read fewer than max_attempts times.
+        """
+        with self._lock:
+            return sorted(lp_id for lp_id, entry in self._entries.items()
+                          if entry["reocr_attempts"] < max_attempts)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+
+class QualityGate:
+    def __init__(self, min_characters=60, min_letter_ratio=0.5, max_symbol_ratio=0.25,
+                 min_track_lines=2, min_score=0.5, queue=None):
+        """
+        Initializes the QualityGate class.
+
+        Sits between OCR and the LLM: every combined text is scored before it is sent to
+        classification. Empty or garbage texts (failed OCR, artwork read as symbols) go to
+        the re-OCR queue instead of spending a rate-limited LLM request.
+
+        Args:
+            min_characters (int): Fewest non-blank characters of a usable text.
+            min_letter_ratio (float): Lowest share of letters among the characters.
+            max_symbol_ratio (float): Highest share of symbols (neither letters nor digits).
+            min_track_lines (int): Track-like lines that make up for a missing LP identifier.
+            min_score (float): Lowest weighted score of a usable text.
+            queue (ReOCRQueue): Queue receiving the rejected LPs, defaults to REOCR_QUEUE_FILE.
+        """
+        self.min_characters = min_characters
+        self.min_letter_ratio = min_letter_ratio
+        self.max_symbol_ratio = max_symbol_ratio
+        self.min_track_lines = min_track_lines
+        self.min_score = min_score
+        self.queue = queue if queue is not None else ReOCRQueue()
+
+    def evaluate(self, combined_text: str) -> dict:
+        """
+        Scores a combined text and decides whether it goes to the LLM.
+
+        Args:
+            combined_text (str): Content of the combined text file.
+
+        Returns:
+            dict: The text features, a score between 0 and 1, the reasons of a rejection and
+                  whether the text passed.
+        """
+        features = text_features(combined_text)
+
+        reasons = []
+        if features["characters"] < self.min_characters:
+            reasons.append(f"only {features['characters']} characters")
+        if features["letter_ratio"] < self.min_letter_ratio:
+            reasons.append(f"letter ratio {features['letter_ratio']}")
+        if features["symbol_ratio"] > self.max_symbol_ratio:
+            reasons.append(f"symbol ratio {features['symbol_ratio']}")
+        if not features["has_lp_id"] and features["track_lines"] < self.min_track_lines:
+            reasons.append("no LP identifier and no track listing")
+
+        score = (0.3 * min(1.0, features["characters"] / (4 * self.min_characters))
+                 + 0.3 * features["letter_ratio"]
+                 + 0.2 * features["has_lp_id"]
+                 + 0.2 * min(1.0, features["track_lines"] / 4))
+        if score < self.min_score:
+            reasons.append(f"score {score:.2f}")
+
+        return {**features, "score": round(score, 3), "reasons": reasons, "passed": not reasons}
+
+    def filter_files(self, file_paths: list) -> list:
+        """
+        Keeps the combined text files that pass the gate, queueing the others for re-OCR.
+
+        Args:
+            file_paths (list): Paths of _combined.txt files.
+
+        Returns:
+            list: The paths worth sending to the LLM.
+        """
+        accepted = []
+        for file_path in file_paths:
+            with open(file_path, "r") as text_file:
+                report = self.evaluate(text_file.read())
+            lp_id = os.path.basename(file_path).replace("_combined.txt", "")
+
+            if report["passed"]:
+                accepted.append(file_path)
+                self.queue.remove(lp_id)
+            else:
+                logging.warning(
+                    f"OCR text of {lp_id} failed the quality gate ({', '.join(report['reasons'])}), "
+                    "queued for re-OCR instead of classification.")
+                self.queue.add(lp_id, report)
+
+        logging.info(
+            f"Quality gate: {len(accepted)} texts sent to classification, "
+            f"{len(file_paths) - len(accepted)} queued for re-OCR.")
+        return accepted
@@ -0,0 +1,165 @@
+import time
+import asyncio
+import logging
+import threading
+
+# Set up logging
+logging.basicConfig(level=logging.INFO,
+                    format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+class TokenBucket:
+    def __init__(self, per_minute: float, capacity: float = 1):
+        """
+        Initializes the TokenBucket class.
+
+        Holds up to capacity units, refilled continuously. The refill rate leaves room for the
+        burst: a full bucket plus one minute of refill never exceeds per_minute units, so no 60
+        second window admits more than the quota, even right after an idle period.
+        Not thread safe on its own, RateLimiter guards its buckets with one lock.
+
+        Args:
+            per_minute (float): Quota of any 60 second window, e.g. the requests-per-minute quota.
+            capacity (float): Largest burst, one unit by default: the units are spread evenly over the minute.
+        """
+        self.capacity = min(capacity, per_minute)
+        # Units are admitted whole, so a window holds at most capacity - 1 + refill of one minute
+        self.rate = (per_minute - self.capacity + 1) / 60.0
+        self.level = self.capacity
+        self._updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """
+        Returns the seconds until amount units are available, 0 if they are now.
+
+        An amount above the capacity waits for a full bucket, so one oversized request
+        can still go through instead of blocking forever.
+        """
+        self._refill(now)
+        missing = min(amount, self.capacity) - self.level
+        return max(0.0, missing / self.rate)
+
+    def take(self, amount: float):
+        """
+        Removes units, the level may go below zero to charge usage known after the fact.
+        """
+        self.level -= amount
+
+    def drain(self):
+        self.level = min(self.level, 0.0)
+
+
+class RateLimiter:
+    def __init__(self, requests_per_minute: int = 10, tokens_per_minute: int = None, burst_seconds: float = 5.0):
+        """
+        Initializes the RateLimiter class.
+
+        Shared by all the workers sending LLM requests, it enforces the requests-per-minute and
+        tokens-per-minute quotas with two token buckets. A request is admitted as soon as both
+        buckets hold enough capacity: a waiting request sleeps until then instead of a fixed
+        interval after each request. The requests are spread evenly over the minute, and the
+        tokens may burst by burst_seconds of quota, so no 60 second window exceeds either quota.
+
+        Args:
+            requests_per_minute (int): Requests-per-minute quota of the model, None for a local model
+                                       without quota.
+            tokens_per_minute (int): Tokens-per-minute quota of the model, None to only limit requests.
+            burst_seconds (float): Seconds of token quota that requests may use at once, a request above
+                                   it waits for a full bucket.
+        """
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.tokens = TokenBucket(
+            tokens_per_minute, capacity=max(1, tokens_per_minute * burst_seconds / 60)) if tokens_per_minute else None
+        self._lock = threading.Lock()
+
+        # Metrics
+        self.admitted = 0
+        self.admitted_tokens = 0
+        self.wait_seconds = 0.0
+        self.throttles = 0
+
+    def _wait_time(self, tokens: int, now: float) -> float:
+        wait = self.requests.wait_time(1, now) if self.requests else 0.0
+        if self.tokens:
+            wait = max(wait, self.tokens.wait_time(tokens, now))
+        return wait
+
+    def _admit(self, tokens: int):
+        if self.requests:
+            self.requests.take(1)
+        if self.tokens:
+            self.tokens.take(tokens)
+        self.admitted += 1
+        self.admitted_tokens += tokens
+
+    def try_acquire(self, tokens: int = 0) -> float:
+        """
+        Admits a request if the quota allows it now, without blocking.
+
+        Args:
+            tokens (int): Input tokens of the request.
+
+        Returns:
+            float: 0 if the request was admitted, otherwise the seconds before it could be,
+                   during which the caller can do other work.
+        """
+        with self._lock:
+            wait = self._wait_time(tokens, time.monotonic())
+            if wait == 0:
+                self._admit(tokens)
+            return wait
+
+    async def acquire_async(self, tokens: int = 0) -> float:
+        """
+        Waits until a request of that many input tokens may be sent, on the event loop
+        instead of blocking a thread.
+
+        Args:
+            tokens (int): Input tokens of the request.
+
+        Returns:
+            float: The seconds spent waiting.
+        """
+        start_time = time.monotonic()
+        while True:
+            wait = self.try_acquire(tokens)
+            if wait == 0:
+                break
+            await asyncio.sleep(wait)
+        waited = time.monotonic() - start_time
+        with self._lock:
+            self.wait_seconds += waited
+        return waited
+
+    def charge(self, tokens: int):
+        """
+        Charges tokens only known after the response, e.g. the output tokens of the usage metadata.
+        """
+        if self.tokens and tokens:
+            with self._lock:
+                self.tokens.take(tokens)
+
+    def on_throttle(self):
+        """
+        Empties the buckets when the API rejects a request anyway, e.g. because another
+        process shares the quota, so the next requests wait for a refill.
+        """
+        with self._lock:
+            if self.requests:
+                self.requests.drain()
+            if self.tokens:
+                self.tokens.drain()
+            self.throttles += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "requests": self.admitted,
+                "input_tokens": self.admitted_tokens,
+                "wait_seconds": round(self.wait_seconds, 3),
+                "throttles": self.throttles,
+            }
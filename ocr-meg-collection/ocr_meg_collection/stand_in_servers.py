@@ -0,0 +1,304 @@
+import argparse
+import base64
+import hashlib
+import json
+import logging
+import re
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Local stand-ins for the remote APIs used by the pipeline, so that the OCR and
+# classification stages can be exercised end to end without credentials, quota or GPU.
+
+# Set up logging
+logging.basicConfig(level=logging.INFO,
+                    format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+class VisionStandInHandler(BaseHTTPRequestHandler):
+    """
+    Answers the REST `images:annotate` endpoint of the Cloud Vision API with a
+    deterministic text annotation derived from the uploaded image bytes.
+    """
+
+    def do_POST(self):
+        if self.path.split("?")[0] != "/v1/images:annotate":
+            self._send_json(404, {"error": {"code": 404, "message": "Not found"}})
+            return
+
+        content_length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(content_length) or b"{}")
+        requests = body.get("requests", [])
+
+        if not self.server.record_request(len(requests)):
+            self._send_json(429, {"error": {
+                "code": 429, "status": "RESOURCE_EXHAUSTED",
+                "message": "Quota exceeded for quota metric 'Requests' of service 'vision.googleapis.com'."}})
+            return
+
+        if self.server.latency:
+            time.sleep(self.server.latency)
+
+        responses = [self._annotate(request) for request in requests]
+        self._send_json(200, {"responses": responses})
+
+    def _annotate(self, request: dict) -> dict:
+        """
+        Builds the annotation returned for a single image of a batch request.
+        """
+        content = base64.b64decode(request.get("image", {}).get("content", ""))
+        if not content:
+            return {"error": {"code": 3, "message": "Image content is empty."}}
+
+        digest = hashlib.sha256(content).hexdigest()[:12]
+        text = f"STAND-IN OCR\nsha256 {digest}\n{len(content)} bytes"
+        return {
+            "textAnnotations": [{"locale": "es", "description": text}],
+            "fullTextAnnotation": {"text": text},
+        }
+
+    def _send_json(self, status: int, payload: dict):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        logging.debug(f"Vision stand-in: {format % args}")
+
+
+class StandInServer(ThreadingHTTPServer):
+    """
+    Serves a stand-in API from a background thread, see VisionStandInServer and OllamaStandInServer.
+    """
+    name = "Stand-in"
+
+    def __init__(self, host: str, port: int, handler_class):
+        super().__init__((host, port), handler_class)
+        self._thread = None
+
+    @property
+    def endpoint(self) -> str:
+        """
+        The URL to hand to the API client to target this server.
+        """
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def summary(self) -> str:
+        """
+        Describes the requests answered, logged when the server stops.
+        """
+        return ""
+
+    def start(self):
+        """
+        Serves requests from a background thread.
+        """
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        logging.info(f"{self.name} stand-in listening on {self.endpoint}")
+        return self
+
+    def stop(self):
+        """
+        Shuts the server down and logs how many requests it answered.
+        """
+        if self._thread:
+            self.shutdown()
+            self._thread.join()
+            self._thread = None
+        self.server_close()
+        logging.info(f"{self.name} stand-in {self.summary()}")
+
+
+class VisionStandInServer(StandInServer):
+    name = "Vision"
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.0,
+                 quota_per_second: int = None):
+        """
+        Initializes the VisionStandInServer class.
+
+        Args:
+            host (str): Interface to bind the server to.
+            port (int): Port to listen on, 0 picks a free port.
+            latency (float): Seconds to wait before answering each request.
+            quota_per_second (int): Requests accepted per rolling second, further requests are
+                                    rejected with RESOURCE_EXHAUSTED (HTTP 429). None disables it.
+        """
+        super().__init__(host, port, VisionStandInHandler)
+        self.latency = latency
+        self.quota_per_second = quota_per_second
+        self.request_count = 0
+        self.image_count = 0
+        self.throttled_count = 0
+        self._recent_requests = deque()
+        self._lock = threading.Lock()
+
+    def record_request(self, image_count: int) -> bool:
+        """
+        Counts a request against the quota, returns False if it must be throttled.
+        """
+        with self._lock:
+            now = time.monotonic()
+            while self._recent_requests and now - self._recent_requests[0] > 1.0:
+                self._recent_requests.popleft()
+            if self.quota_per_second and len(self._recent_requests) >= self.quota_per_second:
+                self.throttled_count += 1
+                return False
+
+            self._recent_requests.append(now)
+            self.request_count += 1
+            self.image_count += image_count
+            return True
+
+    def summary(self) -> str:
+        return (f"served {self.request_count} requests for {self.image_count} images, "
+                f"throttled {self.throttled_count}.")
+
+
+class OllamaStandInHandler(BaseHTTPRequestHandler):
+    """
+    Answers the `/api/chat` endpoint of an Ollama server with an empty entity structure
+    holding the LP_ID read in the OCR text (one object per LP for a packed request),
+    streamed as NDJSON at the configured generation speed.
+    """
+    LP_ID_PATTERN = re.compile(r"\bLP\s?-?\d{4}\b", re.IGNORECASE)
+    PACKED_LP_PATTERN = re.compile(r"=== LP_ID: (\S+) ===")
+
+    def do_POST(self):
+        if self.path != "/api/chat":
+            self._send_json(404, {"error": "not found"})
+            return
+
+        content_length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(content_length) or b"{}")
+        model = body.get("model", "")
+        prompt = "\n".join(message.get("content", "") for message in body.get("messages", []))
+
+        # Requests beyond the parallel slots wait, like OLLAMA_NUM_PARALLEL
+        with self.server.slots:
+            if self.server.latency:
+                time.sleep(self.server.latency)
+            answer = self._answer(prompt)
+            pieces = [answer[i:i + self.server.chars_per_chunk]
+                      for i in range(0, len(answer), self.server.chars_per_chunk)]
+            self.server.record_request(len(pieces))
+
+            done = {"model": model, "created_at": self._now(), "message": {"role": "assistant", "content": ""},
+                    "done": True, "done_reason": "stop", "prompt_eval_count": len(prompt) // 3,
+                    "eval_count": len(pieces)}
+            if not body.get("stream", True):
+                done["message"]["content"] = answer
+                self._send_json(200, done)
+                return
+
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.end_headers()
+            for piece in pieces:
+                if self.server.tokens_per_second:
+                    time.sleep(1.0 / self.server.tokens_per_second)
+                self._write_line({"model": model, "created_at": self._now(),
+                                  "message": {"role": "assistant", "content": piece}, "done": False})
+            self._write_line(done)
+
+    def _answer(self, prompt: str) -> str:
+        """
+        Builds the JSON answer of a classification prompt.
+        """
+        packed_ids = self.PACKED_LP_PATTERN.findall(prompt)
+        if packed_ids:
+            return json.dumps([{"LP_ID": lp_id, "General Information": {"LP_ID": lp_id}, "Track Info": []}
+                               for lp_id in packed_ids])
+        match = self.LP_ID_PATTERN.search(prompt.split("Text to Analyze:")[-1])
+        lp_id = re.sub(r"[\s-]", "", match.group()).upper() if match else ""
+        return json.dumps({"General Information": {"LP_ID": lp_id}, "Track Info": []})
+
+    @staticmethod
+    def _now() -> str:
+        return time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+
+    def _write_line(self, payload: dict):
+        self.wfile.write(json.dumps(payload).encode("utf-8") + b"\n")
+        self.wfile.flush()
+
+    def _send_json(self, status: int, payload: dict):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        logging.debug(f"Ollama stand-in: {format % args}")
+
+
+class OllamaStandInServer(StandInServer):
+    name = "Ollama"
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.0,
+                 tokens_per_second: float = None, num_parallel: int = 4, chars_per_chunk: int = 12):
+        """
+        Initializes the OllamaStandInServer class.
+
+        Args:
+            host (str): Interface to bind the server to.
+            port (int): Port to listen on, 0 picks a free port.
+            latency (float): Seconds before the first token of each answer (prompt evaluation).
+            tokens_per_second (float): Generation speed of each answer, None to stream it at once.
+            num_parallel (int): Requests generated at the same time, the others queue.
+            chars_per_chunk (int): Characters of the answer sent per streamed token.
+        """
+        super().__init__(host, port, OllamaStandInHandler)
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.chars_per_chunk = chars_per_chunk
+        self.slots = threading.BoundedSemaphore(num_parallel)
+        self.request_count = 0
+        self.token_count = 0
+        self._lock = threading.Lock()
+
+    def record_request(self, token_count: int):
+        with self._lock:
+            self.request_count += 1
+            self.token_count += token_count
+
+    def summary(self) -> str:
+        return f"served {self.request_count} chat requests, {self.token_count} tokens generated."
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Run a local stand-in for the Cloud Vision API or an Ollama server.")
+    parser.add_argument("--api", choices=["vision", "ollama"], default="vision")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=None,
+                        help="Defaults to 8765 for Vision and 11435 for Ollama.")
+    parser.add_argument("--latency", type=float, default=0.0,
+                        help="Seconds to wait before answering each request.")
+    parser.add_argument("--quota-per-second", type=int, default=None,
+                        help="Vision: requests accepted per second before answering RESOURCE_EXHAUSTED.")
+    parser.add_argument("--tokens-per-second", type=float, default=None,
+                        help="Ollama: generation speed of each answer.")
+    parser.add_argument("--num-parallel", type=int, default=4,
+                        help="Ollama: requests generated at the same time.")
+    args = parser.parse_args()
+
+    if args.api == "ollama":
+        server = OllamaStandInServer(
+            args.host, args.port or 11435, args.latency, args.tokens_per_second, args.num_parallel)
+    else:
+        server = VisionStandInServer(
+            args.host, args.port or 8765, args.latency, args.quota_per_second)
+    print(f"{server.name} stand-in listening on {server.endpoint}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
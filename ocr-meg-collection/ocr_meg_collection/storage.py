@@ -0,0 +1,245 @@
+import os
+import glob
+import fnmatch
+import logging
+import tarfile
+import zipfile
+import threading
+
+# Set up logging
+logging.basicConfig(level=logging.INFO,
+                    format='%(asctime)s - %(levelname)s - %(message)s')
+
+ARCHIVE_SUFFIXES = (".zip", ".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tar.xz")
+
+
+class Storage:
+    """
+    Access to the LP folders (covers and audio files) for the OCR and post-processing stages.
+
+    Files are addressed by the paths returned by path, glob and cover_paths. Covers are
+    read into memory with read_bytes, audio files are opened as seekable binary streams
+    with open, which mutagen accepts in place of a file name.
+    """
+
+    def list_lps(self) -> list:
+        """
+        Returns the names of the LP folders.
+        """
+        raise NotImplementedError
+
+    def path(self, lp_id: str, file_name: str) -> str:
+        """
+        Returns the path of a file of an LP folder, whether it exists or not.
+        """
+        raise NotImplementedError
+
+    def glob(self, lp_id: str, pattern: str) -> list:
+        """
+        Returns the paths of the files of an LP folder matching a shell pattern, e.g. "*_cover01.jpg".
+        """
+        raise NotImplementedError
+
+    def exists(self, path: str) -> bool:
+        raise NotImplementedError
+
+    def stat(self, path: str) -> tuple:
+        """
+        Returns the size in bytes and the modification time of a file.
+        """
+        raise NotImplementedError
+
+    def open(self, path: str):
+        """
+        Opens a file as a seekable binary stream.
+        """
+        raise NotImplementedError
+
+    def read_bytes(self, path: str) -> bytes:
+        """
+        Reads a whole file into memory.
+        """
+        with self.open(path) as file:
+            return file.read()
+
+    def cover_paths(self, lp_id: str) -> list:
+        """
+        Returns the paths of the front and back covers of an LP, None for a missing cover.
+        """
+        front_cover_paths = self.glob(lp_id, "*_cover01.jpg")
+        back_cover_paths = self.glob(lp_id, "*_cover02.jpg")
+        return [front_cover_paths[0] if front_cover_paths else None,
+                back_cover_paths[0] if back_cover_paths else None]
+
+    def close(self):
+        """
+        Releases the open files.
+        """
+
+
+class DirectoryStorage(Storage):
+    def __init__(self, base_dir: str):
+        """
+        Initializes the DirectoryStorage class.
+
+        LP folders extracted on disk, e.g. BASE_DIR/LP2836/LP2836_cover01.jpg.
+
+        Args:
+            base_dir (str): Directory containing the LP folders.
+        """
+        self.base_dir = base_dir
+
+    def list_lps(self) -> list:
+        return [name for name in os.listdir(self.base_dir)
+                if os.path.isdir(os.path.join(self.base_dir, name)) and name.startswith('LP')]
+
+    def path(self, lp_id: str, file_name: str) -> str:
+        return os.path.join(self.base_dir, lp_id, file_name)
+
+    def glob(self, lp_id: str, pattern: str) -> list:
+        return glob.glob(f"{self.base_dir}/{lp_id}/{pattern}")
+
+    def exists(self, path: str) -> bool:
+        return bool(path) and os.path.exists(path)
+
+    def stat(self, path: str) -> tuple:
+        stat = os.stat(path)
+        return stat.st_size, stat.st_mtime
+
+    def open(self, path: str):
+        return open(path, "rb")
+
+
+class ArchiveStorage(Storage):
+    def __init__(self, archives: list):
+        """
+        Initializes the ArchiveStorage class.
+
+        Reads the LP folders straight out of the per-batch zip/tar archives, without
+        extracting them. Every archive is scanned once to index its members by LP, then
+        members are read from per-thread archive handles, so worker threads never share
+        a file position.
+
+        Paths have the form "LP2836/LP2836_cover01.jpg", whatever the folder layout inside
+        the archive. Members outside an LP folder are attributed to the LP of their file name prefix.
+
+        Args:
+            archives (list): Paths of the archives, or of directories containing archives.
+        """
+        self.archives = []
+        for location in archives:
+            if os.path.isdir(location):
+                self.archives.extend(sorted(
+                    os.path.join(location, name) for name in os.listdir(location)
+                    if name.lower().endswith(ARCHIVE_SUFFIXES)))
+            else:
+                self.archives.append(location)
+
+        self._members = {}  # path -> (archive, ZipInfo or TarInfo)
+        self._lp_files = {}  # LP -> file names
+        self._local = threading.local()
+        self._handles = []
+        self._handles_lock = threading.Lock()
+
+        for archive in self.archives:
+            self._index_archive(archive)
+        logging.info(
+            f"Indexed {len(self._members)} files of {len(self._lp_files)} LPs in {len(self.archives)} archives.")
+
+    @staticmethod
+    def is_archive(path: str) -> bool:
+        return os.path.isfile(path) and path.lower().endswith(ARCHIVE_SUFFIXES)
+
+    def _index_archive(self, archive: str):
+        """
+        Records where every file of an archive lives, keyed by its LP path.
+        """
+        if zipfile.is_zipfile(archive):
+            with zipfile.ZipFile(archive) as zip_file:
+                members = [(info.filename, info) for info in zip_file.infolist() if not info.is_dir()]
+        else:
+            with tarfile.open(archive, "r:*") as tar_file:
+                members = [(info.name, info) for info in tar_file.getmembers() if info.isfile()]
+
+        for member_name, info in members:
+            parts = member_name.replace("\\", "/").split("/")
+            file_name = parts[-1]
+            lp_id = parts[-2] if len(parts) > 1 and parts[-2].startswith("LP") else file_name.split("_")[0]
+            self._members[f"{lp_id}/{file_name}"] = (archive, info)
+            self._lp_files.setdefault(lp_id, []).append(file_name)
+
+    def _handle(self, archive: str):
+        """
+        Returns the handle of an archive owned by the current thread.
+        """
+        handles = getattr(self._local, "handles", None)
+        if handles is None:
+            handles = self._local.handles = {}
+        handle = handles.get(archive)
+        if handle is None:
+            handle = zipfile.ZipFile(archive) if zipfile.is_zipfile(archive) \
+                else tarfile.open(archive, "r:*")
+            handles[archive] = handle
+            with self._handles_lock:
+                self._handles.append(handle)
+        return handle
+
+    def list_lps(self) -> list:
+        return [lp_id for lp_id in self._lp_files if lp_id.startswith("LP")]
+
+    def path(self, lp_id: str, file_name: str) -> str:
+        return f"{lp_id}/{file_name}"
+
+    def glob(self, lp_id: str, pattern: str) -> list:
+        return [self.path(lp_id, file_name)
+                for file_name in sorted(fnmatch.filter(self._lp_files.get(lp_id, []), pattern))]
+
+    def exists(self, path: str) -> bool:
+        return path in self._members
+
+    def stat(self, path: str) -> tuple:
+        archive, info = self._member(path)
+        if isinstance(info, zipfile.ZipInfo):
+            return info.file_size, os.path.getmtime(archive)
+        return info.size, info.mtime
+
+    def _member(self, path: str) -> tuple:
+        try:
+            return self._members[path]
+        except KeyError:
+            raise FileNotFoundError(path) from None
+
+    def open(self, path: str):
+        archive, info = self._member(path)
+        handle = self._handle(archive)
+        if isinstance(info, zipfile.ZipInfo):
+            return handle.open(info)
+        # The indexed TarInfo holds the member offset, no rescan of the archive is needed
+        return handle.extractfile(info)
+
+    def close(self):
+        with self._handles_lock:
+            for handle in self._handles:
+                handle.close()
+            self._handles = []
+        self._local = threading.local()
+
+
+def open_storage(location: str) -> Storage:
+    """
+    Opens the LP folders at a location: an archive, a directory of archives, or a directory of LP folders.
+
+    Args:
+        location (str): BASE_DIR, or where the batch archives are stored.
+
+    Returns:
+        Storage: ArchiveStorage for archives, DirectoryStorage otherwise.
+    """
+    if ArchiveStorage.is_archive(location):
+        return ArchiveStorage([location])
+
+    directory = DirectoryStorage(location)
+    if not directory.list_lps() and any(
+            name.lower().endswith(ARCHIVE_SUFFIXES) for name in os.listdir(location)):
+        return ArchiveStorage([location])
+    return directory
@@ -0,0 +1,299 @@
+import json
+import logging
+
+# Set up logging
+logging.basicConfig(level=logging.INFO,
+                    format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Keys of the entity structure requested by USER_PROMPT
+GENERAL_INFORMATION = "General Information"
+TRACK_INFO = "Track Info"
+
+# Finish reasons of a response cut at max_output_tokens (Vertex AI, Ollama)
+TRUNCATED_FINISH_REASONS = ("MAX_TOKENS", "LENGTH")
+
+# Reasons of a StreamAbortedError
+OFF_SCHEMA = "off_schema"
+REPETITION = "repetition"
+TRUNCATED = "truncated"
+
+
+class StreamAbortedError(Exception):
+    """
+    Raised by StreamingJSONParser when a response cannot end as a valid entity structure:
+    off-schema output, a generation looping on the same track, or a truncated answer.
+    The request should be sent again instead of waiting for the rest of the stream.
+    """
+
+    def __init__(self, reason: str, message: str):
+        super().__init__(message)
+        self.reason = reason
+
+
+class StreamingJSONParser:
+    def __init__(self, top_level_keys=(GENERAL_INFORMATION, TRACK_INFO), max_prefix_chars=32,
+                 max_tracks=60, max_repeats=3):
+        """
+        Initializes the StreamingJSONParser class.
+
+        Reads the response of a single-LP request chunk by chunk, as it is streamed. The
+        "General Information" object and each "Track Info" entry are returned by feed as soon
+        as their closing brace arrives, and the stream is checked as it goes, so a bad
+        generation is stopped at its first off-schema character instead of at max_output_tokens.
+
+        Args:
+            top_level_keys (tuple): Keys allowed in the root object, any other key is off-schema.
+            max_prefix_chars (int): Characters accepted before the root object, e.g. a ```json fence.
+            max_tracks (int): Largest number of tracks of an LP, more means the generation is looping.
+            max_repeats (int): Times the same track may be repeated before the generation is considered looping.
+        """
+        self.top_level_keys = top_level_keys
+        self.max_prefix_chars = max_prefix_chars
+        self.max_tracks = max_tracks
+        self.max_repeats = max_repeats
+
+        self.text = ""
+        self.root_start = None
+        self.root_end = None
+        self.general_information = None
+        self.tracks = []
+        self._track_counts = {}
+
+        self._position = 0
+        self._in_string = False
+        self._escape = False
+        self._string_start = None
+        self._last_string = None
+        # (bracket, start offset, key of the value) of the open objects and arrays
+        self._stack = []
+        self._key = None
+
+    @property
+    def done(self) -> bool:
+        """
+        Whether the root object is complete, the rest of the stream can be dropped.
+        """
+        return self.root_end is not None
+
+    @property
+    def json_text(self) -> str:
+        """
+        The root object once complete, without the text around it.
+        """
+        return self.text[self.root_start:self.root_end] if self.done else ""
+
+    def feed(self, text: str) -> list:
+        """
+        Reads the next chunk of the response.
+
+        Args:
+            text (str): Text of the chunk.
+
+        Returns:
+            list: (key, value) of the items completed by the chunk, ("General Information", dict)
+                  and ("Track Info", dict) for each track.
+
+        Raises:
+            StreamAbortedError: The response went off-schema or is repeating itself.
+        """
+        if self.done:
+            return []
+        self.text += text
+        events = []
+        while self._position < len(self.text) and not self.done:
+            self._read_char(self.text[self._position], self._position, events)
+            self._position += 1
+        return events
+
+    def finish(self, finish_reason: str = None) -> dict:
+        """
+        Ends the response.
+
+        Args:
+            finish_reason (str): Finish reason of the last chunk, e.g. "STOP" or "MAX_TOKENS".
+
+        Returns:
+            dict: The parsed root object, empty if the response holds no text (nothing found).
+
+        Raises:
+            StreamAbortedError: The root object is incomplete.
+        """
+        if self.done:
+            return json.loads(self.json_text)
+        if not self.text.strip():
+            return {}
+        if finish_reason in TRUNCATED_FINISH_REASONS:
+            raise StreamAbortedError(
+                TRUNCATED, f"Response cut at the output token limit after {len(self.tracks)} tracks.")
+        raise StreamAbortedError(OFF_SCHEMA, "Response ended before the JSON object was complete.")
+
+    def _read_char(self, char: str, position: int, events: list):
+        if self._in_string:
+            if self._escape:
+                self._escape = False
+            elif char == "\\":
+                self._escape = True
+            elif char == '"':
+                self._in_string = False
+                self._last_string = self.text[self._string_start:position + 1]
+            return
+
+        if self.root_start is None:
+            if char == "{":
+                self.root_start = position
+                self._stack.append(("{", position, None))
+            elif position + 1 > self.max_prefix_chars:
+                raise StreamAbortedError(
+                    OFF_SCHEMA, f"No JSON object in the first {self.max_prefix_chars} characters.")
+            return
+
+        if char.isspace():
+            return
+        if self._in_track_array() and char not in "{],":
+            raise StreamAbortedError(OFF_SCHEMA, f"Unexpected '{char}' in the '{TRACK_INFO}' array.")
+
+        if char == '"':
+            self._in_string = True
+            self._string_start = position
+        elif char == ":":
+            self._key = json.loads(self._last_string) if self._last_string else None
+            if len(self._stack) == 1 and self._key not in self.top_level_keys:
+                raise StreamAbortedError(OFF_SCHEMA, f"Unexpected key '{self._key}' in the response.")
+        elif char in "{[":
+            self._stack.append((char, position, self._key if self._stack[-1][0] == "{" else None))
+            self._key = None
+        elif char in "}]":
+            bracket, start, key = self._stack.pop()
+            if (bracket == "{") != (char == "}"):
+                raise StreamAbortedError(OFF_SCHEMA, f"Unbalanced '{char}' in the response.")
+            if not self._stack:
+                self.root_end = position + 1
+            elif char == "}":
+                self._close_object(start, position, key, events)
+
+    def _in_track_array(self) -> bool:
+        return len(self._stack) == 2 and self._stack[1][0] == "[" and self._stack[1][2] == TRACK_INFO
+
+    def _close_object(self, start: int, position: int, key: str, events: list):
+        if len(self._stack) == 1 and key == GENERAL_INFORMATION:
+            self.general_information = self._load(start, position)
+            events.append((GENERAL_INFORMATION, self.general_information))
+        elif self._in_track_array():
+            track = self._load(start, position)
+            self._check_track(track)
+            self.tracks.append(track)
+            events.append((TRACK_INFO, track))
+
+    def _load(self, start: int, position: int) -> dict:
+        try:
+            return json.loads(self.text[start:position + 1])
+        except json.JSONDecodeError as e:
+            raise StreamAbortedError(OFF_SCHEMA, f"Invalid JSON in the response: {e}")
+
+    def _check_track(self, track: dict):
+        if len(self.tracks) >= self.max_tracks:
+            raise StreamAbortedError(REPETITION, f"More than {self.max_tracks} tracks in the response.")
+        signature = json.dumps(track, sort_keys=True)
+        self._track_counts[signature] = self._track_counts.get(signature, 0) + 1
+        if self._track_counts[signature] > self.max_repeats:
+            raise StreamAbortedError(
+                REPETITION, f"Track repeated {self._track_counts[signature]} times: {signature[:80]}")
+
+
+def repair_json(text: str) -> str:
+    """
+    Repairs the usual defects of a malformed JSON answer, without another request.
+
+    The text around the first object or array is dropped (markdown fence, chatter), trailing
+    and doubled commas are removed, raw line breaks inside strings are escaped, and closing
+    brackets that do not match are dropped or complete the brackets left open. A truncated
+    answer is cut back to its last complete value and its open objects and arrays are closed,
+    which keeps the General Information and the tracks received before the cut.
+
+    Args:
+        text (str): The response text.
+
+    Returns:
+        str: The repaired JSON text, empty if the text holds no object or array. It may still
+             fail to parse when the defects are of another kind.
+    """
+    starts = [position for position in (text.find("{"), text.find("[")) if position != -1]
+    if not starts:
+        return ""
+
+    closers = {"{": "}", "[": "]"}
+    output = []
+    # [bracket, expecting a key] of the open objects and arrays
+    stack = []
+    # Length of the output and brackets open after the last complete value
+    safe = (0, ())
+    in_string = escape = is_key = in_literal = False
+
+    def strip_trailing_comma():
+        while output and (output[-1].isspace() or output[-1] == ","):
+            output.pop()
+
+    for char in text[min(starts):]:
+        if in_string:
+            if escape:
+                escape = False
+            elif char == "\\":
+                escape = True
+            elif char == '"':
+                in_string = False
+                if not is_key:
+                    safe = (len(output) + 1, tuple(bracket for bracket, _ in stack))
+            elif char == "\n":
+                char = "\\n"
+            output.append(char)
+            continue
+
+        if in_literal and (char.isspace() or char in ",}]"):
+            in_literal = False
+            safe = (len(output), tuple(bracket for bracket, _ in stack))
+
+        if char.isspace():
+            output.append(char)
+        elif char == '"':
+            in_string = True
+            is_key = bool(stack) and stack[-1][0] == "{" and stack[-1][1]
+            output.append(char)
+        elif char == ":":
+            if stack and stack[-1][0] == "{":
+                stack[-1][1] = False
+            output.append(char)
+        elif char == ",":
+            last = next((c for c in reversed(output) if not c.isspace()), "")
+            if last in ",{[":
+                continue
+            if stack and stack[-1][0] == "{":
+                stack[-1][1] = True
+            output.append(char)
+        elif char in "{[":
+            stack.append([char, char == "{"])
+            output.append(char)
+            safe = (len(output), tuple(bracket for bracket, _ in stack))
+        elif char in "}]":
+            opener = "{" if char == "}" else "["
+            if opener not in (bracket for bracket, _ in stack):
+                continue
+            strip_trailing_comma()
+            while stack[-1][0] != opener:
+                output.append(closers[stack.pop()[0]])
+            stack.pop()
+            output.append(char)
+            safe = (len(output), tuple(bracket for bracket, _ in stack))
+            if not stack:
+                return "".join(output)
+        else:
+            in_literal = True
+            output.append(char)
+
+    # Truncated: keep what was complete, then close what is still open
+    length, open_brackets = safe
+    del output[length:]
+    strip_trailing_comma()
+    if output and output[-1] == ":":
+        output.append('""')
+    output.extend(closers[bracket] for bracket in reversed(open_brackets))
+    return "".join(output)
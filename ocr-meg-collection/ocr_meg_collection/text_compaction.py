@@ -0,0 +1,172 @@
+import os
+import re
+import csv
+import logging
+import argparse
+from ocr_meg_collection.quality_gate import SECTION_HEADERS
+from ocr_meg_collection.tokens import estimate_tokens
+
+# Set up logging
+logging.basicConfig(level=logging.INFO,
+                    format='%(asctime)s - %(levelname)s - %(message)s')
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+
+# Input tokens of each LP before and after compaction, written at the end of a classification run
+COMPACTION_REPORT = os.path.join(
+    script_dir, '..', 'ds_pipeline', 'compaction_report.csv')
+
+# Legal notices printed on the covers, they carry no entity beyond the year and the rights holder.
+# Only whole phrases, a track title such as "Amor prohibido" or "El alquiler" is not a notice.
+BOILERPLATE_PATTERN = re.compile(
+    r"derechos\s+(?:[\w\s]+\s)?reservados|todos\s+los\s+derechos|all\s+rights\s+(?:[\w\s]+\s)?reserved"
+    r"|(?:queda|quedan|est[aá]n?)\s+prohibid[ao]s?"
+    r"|prohibid[ao]s?\s+(?:la\s+|su\s+)*(?:reproducci[oó]n|copia|duplicaci[oó]n|ejecuci[oó]n|radiodifusi[oó]n|alquiler)"
+    r"|(?:reproducci[oó]n|copia)\s+(?:total|parcial|no\s+autorizada)"
+    r"|(?:ejecuci[oó]n\s+p[uú]blica|radiodifusi[oó]n|alquiler)\s*(?:,|\by\b|\bo\b)\s*(?:la\s+)?"
+    r"(?:ejecuci[oó]n|radiodifusi[oó]n|alquiler|reproducci[oó]n|copia)"
+    r"|unauthori[sz]ed\s+(?:copying|public|broadcasting|reproduction)|copyright\s+(?:subsists|reserved)",
+    re.IGNORECASE)
+# What is kept of a legal notice: a year, or the copyright and phonogram symbols naming the holder
+YEAR_OR_HOLDER_PATTERN = re.compile(r"\b(?:19|20)\d{2}\b|[©℗]|\(c\)|\(p\)", re.IGNORECASE)
+# A word cut by a line break: "gra-" followed by "bación"
+HYPHENATED_PATTERN = re.compile(r"(\w)[-‐‑¬]$")
+# Face markers and track numbers are meaningful on their own
+SHORT_LINE_PATTERN = re.compile(r"^(?:[AB]|\d{1,2})$", re.IGNORECASE)
+# Start of the track listing: a face marker ("LADO A", "Side B", "A", "A1") or a numbered track ("1. Zamba", "1a")
+TRACK_MARKER_PATTERN = re.compile(
+    r"^(?:(?:lado|side|face|cara)\s+[AB12]\b|[AB]\d{0,2}[.)]?$|[AB]\d{0,2}[.)\s]|\d{1,2}\s*[ab]?\s*[.)\-]|\d{1,2}[ab]?\s)",
+    re.IGNORECASE)
+BACK_COVER = SECTION_HEADERS[1]
+
+
+class TextCompactor:
+    def __init__(self, min_duplicate_chars=12, drop_boilerplate=True):
+        """
+        Initializes the TextCompactor class.
+
+        Shrinks a _combined.txt text before it is sent to the LLM, without removing what the
+        entities are read from: whitespace is normalized, words split by a hyphen at the end of
+        a line are merged, lines without any letter or digit and stray single characters are
+        dropped, lines repeated within a cover section are kept once, and legal notices are reduced
+        to their lines naming a year or the rights holder. The section headers are always kept.
+
+        The track listing of the back cover, from its first face marker or numbered track on, is
+        kept as is: a composer or a track title legitimately appears once per track or face, and
+        a title may use the words of a legal notice ("Amor prohibido").
+
+        Args:
+            min_duplicate_chars (int): Shortest line removed when repeated, shorter lines such as
+                                       durations or track numbers legitimately repeat.
+            drop_boilerplate (bool): Reduce the legal notices (rights reserved, copying prohibited, ...).
+        """
+        self.min_duplicate_chars = min_duplicate_chars
+        self.drop_boilerplate = drop_boilerplate
+
+    def compact(self, combined_text: str) -> str:
+        """
+        Compacts a combined text.
+
+        Args:
+            combined_text (str): Content of the combined text file, section headers included.
+
+        Returns:
+            str: The compacted text, one line per kept line.
+        """
+        lines = [" ".join(line.split()) for line in combined_text.splitlines()]
+        lines = self._merge_hyphenated(lines)
+
+        kept, seen, section, in_listing = [], set(), None, False
+        for line in lines:
+            if line in SECTION_HEADERS:
+                # Repeats are only collapsed within a section, the front cover and the back cover repeat each other
+                kept.append(line)
+                seen, section, in_listing = set(), line, False
+                continue
+            if self._is_noise(line):
+                continue
+
+            if section == BACK_COVER and TRACK_MARKER_PATTERN.match(line):
+                in_listing = True
+            if in_listing:
+                kept.append(line)
+                continue
+
+            if self.drop_boilerplate and BOILERPLATE_PATTERN.search(line) \
+                    and not YEAR_OR_HOLDER_PATTERN.search(line):
+                continue
+
+            signature = re.sub(r"\W+", "", line).lower()
+            if len(line) >= self.min_duplicate_chars:
+                if signature in seen:
+                    continue
+                seen.add(signature)
+            kept.append(line)
+        return "\n".join(kept)
+
+    @staticmethod
+    def _merge_hyphenated(lines: list) -> list:
+        merged = []
+        for line in lines:
+            previous = merged[-1] if merged else ""
+            if previous not in SECTION_HEADERS and HYPHENATED_PATTERN.search(previous) \
+                    and line[:1].islower():
+                merged[-1] = previous[:-1] + line
+            else:
+                merged.append(line)
+        return merged
+
+    @staticmethod
+    def _is_noise(line: str) -> bool:
+        if not any(character.isalnum() for character in line):
+            return True
+        return len(line) == 1 and not SHORT_LINE_PATTERN.match(line)
+
+
+def write_compaction_report(rows: list, report_path: str = COMPACTION_REPORT):
+    """
+    Writes the input tokens of each LP before and after compaction to a CSV file.
+
+    Args:
+        rows (list): {"lp", "tokens_before", "tokens_after", "tokens_saved", "saved_ratio"} dictionaries.
+        report_path (str): Location of the CSV file.
+    """
+    if not rows:
+        return
+    os.makedirs(os.path.dirname(os.path.abspath(report_path)), exist_ok=True)
+    with open(report_path, "w", newline="") as report_file:
+        writer = csv.DictWriter(report_file, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+    logging.info(f"Input tokens per LP before and after compaction stored in {report_path}")
+
+
+def compaction_row(lp_id: str, tokens_before: int, tokens_after: int) -> dict:
+    """
+    Builds the report row of one LP.
+    """
+    return {"lp": lp_id, "tokens_before": tokens_before, "tokens_after": tokens_after,
+            "tokens_saved": tokens_before - tokens_after,
+            "saved_ratio": round(1 - tokens_after / tokens_before, 3) if tokens_before else 0.0}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Measure the input tokens saved by compacting the combined OCR texts.")
+    parser.add_argument("--input-dir", default=os.path.join(script_dir, '..', 'ds_pipeline', '0_raw_ocr_txt'))
+    parser.add_argument("--report", default=COMPACTION_REPORT)
+    args = parser.parse_args()
+
+    compactor = TextCompactor()
+    rows = []
+    for file_name in sorted(os.listdir(args.input_dir)):
+        if not file_name.endswith("_combined.txt"):
+            continue
+        with open(os.path.join(args.input_dir, file_name), "r") as text_file:
+            text = text_file.read()
+        rows.append(compaction_row(file_name.replace("_combined.txt", ""),
+                                   estimate_tokens(text), estimate_tokens(compactor.compact(text))))
+    write_compaction_report(rows, args.report)
+    before = sum(row["tokens_before"] for row in rows)
+    after = sum(row["tokens_after"] for row in rows)
+    print(f"{len(rows)} LPs: {before} -> {after} estimated input tokens ({1 - after / (before or 1):.1%} saved)")
@@ -0,0 +1,284 @@
+import os
+import re
+import hashlib
+import logging
+import threading
+
+from ocr_meg_collection.ocr_backends import OCRBackend
+from ocr_meg_collection.concurrency import OCRThrottledError
+
+# Set up logging
+logging.basicConfig(level=logging.INFO,
+                    format='%(asctime)s - %(levelname)s - %(message)s')
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+
+# Words read by Vision in earlier runs, one per line. Only Vision results are trusted: words of the
+# local tier would let OCR noise raise the dictionary score and keep more noise away from Vision.
+VISION_VOCABULARY_FILE = os.path.join(script_dir, '..', 'ds_pipeline', 'vision_vocabulary.txt')
+
+# Words expected on most covers of the collection, extended with the words read by Vision
+SEED_VOCABULARY = frozenset("""
+a al and by con de del des du el en et face faces from la las le les los of on por side sides the
+to with y
+album chant chants canción canciones dance danse danza disque folk instrumental live mono music
+musique música notes record recorded recording records song songs stereo traditional
+tradicional traditionnel traditionnelle vol volume
+""".split())
+
+WORD_PATTERN = re.compile(r"[^\W\d_]{3,}")
+
+
+def text_words(text: str) -> set:
+    """
+    Returns the lowercase words of a text counted by the dictionary-hit ratio.
+    """
+    return {word.lower() for word in WORD_PATTERN.findall(text)}
+
+
+def load_vocabulary(vocabulary_file: str = VISION_VOCABULARY_FILE, extra_words: list = None) -> frozenset:
+    """
+    Builds the vocabulary used to score local OCR, from the seed words and the words read by Vision.
+
+    Args:
+        vocabulary_file (str): Word list, one per line, see add_to_vocabulary. A curated list works too.
+        extra_words (list): Additional words, e.g. artist or label names.
+
+    Returns:
+        frozenset: The lowercase words.
+    """
+    words = set(SEED_VOCABULARY)
+    if vocabulary_file and os.path.exists(vocabulary_file):
+        with open(vocabulary_file, "r") as word_file:
+            words.update(line.strip().lower() for line in word_file if line.strip())
+    words.update(word.lower() for word in extra_words or [])
+    return frozenset(words)
+
+
+def add_to_vocabulary(words, vocabulary_file: str = VISION_VOCABULARY_FILE) -> int:
+    """
+    Adds words read by Vision to the vocabulary file.
+
+    Args:
+        words (iterable): Lowercase words, e.g. text_words of a Vision result.
+        vocabulary_file (str): Word list to extend.
+
+    Returns:
+        int: Number of new words.
+    """
+    known = set()
+    if os.path.exists(vocabulary_file):
+        with open(vocabulary_file, "r") as word_file:
+            known = {line.strip() for line in word_file if line.strip()}
+    new_words = set(words) - known
+    if not new_words:
+        return 0
+    os.makedirs(os.path.dirname(os.path.abspath(vocabulary_file)), exist_ok=True)
+    tmp_path = f"{vocabulary_file}.tmp"
+    with open(tmp_path, "w") as word_file:
+        word_file.writelines(f"{word}\n" for word in sorted(known | new_words))
+    os.replace(tmp_path, vocabulary_file)
+    return len(new_words)
+
+
+def score_ocr_result(result, vocabulary: frozenset) -> dict:
+    """
+    Scores how trustworthy a local OCR result is.
+
+    Args:
+        result (OCRResult): The local OCR result.
+        vocabulary (frozenset): Lowercase words considered correctly read.
+
+    Returns:
+        dict: The mean word confidence (None without word annotations), the share of words
+              found in the vocabulary, the text density (share of letters and digits among the
+              non-blank characters, low for OCR noise) and their weighted score between 0 and 1.
+    """
+    confidence = None
+    if result.words and result.words["confidence"]:
+        confidence = sum(result.words["confidence"]) / len(result.words["confidence"])
+
+    words = WORD_PATTERN.findall(result.text)
+    dictionary_ratio = sum(word.lower() in vocabulary for word in words) / len(words) if words else 0.0
+
+    characters = [character for character in result.text if not character.isspace()]
+    density = sum(character.isalnum() for character in characters) / len(characters) if characters else 0.0
+
+    if confidence is None:
+        score = 0.6 * dictionary_ratio + 0.4 * density
+    else:
+        score = 0.5 * confidence + 0.3 * dictionary_ratio + 0.2 * density
+    return {"confidence": confidence, "dictionary_ratio": dictionary_ratio,
+            "density": density, "score": score}
+
+
+class TieredOCRBackend(OCRBackend):
+    name = "tiered"
+
+    def __init__(self, local: OCRBackend, remote: OCRBackend, min_score=0.75, vocabulary=None,
+                 vocabulary_file=None):
+        """
+        Initializes the TieredOCRBackend class.
+
+        Reads every cover with a local CPU engine first, and only sends the covers whose
+        local result scores below min_score (see score_ocr_result) to the remote engine.
+        Clean, high contrast scans never reach the API.
+
+        Args:
+            local (OCRBackend): First tier, e.g. a LocalOCRBackend running tesseract.
+            remote (OCRBackend): Second tier, e.g. a VisionBackend.
+            min_score (float): Score from which the local result is kept.
+            vocabulary (frozenset): Words used for the dictionary-hit ratio, defaults to SEED_VOCABULARY.
+            vocabulary_file (str): Optional word list extended on close with the words of the covers
+                                   read by the remote tier, e.g. VISION_VOCABULARY_FILE.
+        """
+        self.local = local
+        self.remote = remote
+        self.min_score = min_score
+        self.vocabulary = vocabulary or SEED_VOCABULARY
+        self.vocabulary_file = vocabulary_file
+        self._remote_words = set()
+        self.max_batch_size = remote.max_batch_size
+        self.max_batch_bytes = remote.max_batch_bytes
+        self.provides_words = local.provides_words and remote.provides_words
+
+        self._lock = threading.Lock()
+        # Digests of the covers sent to the remote tier, so a throttled retry goes straight
+        # back to it instead of reading the cover locally again
+        self._escalated = set()
+        self.local_images = 0
+        self.remote_images = 0
+        self.local_failures = 0
+        self.score_total = 0.0
+        self.scored_images = 0
+
+    def settings(self) -> dict:
+        # The vocabulary grows with every run, it is left out so the cache stays valid
+        return {
+            "tiered": {
+                "local": self.local.settings(),
+                "remote": self.remote.settings(),
+                "min_score": self.min_score,
+            }
+        }
+
+    def _accept_local(self, result) -> bool:
+        """
+        Scores a local result and tells whether it is kept.
+        """
+        if isinstance(result, Exception):
+            with self._lock:
+                self.local_failures += 1
+            return False
+
+        score = score_ocr_result(result, self.vocabulary)["score"]
+        with self._lock:
+            self.score_total += score
+            self.scored_images += 1
+        return score >= self.min_score
+
+    def _count(self, tier: str, count: int = 1):
+        with self._lock:
+            if tier == "local":
+                self.local_images += count
+            else:
+                self.remote_images += count
+
+    def annotate(self, content: bytes):
+        key = hashlib.sha256(content).hexdigest()
+        with self._lock:
+            escalated = key in self._escalated
+
+        if not escalated:
+            try:
+                result = self.local.annotate(content)
+            except Exception as e:
+                result = e
+            if self._accept_local(result):
+                self._count("local")
+                return result
+            with self._lock:
+                self._escalated.add(key)
+
+        try:
+            result = self.remote.annotate(content)
+        except OCRThrottledError:
+            # Retried by the pipeline, straight to the remote tier
+            raise
+        except Exception:
+            self._forget(key)
+            raise
+        self._forget(key)
+        self._count("remote")
+        self._learn(result)
+        return result
+
+    def _learn(self, result):
+        """
+        Keeps the words of a remote result for the vocabulary file.
+        """
+        if self.vocabulary_file:
+            with self._lock:
+                self._remote_words.update(text_words(result.text))
+
+    def _forget(self, key: str):
+        with self._lock:
+            self._escalated.discard(key)
+
+    def annotate_batch(self, contents: list) -> list:
+        keys = [hashlib.sha256(content).hexdigest() for content in contents]
+        with self._lock:
+            fresh = [index for index, key in enumerate(keys) if key not in self._escalated]
+
+        results = [None] * len(contents)
+        for index, result in zip(fresh, self.local.annotate_batch([contents[index] for index in fresh])):
+            if self._accept_local(result):
+                results[index] = result
+        self._count("local", sum(result is not None for result in results))
+
+        escalated = [index for index, result in enumerate(results) if result is None]
+        if not escalated:
+            return results
+        with self._lock:
+            self._escalated.update(keys[index] for index in escalated)
+
+        remote_results = self.remote.annotate_batch([contents[index] for index in escalated])
+        for index, result in zip(escalated, remote_results):
+            results[index] = result
+            if not isinstance(result, OCRThrottledError):
+                self._forget(keys[index])
+            if not isinstance(result, Exception):
+                self._learn(result)
+        self._count("remote", sum(not isinstance(result, Exception) for result in remote_results))
+        return results
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "local_images": self.local_images,
+                "remote_images": self.remote_images,
+                "local_failures": self.local_failures,
+                "mean_local_score": round(self.score_total / self.scored_images, 3) if self.scored_images else 0.0,
+            }
+
+    def log_stats(self):
+        """
+        Logs how many images each tier handled, then the statistics of both tiers.
+        """
+        stats = self.stats()
+        handled = stats["local_images"] + stats["remote_images"]
+        logging.info(
+            f"Tiered OCR: {stats['local_images']} images kept from '{self.local.name}', "
+            f"{stats['remote_images']} sent to '{self.remote.name}' "
+            f"({stats['remote_images'] / handled if handled else 0.0:.1%}), "
+            f"local failures: {stats['local_failures']}, mean local score: {stats['mean_local_score']}")
+        self.local.log_stats()
+        self.remote.log_stats()
+
+    def close(self):
+        if self.vocabulary_file and self._remote_words:
+            added = add_to_vocabulary(self._remote_words, self.vocabulary_file)
+            logging.info(f"Added {added} words read by '{self.remote.name}' to {self.vocabulary_file}")
+            self._remote_words = set()
+        self.local.close()
+        self.remote.close()
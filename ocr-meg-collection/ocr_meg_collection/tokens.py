@@ -0,0 +1,9 @@
+# Token estimate of the backends without a token counting API, conservative for OCR noise and Spanish text
+CHARS_PER_TOKEN = 3
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estimates the tokens of a text from its characters, as for the packed request planning.
+    """
+    return len(text) // CHARS_PER_TOKEN + 1
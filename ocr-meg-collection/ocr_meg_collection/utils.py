@@ -42,9 +42,9 @@ def fetch_lp_covers_path(base_dir: str, lp_cote_general: str) -> list:
 # utils.py file for the ocr-meg-collection package
 
 
-def fetch_track_duration(audio_file_path: str) -> str:
+def fetch_track_duration(audio_file_path) -> str:
     """
-    Fetches the track duration from the provided file path.
+    Fetches the track duration from the provided file path, or from a seekable binary file object.
     """
     try:
         audio = File(audio_file_path)  # Using mutagen to get the audio file
@@ -0,0 +1,169 @@
+import logging
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+import google.auth
+import grpc
+from google.api_core.client_options import ClientOptions
+from google.auth.credentials import AnonymousCredentials
+from google.cloud import vision
+
+# Set up logging
+logging.basicConfig(level=logging.INFO,
+                    format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+class VisionClientPool:
+    def __init__(self, size=4, api_endpoint=None, timeout=60.0, warm_up=True):
+        """
+        Initializes the VisionClientPool class.
+
+        A fixed set of long-lived ImageAnnotatorClient instances shared by the OCR worker
+        threads. Each client is handed to one thread at a time, so channels, credentials
+        and TLS sessions are set up once per pool instead of once per image.
+
+        Args:
+            size (int): Number of clients in the pool, usually the number of worker threads.
+            api_endpoint (str): Optional Vision API endpoint, e.g. a local stand-in server.
+            timeout (float): Deadline in seconds applied to every API call.
+            warm_up (bool): Build all clients and open their channels right away.
+        """
+        self.size = max(1, size)
+        self.api_endpoint = api_endpoint
+        self.timeout = timeout
+
+        self._clients = queue.Queue()
+        self._all_clients = []
+        self._reserved = 0
+        self._lock = threading.Lock()
+        self._credentials = None
+
+        # Time spent building clients and opening channels, waiting for a free client,
+        # and inside the API calls themselves
+        self.setup_seconds = 0.0
+        self.wait_seconds = 0.0
+        self.request_seconds = 0.0
+        self.request_count = 0
+
+        if warm_up:
+            self.warm_up()
+
+    def warm_up(self):
+        """
+        Builds the missing clients of the pool and waits for their channels to be ready.
+        """
+        while self._reserve_slot():
+            self._clients.put(self._create_client())
+        logging.info(
+            f"Vision client pool warmed up with {self.size} clients in {self.setup_seconds:.2f} seconds.")
+
+    def _reserve_slot(self) -> bool:
+        """
+        Reserves room for one more client, returns False once the pool is full.
+        """
+        with self._lock:
+            if self._reserved >= self.size:
+                return False
+            self._reserved += 1
+            return True
+
+    def _create_client(self) -> vision.ImageAnnotatorClient:
+        """
+        Builds one client, pointed at the configured endpoint if one is set, and records the setup time.
+
+        A plain http:// endpoint is treated as a local stand-in server and reached
+        over the REST transport without credentials.
+        """
+        start_time = time.perf_counter()
+
+        if self.api_endpoint and self.api_endpoint.startswith("http://"):
+            client = vision.ImageAnnotatorClient(
+                credentials=AnonymousCredentials(),
+                transport="rest",
+                client_options=ClientOptions(api_endpoint=self.api_endpoint))
+        else:
+            # Load the service account credentials once and share them across clients
+            if self._credentials is None:
+                self._credentials, _ = google.auth.default()
+            client_options = ClientOptions(
+                api_endpoint=self.api_endpoint) if self.api_endpoint else None
+            client = vision.ImageAnnotatorClient(
+                credentials=self._credentials, client_options=client_options)
+
+            # gRPC channels connect lazily, open the connection now
+            grpc.channel_ready_future(
+                client.transport.grpc_channel).result(timeout=self.timeout)
+
+        with self._lock:
+            self._all_clients.append(client)
+            self.setup_seconds += time.perf_counter() - start_time
+        return client
+
+    @contextmanager
+    def client(self):
+        """
+        Lends a client of the pool to the calling thread.
+
+        Yields:
+            vision.ImageAnnotatorClient: A client used by no other thread until released.
+        """
+        start_time = time.perf_counter()
+        try:
+            client = self._clients.get_nowait()
+        except queue.Empty:
+            client = self._create_client() if self._reserve_slot() else self._clients.get()
+
+        with self._lock:
+            self.wait_seconds += time.perf_counter() - start_time
+        try:
+            yield client
+        finally:
+            self._clients.put(client)
+
+    def call(self, method: str, **kwargs):
+        """
+        Calls a method of a pooled client with the configured deadline.
+
+        Args:
+            method (str): Name of the ImageAnnotatorClient method, e.g. "text_detection".
+            **kwargs: Arguments of the method.
+
+        Returns:
+            The response of the API call.
+        """
+        with self.client() as client:
+            start_time = time.perf_counter()
+            try:
+                return getattr(client, method)(timeout=self.timeout, **kwargs)
+            finally:
+                with self._lock:
+                    self.request_seconds += time.perf_counter() - start_time
+                    self.request_count += 1
+
+    def stats(self) -> dict:
+        """
+        Returns the connection setup and request timings of the pool.
+        """
+        with self._lock:
+            return {
+                "clients": len(self._all_clients),
+                "requests": self.request_count,
+                "setup_seconds": round(self.setup_seconds, 3),
+                "wait_seconds": round(self.wait_seconds, 3),
+                "request_seconds": round(self.request_seconds, 3),
+                "mean_request_seconds": round(self.request_seconds / self.request_count, 3)
+                if self.request_count else 0.0,
+            }
+
+    def close(self):
+        """
+        Closes the transports of all clients of the pool.
+        """
+        with self._lock:
+            clients, self._all_clients = self._all_clients, []
+            self._reserved = 0
+        for client in clients:
+            client.transport.close()
+        self._clients = queue.Queue()
@@ -0,0 +1,159 @@
+import os
+import re
+import json
+import sqlite3
+
+import pytest
+
+os.environ.setdefault("GOOGLE_APPLICATION_CREDENTIALS", "credentials.json")
+
+from ocr_meg_collection.ai_classification_inf import AIClassifier, PACKED_PROMPT
+from ocr_meg_collection.text_compaction import TextCompactor
+from ocr_meg_collection.llm_backends import LLMBackend, LLMChunk
+
+
+class ScriptedBackend(LLMBackend):
+    """
+    Answers every LP of a request with its LP_ID as album title, and records the requests.
+    """
+    name = "scripted"
+
+    def __init__(self):
+        super().__init__("scripted-model", "system prompt", {"max_output_tokens": 8192})
+        self.requests = []
+
+    def answer(self, prompt: str, lp_ids: list) -> str:
+        items = [{"LP_ID": lp_id, "General Information": {"Album Title": lp_id}} for lp_id in lp_ids]
+        if prompt == PACKED_PROMPT:
+            return json.dumps(items)
+        del items[0]["LP_ID"]
+        return json.dumps(items[0])
+
+    async def stream(self, contents: list, response_schema: dict = None):
+        self.requests.append(contents)
+        prompt, text = contents
+        lp_ids = re.findall(r"=== LP_ID: (\S+) ===", text) or re.findall(r"LP\d{4}", text)[:1]
+        yield LLMChunk(self.answer(prompt, lp_ids), "STOP", {"input_tokens": 10, "output_tokens": 10})
+
+
+class WordCountingBackend(ScriptedBackend):
+    """
+    Counts one token per word, unlike the character estimate of LLMBackend.
+    """
+    async def count_tokens(self, contents: list) -> int:
+        return sum(len(part.split()) for part in contents)
+
+
+class TruncatingBackend(ScriptedBackend):
+    """
+    Cuts its packed answers in the middle of the last LP, as at max_output_tokens.
+    """
+    def answer(self, prompt: str, lp_ids: list) -> str:
+        text = super().answer(prompt, lp_ids)
+        return text[:text.rindex("Album Title")] if prompt == PACKED_PROMPT else text
+
+
+def make_classifier(tmp_path, backend, **options):
+    classifier = AIClassifier(requests_per_minute=None, tokens_per_minute=None, backend=backend,
+                              cache_file=str(tmp_path / "llm_cache.sqlite"),
+                              metrics_file=str(tmp_path / "metrics.jsonl"), **options)
+    classifier.INPUT_DIR = str(tmp_path / "in")
+    classifier.TARGET_DIR = str(tmp_path / "out")
+    os.makedirs(classifier.INPUT_DIR, exist_ok=True)
+    os.makedirs(classifier.TARGET_DIR, exist_ok=True)
+    return classifier
+
+
+def write_lps(classifier, count: int):
+    for i in range(count):
+        with open(os.path.join(classifier.INPUT_DIR, f"LP{i:04d}_combined.txt"), "w") as file:
+            file.write(f"Front Cover:\nLP{i:04d}\nBack Cover:\nLADO A\n1. Zamba {i} 2:45\n")
+
+
+def read_output(classifier, lp_id: str) -> dict:
+    with open(os.path.join(classifier.TARGET_DIR, f"{lp_id}_ai_output.json")) as file:
+        return json.load(file)
+
+
+def test_packed_without_cache_classifies_a_lone_lp(tmp_path):
+    backend = ScriptedBackend()
+    classifier = make_classifier(tmp_path, backend, packed=True, use_cache=False)
+    write_lps(classifier, 1)
+
+    classifier.batch_generate_inferences()
+
+    assert len(backend.requests) == 1
+    assert read_output(classifier, "LP0000")["General Information"]["Album Title"] == "LP0000"
+
+
+def test_packed_answers_are_reused_by_packed_runs_only(tmp_path):
+    backend = ScriptedBackend()
+    classifier = make_classifier(tmp_path, backend, packed=True)
+    write_lps(classifier, 3)
+    classifier.batch_generate_inferences()
+    assert len(backend.requests) == 1
+
+    os.remove(os.path.join(classifier.TARGET_DIR, "LP0001_ai_output.json"))
+    classifier = make_classifier(tmp_path, backend, packed=True)
+    classifier.batch_generate_inferences()
+    assert len(backend.requests) == 1
+    assert read_output(classifier, "LP0001")["General Information"]["Album Title"] == "LP0001"
+
+    # USER_PROMPT never produced the packed answer, a single-LP run asks the model
+    os.remove(os.path.join(classifier.TARGET_DIR, "LP0001_ai_output.json"))
+    classifier = make_classifier(tmp_path, backend)
+    classifier.batch_generate_inferences()
+    assert len(backend.requests) == 2
+
+
+def test_compaction_report_counts_tokens_with_the_backend(tmp_path):
+    backend = WordCountingBackend()
+    classifier = make_classifier(tmp_path, backend, compactor=TextCompactor())
+    file_path = os.path.join(classifier.INPUT_DIR, "LP0000_combined.txt")
+    with open(file_path, "w") as file:
+        file.write("Front Cover:\nLP0000\nTodos los derechos reservados\nBack Cover:\nLADO A\n1. Zamba 2:45\n")
+
+    classifier.generate_inference(file_path)
+
+    row = classifier.compaction_rows["LP0000"]
+    assert row["tokens_before"] - row["tokens_after"] == 4
+
+
+def test_truncated_packed_answer_sends_its_last_lp_again(tmp_path):
+    backend = TruncatingBackend()
+    classifier = make_classifier(tmp_path, backend, packed=True)
+    write_lps(classifier, 2)
+
+    classifier.batch_generate_inferences()
+
+    assert len(backend.requests) == 2
+    assert backend.requests[1][0] != PACKED_PROMPT
+    for lp_id in ("LP0000", "LP0001"):
+        assert read_output(classifier, lp_id)["General Information"]["Album Title"] == lp_id
+    # Items of a repaired answer are not cached
+    text = classifier._read_document(os.path.join(classifier.INPUT_DIR, "LP0000_combined.txt"))
+    assert classifier._packed_item_key(text) not in classifier.cache
+
+
+def test_close_releases_the_cache(tmp_path):
+    classifier = make_classifier(tmp_path, ScriptedBackend())
+    write_lps(classifier, 1)
+    classifier.batch_generate_inferences()
+
+    classifier.close()
+    with pytest.raises(sqlite3.ProgrammingError):
+        classifier.cache.stats()
+
+
+def test_outputs_older_than_their_text_are_classified_again(tmp_path):
+    classifier = make_classifier(tmp_path, ScriptedBackend())
+    write_lps(classifier, 2)
+    classifier.batch_generate_inferences()
+    assert classifier._files_to_process() == []
+
+    # LP0001 read again, e.g. by retry-failed
+    text_path = os.path.join(classifier.INPUT_DIR, "LP0001_combined.txt")
+    output_time = os.path.getmtime(os.path.join(classifier.TARGET_DIR, "LP0001_ai_output.json"))
+    os.utime(text_path, (output_time + 10, output_time + 10))
+
+    assert classifier._files_to_process() == [text_path]
@@ -0,0 +1,42 @@
+from ocr_meg_collection.dead_letter import DeadLetterStore
+
+FRONT = "LP0412/LP0412_cover01.jpg"
+BACK = "LP0412/LP0412_cover02.jpg"
+
+
+def test_failed_attempts_are_counted_and_persisted(tmp_path):
+    store = DeadLetterStore(str(tmp_path / "dead_letter.json"))
+    store.record("LP0412", 0, FRONT, TimeoutError("Deadline exceeded"))
+    store.record("LP0412", 0, FRONT, ConnectionError("Connection reset"))
+    store.record("LP0413", 1, "LP0413/LP0413_cover02.jpg", TimeoutError("Deadline exceeded"))
+
+    reopened = DeadLetterStore(store.file_path)
+    entry = reopened.entries()[FRONT]
+    assert (entry["lp_id"], entry["side"], entry["attempts"]) == ("LP0412", 0, 2)
+    # The last error is kept
+    assert (entry["error_class"], entry["error"]) == ("ConnectionError", "Connection reset")
+    assert reopened.error_counts() == {"ConnectionError": 1, "TimeoutError": 1}
+    assert reopened.lp_ids() == ["LP0412", "LP0413"]
+
+
+def test_images_failing_too_often_are_left_for_review(tmp_path):
+    store = DeadLetterStore(str(tmp_path / "dead_letter.json"))
+    for _ in range(3):
+        store.record("LP0412", 0, FRONT, TimeoutError("Deadline exceeded"))
+    store.record("LP0412", 1, BACK, TimeoutError("Deadline exceeded"))
+
+    assert list(store.entries(max_attempts=3)) == [BACK]
+    assert store.lp_ids(max_attempts=1) == []
+    assert len(store) == 2
+
+
+def test_resolved_images_leave_the_store(tmp_path):
+    store = DeadLetterStore(str(tmp_path / "dead_letter.json"))
+    store.record("LP0412", 0, FRONT, TimeoutError("Deadline exceeded"))
+    store.record("LP0412", 1, BACK, TimeoutError("Deadline exceeded"))
+
+    store.resolve(FRONT)
+    # Resolving an image that never failed changes nothing
+    store.resolve("LP0001/LP0001_cover01.jpg")
+
+    assert list(DeadLetterStore(store.file_path).entries()) == [BACK]
@@ -0,0 +1,89 @@
+import os
+import itertools
+
+import pytest
+
+os.environ.setdefault("GOOGLE_APPLICATION_CREDENTIALS", "credentials.json")
+
+from ocr_meg_collection import ocr_cache
+from ocr_meg_collection.ocr_cache import OCRResultCache
+from ocr_meg_collection.ocr_backends import OCRBackend, OCRResult
+from ocr_meg_collection.ocr_pipeline import OCRPipeline
+from ocr_meg_collection.dead_letter import DeadLetterStore
+
+
+class WordsBackend(OCRBackend):
+    name = "words"
+    provides_words = True
+
+    def settings(self) -> dict:
+        return {"engine": self.name}
+
+    def annotate(self, content: bytes) -> OCRResult:
+        return OCRResult(content.decode(), {"text": [content.decode()]})
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    # One second per call, so every access has its own time
+    ticks = itertools.count(1000)
+    monkeypatch.setattr(ocr_cache.time, "time", lambda: next(ticks))
+
+
+def entry_size(tmp_path) -> int:
+    probe = OCRResultCache(str(tmp_path / "probe"))
+    probe.put("probe", {"text": "x" * 100})
+    return probe.stats()["size_bytes"]
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path, clock):
+    size = entry_size(tmp_path)
+    cache = OCRResultCache(str(tmp_path / "cache"), max_bytes=3 * size)
+    for key in ("a", "b", "c"):
+        cache.put(key, {"text": key * 100})
+    # Reading "a" makes "b" the least recently used entry
+    assert cache.get("a") == {"text": "a" * 100}
+
+    cache.put("d", {"text": "d" * 100})
+
+    assert cache.get("b") is None
+    assert all(cache.get(key) is not None for key in ("a", "c", "d"))
+    assert cache.stats()["evictions"] == 1
+
+
+def test_index_is_rebuilt_from_disk(tmp_path):
+    cache = OCRResultCache(str(tmp_path))
+    cache.put("a", {"text": "Zamba del grillo"})
+
+    reopened = OCRResultCache(str(tmp_path))
+    assert reopened.stats()["entries"] == 1
+    assert reopened.get("a") == {"text": "Zamba del grillo"}
+
+
+def test_lookups_are_counted_unless_told_otherwise(tmp_path):
+    cache = OCRResultCache(str(tmp_path))
+    cache.put("a", {"text": "Zamba"})
+
+    cache.get("a")
+    cache.get("missing")
+    cache.get("a", count=False)
+    cache.get("missing", count=False)
+
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["hit_rate"]) == (1, 1, 0.5)
+
+
+def test_rejected_entries_count_as_misses(tmp_path):
+    pipeline = OCRPipeline(str(tmp_path / "covers"), [], backend=WordsBackend(),
+                           cache_dir=str(tmp_path / "cache"), store_annotations=True,
+                           dead_letters=DeadLetterStore(str(tmp_path / "dead_letter.json")))
+    # Stored by a run without annotations, no words to give
+    pipeline.cache.put("text-only", {"text": "Zamba"})
+    pipeline.cache.put("with-words", {"text": "Zamba", "words": {"text": ["Zamba"]}})
+
+    assert pipeline._cached_result("text-only") is None
+    assert pipeline._cached_result("with-words").words == {"text": ["Zamba"]}
+    assert pipeline._cached_result("with-words", count=False) is not None
+
+    stats = pipeline.cache.stats()
+    assert (stats["hits"], stats["misses"]) == (1, 1)
@@ -0,0 +1,61 @@
+import os
+
+from ocr_meg_collection.quality_gate import QualityGate, ReOCRQueue
+
+READABLE = """Front Cover:
+LP0412
+Atahualpa Yupanqui
+Canciones del cerro
+Back Cover:
+LADO A
+1. Zamba del grillo 2:45
+2. Luna tucumana 3:10
+LADO B
+1. El arriero 3:02
+2. Los ejes de mi carreta 2:58
+"""
+
+# Artwork read as symbols, and a failed read
+GARBAGE = "Front Cover:\n|| ~~ ## // ** ¦¦ ^^ <> %% ++ == ;; ||| ~~~ ### ///\nBack Cover:\n§§ ¤¤ ¬¬ °°\n"
+EMPTY = "Front Cover:\n\nBack Cover:\n\n"
+
+
+def write_text(directory, lp_id: str, text: str) -> str:
+    file_path = os.path.join(directory, f"{lp_id}_combined.txt")
+    with open(file_path, "w") as text_file:
+        text_file.write(text)
+    return file_path
+
+
+def test_garbage_texts_are_queued_for_reocr(tmp_path):
+    queue = ReOCRQueue(str(tmp_path / "reocr_queue.json"))
+    gate = QualityGate(queue=queue)
+    files = [write_text(tmp_path, "LP0412", READABLE), write_text(tmp_path, "LP0413", GARBAGE),
+             write_text(tmp_path, "LP0414", EMPTY)]
+
+    assert gate.filter_files(files) == files[:1]
+
+    reopened = ReOCRQueue(queue.file_path)
+    assert reopened.pending() == ["LP0413", "LP0414"]
+    assert any("symbol ratio" in reason for reason in reopened._entries["LP0413"]["reasons"])
+
+
+def test_a_text_passing_after_reocr_leaves_the_queue(tmp_path):
+    queue = ReOCRQueue(str(tmp_path / "reocr_queue.json"))
+    gate = QualityGate(queue=queue)
+    file_path = write_text(tmp_path, "LP0413", GARBAGE)
+    gate.filter_files([file_path])
+    queue.record_attempt("LP0413")
+    assert queue.pending(max_attempts=1) == []
+
+    write_text(tmp_path, "LP0413", READABLE.replace("LP0412", "LP0413"))
+    assert gate.filter_files([file_path]) == [file_path]
+    assert len(queue) == 0
+
+
+def test_track_listing_makes_up_for_a_missing_lp_id(tmp_path):
+    gate = QualityGate(queue=ReOCRQueue(str(tmp_path / "reocr_queue.json")))
+    report = gate.evaluate(READABLE.replace("LP0412\n", ""))
+    assert report["passed"]
+    assert not report["has_lp_id"]
+    assert report["track_lines"] >= 4
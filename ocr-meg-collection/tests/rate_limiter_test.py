@@ -0,0 +1,78 @@
+import pytest
+
+from ocr_meg_collection import rate_limiter
+from ocr_meg_collection.rate_limiter import RateLimiter, TokenBucket
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(rate_limiter.time, "monotonic", clock.monotonic)
+    return clock
+
+
+def admit_for(limiter, clock, seconds: float, tokens: int = 0) -> list:
+    """
+    Sends requests as fast as the limiter admits them, returns the admission times.
+    """
+    admitted, end = [], clock.now + seconds
+    while clock.now < end:
+        wait = limiter.try_acquire(tokens)
+        if wait == 0:
+            admitted.append(clock.now)
+        else:
+            # A float remainder can be too small to move the clock
+            clock.now += max(wait, 1e-6)
+    return admitted
+
+
+def max_in_window(times: list, window: float = 60.0) -> int:
+    return max(sum(1 for other in times if start <= other < start + window) for start in times)
+
+
+def test_requests_per_minute_window(clock):
+    limiter = RateLimiter(requests_per_minute=10)
+    admitted = admit_for(limiter, clock, 120)
+    # Idle period, then a new burst
+    clock.now += 300
+    admitted += admit_for(limiter, clock, 120)
+
+    assert max_in_window(admitted) <= 10
+    assert len(admitted) >= 36
+
+
+def test_tokens_per_minute_window(clock):
+    limiter = RateLimiter(requests_per_minute=None, tokens_per_minute=10_000)
+    admitted = admit_for(limiter, clock, 180, tokens=1000)
+
+    assert max_in_window(admitted) * 1000 <= 10_000
+    assert len(admitted) >= 27
+
+
+def test_output_tokens_are_charged(clock):
+    limiter = RateLimiter(requests_per_minute=None, tokens_per_minute=6000, burst_seconds=10)
+    assert limiter.try_acquire(500) == 0
+    limiter.charge(1000)
+    # The bucket of 1000 tokens is 500 below zero, 1000 tokens of refill before 500 more fit
+    assert limiter.try_acquire(500) == pytest.approx(1000 / limiter.tokens.rate)
+
+
+def test_throttle_empties_the_buckets(clock):
+    limiter = RateLimiter(requests_per_minute=60, tokens_per_minute=None)
+    limiter.on_throttle()
+    assert limiter.try_acquire() > 0
+    assert limiter.stats()["throttles"] == 1
+
+
+def test_oversized_amount_waits_for_a_full_bucket(clock):
+    bucket = TokenBucket(600, capacity=10)
+    bucket.take(10)
+    assert bucket.wait_time(50, clock.now) == pytest.approx(10 / bucket.rate)
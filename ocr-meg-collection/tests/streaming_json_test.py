@@ -0,0 +1,89 @@
+import json
+
+import pytest
+
+from ocr_meg_collection.streaming_json import (
+    StreamingJSONParser, StreamAbortedError, repair_json, OFF_SCHEMA, REPETITION, TRUNCATED,
+    GENERAL_INFORMATION, TRACK_INFO)
+
+ANSWER = json.dumps({
+    "General Information": {"Album Title": "Canciones del cerro", "Artist": "Atahualpa Yupanqui"},
+    "Track Info": [{"Title": "Zamba del grillo", "Side": "A"}, {"Title": "Luna tucumana", "Side": "A"}],
+})
+
+
+def feed_in_chunks(parser, text: str, size: int = 7) -> list:
+    events = []
+    for start in range(0, len(text), size):
+        events += parser.feed(text[start:start + size])
+    return events
+
+
+def test_items_are_returned_as_they_complete():
+    parser = StreamingJSONParser()
+    events = feed_in_chunks(parser, "```json\n" + ANSWER + "\n```\nHope this helps!")
+
+    assert [key for key, _ in events] == [GENERAL_INFORMATION, TRACK_INFO, TRACK_INFO]
+    assert events[2][1] == {"Title": "Luna tucumana", "Side": "A"}
+    assert parser.done
+    assert json.loads(parser.json_text) == json.loads(ANSWER)
+    assert parser.finish("STOP") == json.loads(ANSWER)
+
+
+def test_empty_response_means_nothing_found():
+    assert StreamingJSONParser().finish("STOP") == {}
+
+
+@pytest.mark.parametrize("text", [
+    "Here is the information I could extract from the album covers:",
+    '{"General Information": {}, "Notes": "none"}',
+    '{"Track Info": ["Zamba del grillo"]}',
+])
+def test_off_schema_answers_are_aborted(text):
+    with pytest.raises(StreamAbortedError) as aborted:
+        feed_in_chunks(StreamingJSONParser(), text)
+    assert aborted.value.reason == OFF_SCHEMA
+
+
+def test_repeated_tracks_are_aborted():
+    track = json.dumps({"Title": "Zamba del grillo", "Side": "A"})
+    looping = '{"Track Info": [' + ", ".join([track] * 5)
+
+    parser = StreamingJSONParser(max_repeats=3)
+    with pytest.raises(StreamAbortedError) as aborted:
+        feed_in_chunks(parser, looping)
+    assert aborted.value.reason == REPETITION
+    assert len(parser.tracks) == 3
+
+
+@pytest.mark.parametrize("finish_reason, reason", [("MAX_TOKENS", TRUNCATED), ("STOP", OFF_SCHEMA)])
+def test_incomplete_answers_are_aborted(finish_reason, reason):
+    parser = StreamingJSONParser()
+    parser.feed(ANSWER[:-40])
+    with pytest.raises(StreamAbortedError) as aborted:
+        parser.finish(finish_reason)
+    assert aborted.value.reason == reason
+
+
+def test_repair_keeps_the_complete_part_of_a_truncated_answer():
+    cut = ANSWER[:ANSWER.index("Luna tucumana") + 4]
+    repaired = json.loads(repair_json(cut))
+
+    assert repaired["General Information"]["Artist"] == "Atahualpa Yupanqui"
+    assert repaired["Track Info"][0] == {"Title": "Zamba del grillo", "Side": "A"}
+    assert "Luna tucumana" not in json.dumps(repaired)
+
+
+def test_repair_fixes_commas_line_breaks_and_fences():
+    text = '```json\n{"General Information": {"Album Title": "Canciones\ndel cerro",,},\n"Track Info": [],}\n```'
+    assert json.loads(repair_json(text)) == {
+        "General Information": {"Album Title": "Canciones\ndel cerro"}, "Track Info": []}
+
+
+def test_repair_closes_a_truncated_array():
+    assert json.loads(repair_json('[{"LP_ID": "LP0001"}, {"LP_ID": "LP0002", "General')) == [
+        {"LP_ID": "LP0001"}, {"LP_ID": "LP0002"}]
+
+
+def test_repair_without_json_is_empty():
+    assert repair_json("I could not read the covers.") == ""
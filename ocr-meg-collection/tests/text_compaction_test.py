@@ -0,0 +1,53 @@
+from ocr_meg_collection.text_compaction import TextCompactor
+
+# Back cover listing a composer under every track, the performer also on the front cover
+PER_TRACK_COMPOSERS = """Front Cover:
+LP0412
+Atahualpa Yupanqui
+Canciones del cerro
+Back Cover:
+LADO A
+1. Zamba del grillo   2:45
+(Atahualpa Yupanqui)
+2. Luna tucumana   3:10
+(Atahualpa Yupanqui)
+LADO B
+1. Zamba del grillo   2:45
+(Atahualpa Yupanqui)
+2. El arriero   3:02
+(Atahualpa Yupanqui)
+"""
+
+
+def test_track_composers_are_kept():
+    compacted = TextCompactor().compact(PER_TRACK_COMPOSERS)
+    assert compacted.count("(Atahualpa Yupanqui)") == 4
+    assert compacted.count("1. Zamba del grillo 2:45") == 2
+    assert "Atahualpa Yupanqui\nCanciones del cerro" in compacted
+
+
+def test_repeats_within_a_section_are_collapsed():
+    text = "Front Cover:\nLOS CHALCHALEROS\nFolklore argentino\nLOS   CHALCHALEROS\nBack Cover:\nLOS CHALCHALEROS\n"
+    compacted = TextCompactor().compact(text)
+    assert compacted == "Front Cover:\nLOS CHALCHALEROS\nFolklore argentino\nBack Cover:\nLOS CHALCHALEROS"
+
+
+def test_legal_notices_keep_year_and_holder():
+    text = ("Back Cover:\nTodos los derechos del productor fonográfico reservados.\n"
+            "© 1975 Discos CBS S.A.I.C.F.\n")
+    assert TextCompactor().compact(text) == "Back Cover:\n© 1975 Discos CBS S.A.I.C.F."
+
+
+def test_track_titles_using_legal_words_are_kept():
+    text = ("Back Cover:\nLADO A\n1. Amor prohibido 3:20\n2. El alquiler 2:50\n3. Radiodifusión 2:10\n"
+            "Prohibida la reproducción, ejecución pública,\nradiodifusión y alquiler de este disco.\n")
+    compacted = TextCompactor().compact(text)
+    assert "1. Amor prohibido 3:20" in compacted
+    assert "2. El alquiler 2:50" in compacted
+    assert "3. Radiodifusión 2:10" in compacted
+
+
+def test_legal_phrases_are_dropped_but_lone_words_kept():
+    text = ("Front Cover:\nAmor prohibido\nEl alquiler\nQueda prohibida la reproducción total o parcial.\n"
+            "Radiodifusión y alquiler no autorizados.\n")
+    assert TextCompactor().compact(text) == "Front Cover:\nAmor prohibido\nEl alquiler"